@@ -1,20 +1,36 @@
+import time
+_import_started = time.perf_counter()
+
 import os
 import json
-import pickle
+import asyncio
 import requests
 import numpy as np
-import time
 import traceback
-import google.auth
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, timedelta
-from scipy.spatial import KDTree
-from google.oauth2 import service_account
-from google.auth.transport.requests import Request
 
+import explain
+import feature_store
+import features
+import forecast_pipeline
+import geo_index
+import http_cache
+import rainfall
+import rate_limit
+import resilience
+import risk_levels
+import scoring
+import simulate
+import singleflight
+import startup
+import weather_grid
 from auth import User
 from bot import router as chat_router
 
@@ -27,41 +43,73 @@ MODEL_PATH = "flood_xgboost_model.pkl"
 TERRAIN_PATH = "terrain_lookup.json"
 COORDINATE_PATH = "indian_district_coordinates.json"
 
-
-# LOAD MODEL
-
-try:
-    with open(MODEL_PATH, "rb") as f:
-        model = pickle.load(f)
-
+# Reference datasets served (precompressed, with ETags) under /datasets/{name}
+DATASETS = {
+    "district-coordinates": COORDINATE_PATH,
+    "states-districts": "states_districts.json",
+    "emergency-contacts": "emergency_contacts.json",
+}
+
+
+# LOAD MODEL / TERRAIN / DATABASE
+# Loaded in parallel background threads once the server starts (or on first
+# use, whichever comes first) so uvicorn can accept connections immediately.
+# /readyz reports when everything is in place.
+
+def warm_up_model(loaded):
+    # first predict initialises XGBoost's thread pool; pay for it here
+    loaded.predict_proba(np.zeros((1, len(features.FEATURE_NAMES)), dtype=np.float32))
+
+def _load_model():
+    loaded = features.load_model(MODEL_PATH)
+    # serve.py loads the model before forking workers; an OpenMP pool started
+    # in the parent does not survive fork, so each worker warms up itself
+    if not os.getenv("FLOOD_PREFORK"):
+        warm_up_model(loaded)
     print("XGBoost model loaded successfully")
+    return loaded
 
-except Exception as e:
-    raise RuntimeError(f"Failed to load model: {e}")
-
-# LOAD TERRAIN DATASET
-with open("terrain_lookup.json", "r") as f:
-    TERRAIN_DATA = json.load(f)
-
-print("Terrain dataset loaded")
-
-# Extract coordinates
-terrain_coords = [(p["lat"], p["lon"]) for p in TERRAIN_DATA]
+def _load_terrain():
+    terrain = features.load_terrain(TERRAIN_PATH)
+    print("Terrain dataset loaded, KDTree spatial index built")
+    return terrain
 
-# Build KDTree
-terrain_tree = KDTree(terrain_coords)
+model_resource = startup.resource("model", _load_model)
+terrain_resource = startup.resource("terrain", _load_terrain)
+feature_store_resource = startup.resource(
+    "feature_store", lambda: feature_store.build(terrain_resource.get(), COORDINATE_PATH)
+)
+risk_resource = startup.resource("risk_levels", lambda: risk_levels.load(risk_levels.CALIBRATION_PATH, MODEL_PATH))
+geo_resource = startup.resource("geo_index", lambda: geo_index.build(feature_store_resource.get()))
+users_resource = startup.resource("database", User)
 
-print("KDTree spatial index built")
+model = startup.LazyProxy(model_resource)
+classifier = startup.LazyProxy(risk_resource)
+user_handler = startup.LazyProxy(users_resource)
 
 
 # FASTAPI INITIALIZATION
 
-user_handler = User()
+@asynccontextmanager
+async def lifespan(app):
+    startup.start_background_loading()
+    yield
 
-app = FastAPI(title="Early Flood Predictor API", version="2.0")
+app = FastAPI(
+    title="Early Flood Predictor API",
+    version="2.0",
+    lifespan=lifespan,
+    default_response_class=http_cache.FastJSONResponse,
+)
 
 app.include_router(chat_router)
 
+# Token buckets per session (else per IP); added before CORS so that CORS
+# wraps it and 429 responses still carry the CORS headers
+rate_limiter = rate_limit.RateLimiter(session_user=lambda token: user_handler.validate_session(token))
+
+app.add_middleware(rate_limit.RateLimitMiddleware, limiter=rate_limiter)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -92,167 +140,113 @@ class CoordinateRequest(BaseModel):
     latitude: float
     longitude: float
 
-# DISTRICT COORDINATES
 
-def get_coordinates(state: str, district: str):
+class DistrictRef(BaseModel):
+    state: str
+    district: str
 
-    with open(COORDINATE_PATH, "r", encoding="utf-8") as f:
-        data = json.load(f)
 
-    state_key = next((s for s in data if s.lower() == state.lower()), None)
+class ExplainBatchRequest(BaseModel):
+    districts: List[DistrictRef]
+    top: int = 0
 
-    if not state_key:
-        raise HTTPException(status_code=404, detail=f"State '{state}' not found")
 
-    district_key = next((d for d in data[state_key] if d.lower() == district.lower()), None)
+class ReverseGeocodeRequest(BaseModel):
+    points: List[CoordinateRequest]
 
-    if not district_key:
-        raise HTTPException(status_code=404, detail=f"District '{district}' not found")
 
-    return data[state_key][district_key]
+class ScenarioSpec(BaseModel):
+    name: str = ""
+    multiplier: Optional[float] = None
+    rain_mm: Optional[List[float]] = None
+    days: int = 3
 
 
-# WEATHER FETCH
-
-weather_cache = {}
-
-def get_weather(lat, lon):
-
-    key = f"{round(lat,2)}_{round(lon,2)}"
-
-    if key in weather_cache:
-
-        cached, ts = weather_cache[key]
-
-        if time.time() - ts < 600:
-            return cached
+class SimulationRequest(BaseModel):
+    districts: List[DistrictRef] = []       # empty: every district
+    multipliers: List[float] = []           # shorthand: one scenario per multiplier over ``days``
+    days: int = 3
+    scenarios: List[ScenarioSpec] = []
 
-    params = {
-        "lat": lat,
-        "lon": lon,
-        "appid": OPENWEATHER_API_KEY,
-        "units": "metric"
-    }
-
-    resp = requests.get(
-        "https://api.openweathermap.org/data/2.5/weather",
-        params=params,
-        timeout=10
-    )
+# DISTRICT COORDINATES
 
-    resp.raise_for_status()
+_coordinate_index = None
+
+def _coordinates():
+    # file read once; names matched case-insensitively
+    global _coordinate_index
+    if _coordinate_index is None:
+        with open(COORDINATE_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        _coordinate_index = {
+            s.lower(): (s, {d.lower(): (d, c) for d, c in districts.items()})
+            for s, districts in data.items()
+        }
+    return _coordinate_index
 
-    data = resp.json()
+def resolve_district(state: str, district: str):
+    """(state_key, district_key, coords) with the dataset's spelling of the names."""
 
-    weather_cache[key] = (data, time.time())
+    entry = _coordinates().get(state.lower())
 
-    return data
+    if not entry:
+        raise HTTPException(status_code=404, detail=f"State '{state}' not found")
 
-#Openmeteo
-def get_openmeteo_rainfall(lat, lon):
-    from datetime import datetime, timedelta
+    state_key, districts = entry
+    match = districts.get(district.lower())
 
-    end = datetime.utcnow().date()
-    start = end - timedelta(days=30)
+    if not match:
+        raise HTTPException(status_code=404, detail=f"District '{district}' not found")
 
-    url = "https://archive-api.open-meteo.com/v1/archive"
+    return state_key, match[0], match[1]
 
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "start_date": start.strftime("%Y-%m-%d"),
-        "end_date": end.strftime("%Y-%m-%d"),
-        "daily": "precipitation_sum",
-        "timezone": "auto"
-    }
+def get_coordinates(state: str, district: str):
 
-    try:
-        res = requests.get(url, params=params, timeout=10)
-        data = res.json()
+    return resolve_district(state, district)[2]
 
-        values = data.get("daily", {}).get("precipitation_sum", [])
 
-        values = [v for v in values if v is not None and v >= 0]
+# WEATHER FETCH
+# Requests are snapped to shared weather tiles (weather_grid.TILE_DEG) so
+# nearby districts reuse one upstream fetch; all calls go through the
+# resilience layer (circuit breakers, adaptive timeouts, stale-while-revalidate).
 
-        values_60d = values[-60:] if len(values) >= 60 else values
+def get_weather(lat, lon):
 
-        if len(values_60d) >= 60:
-            previous_30d = sum(values_60d[:30])
-            current_30d = sum(values_60d[30:])
-        else:
-            current_30d = sum(values_60d)
-            previous_30d = current_30d * 0.8
+    return weather_grid.current_weather(lat, lon)
 
-        rain_7d = sum(values_60d[-7:]) if len(values_60d) >= 7 else current_30d
-        rain_24h = values_60d[-2] if len(values_60d) > 1 else 0
+# Historical rainfall comes from a provider: the Open-Meteo archive by
+# default, or a local gridded store when RAINFALL_STORE is set.
+rainfall_provider = rainfall.get_provider()
 
-        return rain_24h, rain_7d, current_30d, previous_30d, values_60d
+def get_openmeteo_rainfall(lat, lon):
 
-    except Exception as e:
-        print("Open-Meteo error:", e)
-        return 0, 0
+    # Errors propagate as resilience.UpstreamUnavailable instead of
+    # returning a short tuple that breaks the callers' unpacking
+    return rainfall_provider.aggregates(lat, lon)
 
 def get_forecast_data(lat, lon):
-    url = "https://api.openweathermap.org/data/2.5/forecast"
 
-    params = {
-        "lat": lat,
-        "lon": lon,
-        "appid": OPENWEATHER_API_KEY,
-        "units": "metric"
-    }
+    return weather_grid.forecast(lat, lon)["list"]
 
-    res = requests.get(url, params=params, timeout=10)
-    data = res.json()
+def process_forecast_daily(forecast_list):
 
-    return data["list"]
+    # NumPy group-by over IST calendar days (see forecast_pipeline)
+    return forecast_pipeline.process_list(forecast_list)
 
-def process_forecast_daily(forecast_list):
-    daily_data = {}
-
-    for item in forecast_list:
-        date = item["dt_txt"].split(" ")[0]
-
-        rain = item.get("rain", {}).get("3h", 0)
-        humidity = item["main"]["humidity"]
-        temp = item["main"]["temp"]
-        wind = item["wind"]["speed"]
-
-        if date not in daily_data:
-            daily_data[date] = {
-                "rain_total": 0,
-                "rain_max": 0,
-                "humidity": [],
-                "temp": [],
-                "wind": []
-            }
+def get_daily_forecast(lat, lon):
+
+    # aggregated per weather tile and cached; a refreshed forecast only
+    # regroups the days from its first changed point on
+    return forecast_pipeline.daily_forecast(lat, lon)
 
-        daily_data[date]["rain_total"] += rain
-        daily_data[date]["rain_max"] = max(daily_data[date]["rain_max"], rain)
-        daily_data[date]["humidity"].append(humidity)
-        daily_data[date]["temp"].append(temp)
-        daily_data[date]["wind"].append(wind)
-
-    result = []
-    for date, d in daily_data.items():
-        result.append({
-            "date": date,
-            "rain": d["rain_total"],
-            "rain_max": d["rain_max"],
-            "humidity": sum(d["humidity"]) / len(d["humidity"]),
-            "temp": sum(d["temp"]) / len(d["temp"]),
-            "wind": sum(d["wind"]) / len(d["wind"])
-        })
-
-    return result
 
 # TERRAIN LOOKUP
 
 def find_nearest_terrain(lat, lon):
 
-    distance, index = terrain_tree.query((lat, lon))
+    terrain = terrain_resource.get()
 
-    return TERRAIN_DATA[index]
+    return terrain.record(terrain.nearest(lat, lon))
 
 
 # FEATURE GENERATION
@@ -261,59 +255,18 @@ def build_features(lat, lon, weather, rain_24h, rain_7d, current_30d, previous_3
 
     terrain = find_nearest_terrain(lat, lon)
 
-    rainfall = current_30d
-
-    wind = weather.get("wind", {}).get("speed", 0)
-
-    current_rain = weather.get("rain", {}).get("1h", 0)
-
-    prev_month_rain = current_30d
-
-    rain_2month_sum = current_30d + previous_30d
-
-    rain_variability = abs(rain_24h - (rain_7d / 7))
-
-    rain_intensity = current_30d / 30
-
-    rain_momentum = current_rain * wind
-
-    monsoon_cumulative = (0.6 * current_30d) + (0.4 * previous_30d)
-
-    monsoon_saturation = min(1, monsoon_cumulative / 500)
-
-    rain_anomaly = rain_24h - 10
-
-    extreme_rain = 1 if rainfall > 50 else 0
-
-    features = [
-
-        terrain["elevation"],
-        terrain["slope"],
-        terrain["river_distance"],
-        terrain["relative_elevation"],
-        terrain["terrain_ruggedness"],
-        terrain["drainage_potential"],
-        terrain["river_importance"],
-        terrain["twi"],
-
-        rainfall,
-        rain_intensity,
-        rain_momentum,
-        prev_month_rain,
-        rain_2month_sum,
-        monsoon_cumulative,
-        monsoon_saturation,
-        rain_anomaly,
-        extreme_rain
-    ]
-
-    return features, rainfall, wind, current_rain
+    return features.feature_row(terrain, weather, rain_24h, rain_7d, current_30d, previous_30d)
 
 # NOTIFICATION FUNCTION
 SCOPES = ["https://www.googleapis.com/auth/firebase.messaging"]
 
 def get_access_token():
     try:
+        # google-auth is only needed when an alert is actually sent
+        with startup.phase("import google.auth"):
+            from google.oauth2 import service_account
+            from google.auth.transport.requests import Request as GoogleAuthRequest
+
         service_account_info = json.loads(os.getenv("SERVICE_ACCOUNT_JSON"))
 
         credentials = service_account.Credentials.from_service_account_info(
@@ -321,7 +274,7 @@ def get_access_token():
             scopes=SCOPES
         )
 
-        credentials.refresh(Request())
+        credentials.refresh(GoogleAuthRequest())
         return credentials.token
 
     except Exception as e:
@@ -358,186 +311,561 @@ def send_notification(state, district):
     print(response.text)
 
 # MAIN PREDICTION
+# Handlers are async: blocking I/O runs under scoring.io and feature
+# building + XGBoost under scoring.cpu, so a burst of predictions neither
+# starves the default threadpool used by the cheap endpoints nor queues
+# without bound (scoring.Overloaded -> 503 with Retry-After).
+
+# Concurrent identical predictions share one computation (and its marker
+# write / alert), which is then reused for singleflight.PREDICT_FRESH_SEC.
+district_predictions = singleflight.SingleFlight("district")
+point_predictions = singleflight.SingleFlight("point")
+
+COORD_DECIMALS = int(os.getenv("PREDICT_COORD_DECIMALS", "3"))   # ~110 m
+
+
+class PredictionSnapshot:
+    """A computed district prediction: the response plus the model inputs behind it."""
+
+    __slots__ = ("response", "rows", "dates", "explanation")
+
+    def __init__(self, response: dict, rows: np.ndarray, dates: list):
+        self.response = response
+        self.rows = rows                # (1 + forecast days, 17) float32, today first
+        self.dates = dates
+        self.explanation = None         # filled in on the first explain request
+
 
 @app.post("/predict/{state}/{district}")
-def predict_flood(state: str, district: str, req: FloodRequest):
+async def predict_flood(state: str, district: str, req: FloodRequest):
+
+    snapshot = await _district_snapshot(state, district)
+
+    # shared result: echo this caller's spelling without touching it
+    return {**snapshot.response, "state": state, "district": district}
+
+
+async def _district_snapshot(state: str, district: str) -> PredictionSnapshot:
+
+    key = (state.strip().lower(), district.strip().lower())
 
     try:
-        coords = get_coordinates(state, district)
-        lat = coords["lat"]
-        lon = coords["lon"]
-
-        # Current weather
-        weather = get_weather(lat, lon)
-
-        # Past rainfall (60-day based)
-        rain_24h, rain_7d, current_30d, previous_30d, past_60days = get_openmeteo_rainfall(lat, lon)
-
-        # Forecast data
-        forecast_list = get_forecast_data(lat, lon)
-        daily_forecast = process_forecast_daily(forecast_list)
-
-        future_predictions = []
-
-        # CURRENT PREDICTION
-        features, rainfall, wind, current_rain = build_features(
-            lat,
-            lon,
-            weather,
-            rain_24h,
-            rain_7d,
-            current_30d,
-            previous_30d
+        return await district_predictions.run(key, lambda: _compute_district(state, district))
+
+    except (HTTPException, startup.NotReady, scoring.Overloaded):
+        raise
+
+    except resilience.UpstreamUnavailable as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(upstream_retry_after())}
         )
 
-        X = np.array(features).reshape(1, -1)
-        prob = model.predict_proba(X)[0][1]
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
 
-        if prob < 0.7:
-            risk = "Low"
-        elif prob < 0.9:
-            risk = "Moderate"
-        else:
-            risk = "High"
 
-        # FUTURE PREDICTIONS
-        if risk.lower() == "high":
-            print("HIGH RISK DETECTED - sending notification")
-            send_notification(state, district)
+async def _compute_district(state: str, district: str) -> PredictionSnapshot:
 
-        coords = get_coordinates(state, district)
+    with resilience.track_staleness() as upstream:
+        snapshot = await _predict_district(state, district)
+
+    snapshot.response["stale"] = upstream.stale
+    return snapshot
+
+
+def upstream_retry_after():
+    return max(resilience.retry_after(url) for url in (weather_grid.WEATHER_URL, weather_grid.FORECAST_URL, weather_grid.ARCHIVE_URL))
+
+
+def _wait_for_scoring_resources():
+    # block on loading here, in an I/O thread, never on a scoring thread
+    model_resource.get()
+    feature_store_resource.get()
+    risk_resource.get()
+
+
+def _fetch_district_inputs(state: str, district: str):
+
+    _wait_for_scoring_resources()
+
+    # the dataset's spelling, so markers and alerts never depend on the caller's
+    state, district, coords = resolve_district(state, district)
+    lat = coords["lat"]
+    lon = coords["lon"]
+
+    # Current weather
+    weather = get_weather(lat, lon)
+
+    # Past rainfall (60-day based)
+    history = get_openmeteo_rainfall(lat, lon)
+
+    # Forecast data, already aggregated by day
+    daily_forecast = get_daily_forecast(lat, lon)
+
+    return (state, district), coords, weather, history, daily_forecast
 
-        with user_handler.db.get_conn() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                "DELETE FROM risk_markers WHERE state=? AND district=?",
-                (state, district)
-            )
-
-            if risk.lower() != "low":
-                cur.execute(
-                    "INSERT INTO risk_markers (state, district, risk, lat, lon, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
-                    (state, district, risk, coords["lat"], coords["lon"], time.time())
-                )
-
-        # FIX: use last 7 days from 60-day history
-        rolling_window = past_60days[-7:].copy()
-        rolling_30d = past_60days[-30:].copy()
-        rolling_prev30d = past_60days[-60:-30].copy()
-
-        for day in daily_forecast:
-
-            # use past-only data first
-            dynamic_rain_7d = sum(rolling_window)
-            future_rain_24h = day["rain"]
-
-            sim_current_30d = sum(rolling_30d)
-            sim_previous_30d = sum(rolling_prev30d)
-
-            # Simulated weather for that day
-            fake_weather = {
-                "main": {
-                    "temp": day["temp"],
-                    "humidity": day["humidity"],
-                },
-                "wind": {"speed": day["wind"]},
-                "rain": {"1h": day["rain_max"] / 3}
-            }
 
-            # pass correct params
-            features, _, _, _ = build_features(
-                lat,
-                lon,
-                fake_weather,
-                future_rain_24h,
-                dynamic_rain_7d,
-                sim_current_30d,
-                sim_previous_30d
-            )
-
-            X_future = np.array(features).reshape(1, -1)
-            prob_future = model.predict_proba(X_future)[0][1]
-
-            future_predictions.append({
-                "date": day["date"],
-                "risk": round(float(prob_future), 3)
-            })
-
-            # update AFTER prediction (correct time logic)
-            rolling_window.append(day["rain"])
-            rolling_window = rolling_window[-7:]
-
-            rolling_30d.append(day["rain"])
-            rolling_30d = rolling_30d[-30:]
-
-            rolling_prev30d.append(rolling_30d[0])
+def _score_district(state, district, lat, lon, weather, history, daily_forecast):
+
+    rain_24h, rain_7d, current_30d, previous_30d, past_60days = history
+
+    # static terrain features: a precomputed row, not a KDTree query
+    store = feature_store_resource.get()
+    static = store.district_row(state, district)
+    if static is None:
+        static = store.cell_row(lat, lon)
+
+    # CURRENT PREDICTION
+    wind = weather.get("wind", {}).get("speed", 0)
+    current_rain = weather.get("rain", {}).get("1h", 0)
+
+    # dynamic inputs, one entry for today and one per forecast day
+    rain_24h_col = [rain_24h]
+    rain_7d_col = [rain_7d]
+    current_30d_col = [current_30d]
+    previous_30d_col = [previous_30d]
+    current_rain_col = [current_rain]
+    wind_col = [wind]
+
+    # FUTURE PREDICTIONS
+    # FIX: use last 7 days from 60-day history
+    rolling_window = past_60days[-7:].copy()
+    rolling_30d = past_60days[-30:].copy()
+    rolling_prev30d = past_60days[-60:-30].copy()
+
+    for day in daily_forecast:
+
+        # use past-only data first
+        rain_7d_col.append(sum(rolling_window))
+        rain_24h_col.append(day["rain"])
+
+        current_30d_col.append(sum(rolling_30d))
+        previous_30d_col.append(sum(rolling_prev30d))
+
+        # Simulated weather for that day
+        wind_col.append(day["wind"])
+        current_rain_col.append(day["rain_max"] / 3)
+
+        # update AFTER prediction (correct time logic)
+        rolling_window.append(day["rain"])
+        rolling_window = rolling_window[-7:]
+
+        # the day leaving the 30-day window enters the previous one
+        rolling_30d.append(day["rain"])
+        if len(rolling_30d) > 30:
+            rolling_prev30d.append(rolling_30d.pop(0))
             rolling_prev30d = rolling_prev30d[-30:]
 
-        # RESPONSE
-        return {
-            "state": state,
-            "district": district,
-
-            "current_prediction": {
-                "risk_level": risk,
-                "score": round(float(prob), 3)
-            },
-
-            "future_predictions": future_predictions,
-
-            "features": {
-                "temp": weather["main"]["temp"],
-                "humidity": weather["main"]["humidity"],
-                "wind_speed": wind,
-                "current_rain": current_rain,
-                "rain_24h": rain_24h,
-                "rain_7d": rain_7d,
-                "current_30d": current_30d,
-                "previous_30d": previous_30d
-            }
+    rows = features.feature_matrix(
+        np.broadcast_to(static, (len(wind_col), static.shape[0])),
+        np.array(rain_24h_col),
+        np.array(rain_7d_col),
+        np.array(current_30d_col),
+        np.array(previous_30d_col),
+        np.array(current_rain_col),
+        np.array(wind_col)
+    )
+
+    # today and every forecast day in one predict_proba call, then one
+    # calibration + threshold lookup for all of them
+    probs = model.predict_proba(rows)[:, 1]
+    calibrated, levels = classifier.classify(probs, classifier.region(state, district))
+    names = risk_levels.level_names(levels)
+
+    future_predictions = [
+        {"date": day["date"], "risk": round(float(p), 3), "risk_level": level}
+        for day, p, level in zip(daily_forecast, calibrated[1:], names[1:])
+    ]
+
+    return calibrated[0], names[0], wind, current_rain, future_predictions, rows
+
+
+def _record_risk(state: str, district: str, risk: str, coords: dict):
+
+    if risk.lower() == "high":
+        print("HIGH RISK DETECTED - sending notification")
+        send_notification(state, district)
+
+    user_handler.db.set_risk_marker(
+        state,
+        district,
+        risk if risk.lower() != "low" else None,
+        coords["lat"],
+        coords["lon"]
+    )
+
+
+async def _predict_district(state: str, district: str):
+
+    (state, district), coords, weather, history, daily_forecast = await scoring.io.run(
+        _fetch_district_inputs, state, district
+    )
+
+    prob, risk, wind, current_rain, future_predictions, rows = await scoring.cpu.run(
+        _score_district, state, district, coords["lat"], coords["lon"], weather, history, daily_forecast
+    )
+
+    await scoring.io.run(_record_risk, state, district, risk, coords, admitted=True)
+
+    rain_24h, rain_7d, current_30d, previous_30d, _ = history
+
+    # RESPONSE
+    response = {
+        "state": state,
+        "district": district,
+
+        "current_prediction": {
+            "risk_level": risk,
+            "score": round(float(prob), 3)
+        },
+
+        "future_predictions": future_predictions,
+
+        "risk_levels_version": classifier.version,
+
+        "features": {
+            "temp": weather["main"]["temp"],
+            "humidity": weather["main"]["humidity"],
+            "wind_speed": wind,
+            "current_rain": current_rain,
+            "rain_24h": rain_24h,
+            "rain_7d": rain_7d,
+            "current_30d": current_30d,
+            "previous_30d": previous_30d
         }
+    }
 
-    except Exception as e:
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    return PredictionSnapshot(response, rows, [day["date"] for day in future_predictions])
+
+
+# EXPLANATIONS
+# TreeSHAP contributions for the snapshot behind a prediction. Snapshots
+# without one are explained together in a single pred_contribs call and
+# keep the result, so repeat requests within the freshness window cost
+# nothing extra.
+
+MAX_EXPLAIN_BATCH = int(os.getenv("MAX_EXPLAIN_BATCH", "100"))
+EXPLAIN_BATCH_CONCURRENCY = 8    # a batch must not fill the scoring queue by itself
+
+
+def _explain_snapshots(snapshots: List[PredictionSnapshot]):
+
+    rows = np.concatenate([snap.rows for snap in snapshots])
+    contribs = explain.contributions(model_resource.get(), rows)
+
+    start = 0
+    for snap in snapshots:
+        end = start + len(snap.rows)
+        snap.explanation = explain.describe(contribs[start:end], snap.rows, snap.dates)
+        start = end
+
+
+async def _ensure_explained(snapshots: List[PredictionSnapshot]):
+
+    pending = list({id(snap): snap for snap in snapshots if snap.explanation is None}.values())
+
+    if pending:
+        await scoring.cpu.run(_explain_snapshots, pending)
+
+
+def _explanation_body(snapshot: PredictionSnapshot, state: str, district: str, top: int = 0):
+
+    explanation = snapshot.explanation
+    if top > 0:
+        explanation = {**explanation, "contributions": explanation["contributions"][:top]}
+
+    return {
+        "state": state,
+        "district": district,
+        "current_prediction": snapshot.response["current_prediction"],
+        "risk_levels_version": snapshot.response["risk_levels_version"],
+        "stale": snapshot.response["stale"],
+        "explanation": explanation
+    }
+
+
+@app.post("/predict/{state}/{district}/explain")
+async def explain_district(state: str, district: str, top: int = 0):
+
+    snapshot = await _district_snapshot(state, district)
+
+    await _ensure_explained([snapshot])
+
+    return _explanation_body(snapshot, state, district, top)
+
+
+@app.post("/predict/explain")
+async def explain_districts(req: ExplainBatchRequest):
+
+    if len(req.districts) > MAX_EXPLAIN_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_EXPLAIN_BATCH} districts per request")
+
+    limit = asyncio.Semaphore(EXPLAIN_BATCH_CONCURRENCY)
+
+    async def snapshot(ref: DistrictRef):
+        async with limit:
+            return await _district_snapshot(ref.state, ref.district)
+
+    results = await asyncio.gather(*(snapshot(ref) for ref in req.districts), return_exceptions=True)
+
+    await _ensure_explained([r for r in results if isinstance(r, PredictionSnapshot)])
+
+    items = []
+    for ref, result in zip(req.districts, results):
+        if isinstance(result, PredictionSnapshot):
+            items.append(_explanation_body(result, ref.state, ref.district, req.top))
+        elif isinstance(result, HTTPException):
+            items.append({"state": ref.state, "district": ref.district, "status": result.status_code, "error": result.detail})
+        elif isinstance(result, (startup.NotReady, scoring.Overloaded)):
+            items.append({"state": ref.state, "district": ref.district, "status": 503, "error": str(result)})
+        else:
+            raise result
+
+    return {"results": items}
 
 
 # PREDICT BY COORDINATES
 
-@app.post("/predict-by-coordinates")
-def predict_by_coordinates(req: CoordinateRequest):
+# Points are reverse-geocoded to a district (geo_index); the district's
+# shared prediction snapshot is attached, so its marker and alerts are
+# handled once, by the district path.
 
-    weather = get_weather(req.latitude, req.longitude)
+MAX_GEOCODE_BATCH = int(os.getenv("MAX_GEOCODE_BATCH", "10000"))
 
-    rain_24h, rain_7d, current_30d, previous_30d, _ = get_openmeteo_rainfall(req.latitude, req.longitude)
+def resolve_point(lat, lon):
+    """(state, district) containing the point, or None outside every district."""
 
-    features, rainfall, wind, _ = build_features(
-        req.latitude,
-        req.longitude,
-        weather,
-        rain_24h,
-        rain_7d,
-        current_30d, 
-        previous_30d
-    )
+    return geo_resource.get().resolve(lat, lon)
+
+
+def _fetch_point_inputs(lat, lon):
+
+    _wait_for_scoring_resources()
+
+    place = resolve_point(lat, lon)
+
+    weather = get_weather(lat, lon)
+
+    rain_24h, rain_7d, current_30d, previous_30d, _ = get_openmeteo_rainfall(lat, lon)
 
-    X = np.array(features).reshape(1, -1)
+    return place, weather, (rain_24h, rain_7d, current_30d, previous_30d)
+
+
+def _score_point(lat, lon, place, weather, rainfall_inputs):
+
+    rain_24h, rain_7d, current_30d, previous_30d = rainfall_inputs
+    rainfall_30d = current_30d
+    wind = weather.get("wind", {}).get("speed", 0)
+    current_rain = weather.get("rain", {}).get("1h", 0)
+
+    static = feature_store_resource.get().cell_row(lat, lon)
+
+    X = features.feature_matrix(static[None, :], rain_24h, rain_7d, current_30d, previous_30d, current_rain, wind)
 
     prob = model.predict_proba(X)[0][1]
 
+    # the resolved district's thresholds, as its own prediction uses
+    calibrated, level = classifier.classify(prob, classifier.region(*place) if place else 0)
+
+    return float(calibrated), risk_levels.RISK_LEVELS[int(level)], rainfall_30d, wind
+
+
+@app.post("/predict-by-coordinates")
+async def predict_by_coordinates(req: CoordinateRequest):
+
+    # rounded so nearby callers share a computation (and get the same answer)
+    lat = round(req.latitude, COORD_DECIMALS)
+    lon = round(req.longitude, COORD_DECIMALS)
+
+    try:
+        return await point_predictions.run((lat, lon), lambda: _compute_point(lat, lon))
+
+    except resilience.UpstreamUnavailable as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(upstream_retry_after())}
+        )
+
+
+async def _compute_point(lat, lon):
+
+    with resilience.track_staleness() as upstream:
+        place, weather, rainfall_inputs = await scoring.io.run(_fetch_point_inputs, lat, lon)
+
+    point = scoring.cpu.run(_score_point, lat, lon, place, weather, rainfall_inputs)
+
+    stale = upstream.stale
+    if place is None:
+        (prob, risk, rainfall_30d, wind), district = await point, None
+    else:
+        scored, snapshot = await asyncio.gather(point, _district_snapshot(*place), return_exceptions=True)
+        if isinstance(scored, BaseException):
+            raise scored
+        prob, risk, rainfall_30d, wind = scored
+        district = {"state": place[0], "district": place[1]}
+
+        # the point score stands on its own: a district that cannot be
+        # predicted right now is named without its prediction
+        if isinstance(snapshot, (HTTPException, resilience.UpstreamUnavailable, scoring.Overloaded)):
+            print(f"[WARN] district prediction for {place[0]}/{place[1]} unavailable: {snapshot}")
+        elif isinstance(snapshot, BaseException):
+            raise snapshot
+        else:
+            district.update(snapshot.response["current_prediction"])
+            stale = stale or snapshot.response["stale"]
+
     return {
 
         "risk_score": float(prob),
 
+        "risk_level": risk,
+
         "temperature": weather["main"]["temp"],
 
         "humidity": weather["main"]["humidity"],
 
         "wind": wind,
 
-        "rainfall": rainfall
+        "rainfall": rainfall_30d,
+
+        "district": district,
+
+        "stale": stale
     }
 
+
+@app.post("/reverse-geocode")
+async def reverse_geocode(req: ReverseGeocodeRequest):
+
+    if len(req.points) > MAX_GEOCODE_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_GEOCODE_BATCH} points per request")
+
+    index = await scoring.io.run(geo_resource.get)
+    places = await scoring.cpu.run(index.resolve_many, [(p.latitude, p.longitude) for p in req.points])
+
+    return {
+        "results": [
+            None if place is None else {"state": place[0], "district": place[1]}
+            for place in places
+        ]
+    }
+
+# SCENARIO SIMULATION
+# What-if scoring (simulate.py): inputs come from the same tile caches as
+# /predict, fetched in chunks on I/O threads; every district under every
+# scenario is then scored as one batch on a scoring thread.
+
+MAX_SIMULATION_SCENARIOS = int(os.getenv("MAX_SIMULATION_SCENARIOS", "500"))
+SIMULATION_CHUNK = 50                 # districts per I/O job
+SIMULATION_FETCH_CONCURRENCY = 8      # I/O jobs in flight per request
+
+
+def _simulation_districts(refs: List[DistrictRef]):
+
+    _wait_for_scoring_resources()
+
+    if not refs:
+        return list(feature_store_resource.get().names)
+
+    return [resolve_district(ref.state, ref.district)[:2] for ref in refs]
+
+
+def _simulation_inputs(names):
+    """(past_60days, daily forecast) per district; an exception in place of either when unavailable."""
+
+    out = []
+    for state, district in names:
+        coords = get_coordinates(state, district)
+        try:
+            history = get_openmeteo_rainfall(coords["lat"], coords["lon"])
+            out.append((history[4], get_daily_forecast(coords["lat"], coords["lon"])))
+        except resilience.UpstreamUnavailable as e:
+            out.append(e)
+    return out
+
+
+def _run_simulation(names, histories, forecasts, scenarios):
+
+    store = feature_store_resource.get()
+    static = store.static[[store.district_id(s, d) for s, d in names]]
+    horizon = max(sc.days for sc in scenarios)
+
+    inputs = simulate.prepare(static, histories, forecasts, horizon)
+    result = simulate.run(model, classifier, inputs, scenarios, classifier.region_rows(names))
+    return inputs.dates, result
+
+
+@app.post("/simulate")
+async def simulate_scenarios(req: SimulationRequest):
+
+    try:
+        scenarios = simulate.grid(req.multipliers, req.days) + [
+            simulate.Scenario(sc.name, sc.multiplier, sc.rain_mm, sc.days) for sc in req.scenarios
+        ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not scenarios:
+        raise HTTPException(status_code=400, detail="No scenarios given")
+    if len(scenarios) > MAX_SIMULATION_SCENARIOS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SIMULATION_SCENARIOS} scenarios per request")
+
+    names = await scoring.io.run(_simulation_districts, req.districts)
+
+    rows = len(scenarios) * len(names) * max(sc.days for sc in scenarios)
+    if rows > simulate.MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"{rows} feature rows exceeds the limit of {simulate.MAX_ROWS}")
+
+    limit = asyncio.Semaphore(SIMULATION_FETCH_CONCURRENCY)
+
+    async def fetch(chunk):
+        async with limit:
+            return await scoring.io.run(_simulation_inputs, chunk)
+
+    with resilience.track_staleness() as upstream:
+        chunks = [names[i:i + SIMULATION_CHUNK] for i in range(0, len(names), SIMULATION_CHUNK)]
+        fetched = [item for part in await asyncio.gather(*(fetch(c) for c in chunks)) for item in part]
+
+    ok = [(name, item) for name, item in zip(names, fetched) if not isinstance(item, Exception)]
+    unavailable = [
+        {"state": s, "district": d, "error": str(item)}
+        for (s, d), item in zip(names, fetched) if isinstance(item, Exception)
+    ]
+    if not ok:
+        raise HTTPException(
+            status_code=503,
+            detail="No district inputs available",
+            headers={"Retry-After": str(upstream_retry_after())}
+        )
+
+    scored = [name for name, _ in ok]
+    dates, result = await scoring.cpu.run(
+        _run_simulation, scored, [item[0] for _, item in ok], [item[1] for _, item in ok], scenarios
+    )
+
+    # returned as a response: the matrices are plain lists already and can
+    # hold ~10^5 numbers, too many for FastAPI's per-item encoding pass
+    return http_cache.FastJSONResponse({
+        "districts": [{"state": s, "district": d} for s, d in scored],
+        "scenarios": [sc.describe() for sc in scenarios],
+        "dates": dates,
+        "risk_levels": list(risk_levels.RISK_LEVELS),
+        "risk_levels_version": classifier.version,
+
+        # [scenario][district]: peak risk over the scenario horizon, its level
+        # (index into risk_levels) and the forecast day it occurs on
+        "risk": np.round(result["risk"], 3).tolist(),
+        "level": result["level"].tolist(),
+        "peak_day": result["peak_day"].tolist(),
+
+        "unavailable": unavailable,
+        "stale": upstream.stale
+    })
+
 # AUTHENTICATION
 
 @app.post("/auth/signup")
@@ -587,32 +915,106 @@ def logout(token: str):
 
     return {"status": "success"}
 
+# UPSTREAM STATUS
+
+@app.get("/upstream-status")
+def upstream_status():
+    return {
+        **resilience.snapshot(),
+        "scoring": scoring.snapshot(),
+        "coalescing": {
+            "district": district_predictions.snapshot(),
+            "point": point_predictions.snapshot(),
+        },
+        "forecast_tiles": forecast_pipeline.pipeline.snapshot(),
+        "rate_limit": rate_limiter.snapshot(),
+    }
+
+# HEALTH / READINESS
+
+@app.exception_handler(startup.NotReady)
+def not_ready_handler(request: Request, exc: startup.NotReady):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
+@app.exception_handler(scoring.Overloaded)
+def overloaded_handler(request: Request, exc: scoring.Overloaded):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)})
+
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    status = startup.readiness()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 # ROOT ENDPOINT
 
 @app.get("/")
 def root():
     return {"message": "Early Flood Predictor API running"}
 
+_coordinate_reps = {}
+
 @app.get("/coordinates/{state}/{district}")
-def get_coords_api(state: str, district: str):
-    coords = get_coordinates(state, district)
-    return coords
+def get_coords_api(state: str, district: str, request: Request):
+    state_key, district_key, coords = resolve_district(state, district)
+    rep = _coordinate_reps.get((state_key, district_key))
+    if rep is None:
+        rep = _coordinate_reps[(state_key, district_key)] = http_cache.Representation(coords)
+    return http_cache.respond(request, rep)
+
+# REFERENCE DATASETS
+
+_dataset_reps = {}
+
+def _dataset(name: str) -> http_cache.Representation:
+    rep = _dataset_reps.get(name)
+    if rep is None:
+        if name not in DATASETS:
+            raise HTTPException(status_code=404, detail=f"Dataset '{name}' not found")
+        with open(DATASETS[name], "r", encoding="utf-8") as f:
+            rep = _dataset_reps[name] = http_cache.Representation(json.load(f))
+    return rep
+
+@app.get("/datasets")
+def list_datasets():
+    return {name: {"url": f"/datasets/{name}", "etag": _dataset(name).etag} for name in DATASETS}
+
+@app.get("/datasets/{name}")
+def get_dataset(name: str, request: Request):
+    return http_cache.respond(request, _dataset(name))
 
 # MARKER FETCH
+# The marker list is reserialized only when the marker version changes;
+# clients polling with If-None-Match get a 304 after one small query.
+
+_markers_rep = None
+
 @app.get("/risk-markers")
-def get_risk_markers():
-    with user_handler.db.get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT state, district, risk, lat, lon FROM risk_markers")
-        rows = cur.fetchall()
-
-        return [
-            {
-                "state": r["state"],
-                "district": r["district"],
-                "risk": r["risk"],
-                "lat": r["lat"],
-                "lon": r["lon"]
-            }
-            for r in rows
-        ]
+def get_risk_markers(request: Request):
+    global _markers_rep
+
+    db = user_handler.db
+    version = db.risk_markers_version()
+    etag = f'"markers-{version}"'
+
+    if http_cache.etag_matches(request, etag):
+        return http_cache.not_modified(
+            {"ETag": etag, "Cache-Control": http_cache.REVALIDATE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        )
+
+    rep = _markers_rep
+    if rep is None or rep.etag != etag:
+        version, markers = db.get_risk_markers()
+        rep = _markers_rep = http_cache.Representation(
+            markers,
+            etag=f'"markers-{version}"',
+            cache_control=http_cache.REVALIDATE_CACHE_CONTROL
+        )
+
+    return http_cache.respond(request, rep)
+
+
+startup.record("import api", time.perf_counter() - _import_started)
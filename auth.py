@@ -14,6 +14,10 @@ LOCK_DURATION_SEC = 300          # 5-minute lockout period
 SALT_BYTES = 16                  # 128-bit random salt
 SESSION_TIMEOUT_SEC = 1800       # 30 minutes
 
+# "memory": sessions live in this process only (single worker)
+# "database": sessions live in SQLite so every worker process sees them
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+
 # ---------------------------------------------------------------------------
 # UTILITY FUNCTIONS
 # ---------------------------------------------------------------------------
@@ -32,9 +36,10 @@ def hash_password(password: str, salt: str) -> str:
 # ---------------------------------------------------------------------------
 
 class User:
-    def __init__(self, db_path: str = "flood_app.db"):
+    def __init__(self, db_path: str = "flood_app.db", session_store: str = SESSION_STORE):
         self.db = Database(db_path)
-        self.sessions = {}  # user_id → {token, expiry}
+        self.shared_sessions = session_store == "database"
+        self.sessions = {}  # user_id → {token, expiry} (memory store only)
 
     # -----------------------------------------------------------------------
     # REGISTRATION
@@ -91,11 +96,16 @@ class User:
         user_id = record[0]
         token = secrets.token_urlsafe(32)
         expiry = time.time() + SESSION_TIMEOUT_SEC
-        self.sessions[user_id] = {"token": token, "expiry": expiry}
+        if self.shared_sessions:
+            self.db.save_session(user_id, token, expiry)
+        else:
+            self.sessions[user_id] = {"token": token, "expiry": expiry}
         return token
 
     def validate_session(self, token: str) -> Optional[int]:
         """Validate token and return user_id if valid."""
+        if self.shared_sessions:
+            return self.db.get_session_user(token)
         for uid, sess in self.sessions.items():
             if sess["token"] == token and time.time() < sess["expiry"]:
                 return uid
@@ -103,5 +113,7 @@ class User:
 
     def logout(self, user_id: int):
         """Terminate active session."""
-        if user_id in self.sessions:
+        if self.shared_sessions:
+            self.db.delete_sessions(user_id)
+        elif user_id in self.sessions:
             del self.sessions[user_id]
\ No newline at end of file
@@ -0,0 +1,348 @@
+"""
+Historical backtest: replay the flood model over every district for a date
+range using a local rainfall store (see rainfall_store.py).
+
+    python backtest.py --store data/rain --start 2015-06-01 --end 2024-09-30 --out runs/decade
+    python backtest.py ... --labels floods.csv     # observed events -> precision/recall/Brier
+
+The range is split into chunks that are scored in a process pool. Each chunk
+is written as its own columnar part file (Parquet when pyarrow is available,
+otherwise .npz) and the run resumes from whatever parts already exist. When
+every chunk is done, ``summary.json`` gets per-district risk statistics, a
+threshold sweep and, with labels, calibration metrics.
+
+Features come from features.feature_matrix, the vectorised form of the logic
+behind build_features. The store has no hourly rain or wind, so the
+``rain_momentum`` feature (current 1h rain x wind speed) is 0 in backtests.
+Rainfall aggregates follow the live rules (rainfall.rainfall_aggregates):
+days missing from the store are dropped, and a day with under 60 days of
+history behind it gets the same 0.8 x current_30d previous_30d the API
+uses, so early days of a store are scored the way a live request would be.
+Levels use the same calibration and per-region thresholds as the API
+(risk_levels.py). Part files keep the raw probabilities too, so
+``risk_levels.py fit`` can fit a calibration on a finished run.
+"""
+
+import os
+import csv
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import numpy as np
+
+import features
+import risk_levels
+from rainfall import HISTORY_DAYS, rainfall_aggregates_batch
+from rainfall_store import RainfallStore, _parse_date
+
+try:
+    import pandas as pd
+    import pyarrow  # noqa: F401  (parquet engine)
+    _HAS_PARQUET = True
+except Exception:
+    _HAS_PARQUET = False
+
+MODEL_PATH = "flood_xgboost_model.pkl"
+TERRAIN_PATH = "terrain_lookup.json"
+COORDINATE_PATH = "indian_district_coordinates.json"
+
+SWEEP_THRESHOLDS = [round(t, 2) for t in np.arange(0.5, 0.96, 0.05)]
+RELIABILITY_BINS = 10
+
+
+# ---------------------------------------------------------------------------
+# DISTRICT TABLE
+# ---------------------------------------------------------------------------
+
+def load_districts(path: str = COORDINATE_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    names = [(s, d) for s, ds in data.items() for d in ds]
+    lats = np.array([data[s][d]["lat"] for s, d in names])
+    lons = np.array([data[s][d]["lon"] for s, d in names])
+    return names, lats, lons
+
+
+def district_terrain(lats: np.ndarray, lons: np.ndarray, terrain_path: str = TERRAIN_PATH) -> np.ndarray:
+    """(D, 8) terrain rows, the same nearest-neighbour lookup build_features does."""
+    terrain = features.load_terrain(terrain_path)
+    return terrain.matrix[terrain.nearest(lats, lons)]
+
+
+# ---------------------------------------------------------------------------
+# WORKER
+# ---------------------------------------------------------------------------
+
+_worker = {}
+
+
+def _init_worker(model_path, store_path, terrain, rows, cols, threads, classifier, regions):
+    model = features.load_model(model_path)
+    if threads:
+        model.set_params(n_jobs=threads)
+    _worker.update(
+        model=model,
+        store=RainfallStore(store_path),
+        terrain=terrain,
+        rows=rows,
+        cols=cols,
+        classifier=classifier,
+        regions=regions,
+    )
+
+
+def score_chunk(start_index: int, end_index: int):
+    """Score every district for store days [start_index, end_index] in one predict_proba call."""
+    store, terrain = _worker["store"], _worker["terrain"]
+    days = end_index - start_index + 1
+    n = terrain.shape[0]
+
+    # one contiguous read covering the chunk plus its 60-day history
+    series = store.window(_worker["rows"], _worker["cols"], end_index, days + HISTORY_DAYS - 1)
+    windows = np.lib.stride_tricks.sliding_window_view(series, HISTORY_DAYS, axis=1)   # (D, days, 60)
+    windows = windows.transpose(1, 0, 2).reshape(days * n, HISTORY_DAYS)                # day-major rows
+
+    rain_24h, rain_7d, current_30d, previous_30d = rainfall_aggregates_batch(windows)
+
+    # no hourly rain / wind in daily stores: rain_momentum = 0
+    X = features.feature_matrix(np.tile(terrain, (days, 1)), rain_24h, rain_7d, current_30d, previous_30d)
+    prob = _worker["model"].predict_proba(X)[:, 1].astype(np.float32)
+    calibrated, level = _worker["classifier"].classify(prob, np.tile(_worker["regions"], days))
+
+    return {
+        "day": np.repeat(np.arange(start_index, end_index + 1, dtype=np.int32), n),
+        "district": np.tile(np.arange(n, dtype=np.int32), days),
+        "prob": prob,                                   # raw model output (what calibration is fitted on)
+        "calibrated": calibrated.astype(np.float32),
+        "level": level.astype(np.int8),
+        "rain_24h": rain_24h.astype(np.float32),
+        "rain_7d": rain_7d.astype(np.float32),
+        "current_30d": current_30d.astype(np.float32),
+        "previous_30d": previous_30d.astype(np.float32),
+    }
+
+
+# ---------------------------------------------------------------------------
+# PART FILES (checkpoints)
+# ---------------------------------------------------------------------------
+
+def _part_name(start: date, end: date) -> str:
+    ext = "parquet" if _HAS_PARQUET else "npz"
+    return f"part-{start:%Y%m%d}-{end:%Y%m%d}.{ext}"
+
+
+def write_part(path: str, columns: dict):
+    tmp = path + ".tmp"
+    if _HAS_PARQUET:
+        pd.DataFrame(columns).to_parquet(tmp, index=False)
+    else:
+        with open(tmp, "wb") as f:
+            np.savez(f, **columns)
+    os.replace(tmp, path)   # a part either exists completely or not at all
+
+
+def read_part(path: str) -> dict:
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+        return {c: df[c].to_numpy() for c in df.columns}
+    with np.load(path) as z:
+        return {k: z[k] for k in z.files}
+
+
+# ---------------------------------------------------------------------------
+# SUMMARY
+# ---------------------------------------------------------------------------
+
+def load_labels(path: str, names, store: RainfallStore) -> set:
+    """CSV with state, district, date columns listing observed flood days."""
+    index = {(s.lower(), d.lower()): i for i, (s, d) in enumerate(names)}
+    events = set()
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            key = (row["state"].strip().lower(), row["district"].strip().lower())
+            if key in index:
+                events.add((store.day_index(row["date"]), index[key]))
+    return events
+
+
+def summarize(cols: dict, names, classifier: risk_levels.RiskClassifier, labels=None) -> dict:
+    prob = cols["calibrated"].astype(np.float64)
+    level = cols["level"]
+    district = cols["district"]
+    n = len(names)
+
+    counts = np.zeros((n, len(risk_levels.RISK_LEVELS)), dtype=np.int64)
+    np.add.at(counts, (district, level), 1)
+    sum_prob = np.bincount(district, weights=prob, minlength=n)
+    max_prob = np.zeros(n)
+    np.maximum.at(max_prob, district, prob)
+    days = counts.sum(axis=1)
+
+    per_district = {
+        f"{s}/{d}": {
+            "days": int(days[i]),
+            **{lvl.lower(): int(counts[i, k]) for k, lvl in enumerate(risk_levels.RISK_LEVELS)},
+            "mean_prob": round(float(sum_prob[i] / days[i]), 4) if days[i] else None,
+            "max_prob": round(float(max_prob[i]), 4),
+        }
+        for i, (s, d) in enumerate(names)
+    }
+
+    sweep = {str(t): round(float((prob >= t).mean()), 5) for t in SWEEP_THRESHOLDS}
+
+    summary = {
+        "rows": int(len(prob)),
+        "risk_levels": classifier.describe(),
+        "level_share": {
+            lvl: round(float((level == k).mean()), 5) for k, lvl in enumerate(risk_levels.RISK_LEVELS)
+        },
+        "share_above_threshold": sweep,
+        "probability_histogram": np.histogram(prob, bins=RELIABILITY_BINS, range=(0, 1))[0].tolist(),
+        "districts": per_district,
+    }
+
+    if labels is not None:
+        y = np.fromiter(
+            ((int(t), int(d)) in labels for t, d in zip(cols["day"], district)), dtype=bool, count=len(prob)
+        )
+        summary["calibration"] = calibration(prob, y)
+
+    return summary
+
+
+def calibration(prob: np.ndarray, y: np.ndarray) -> dict:
+    bins = np.minimum((prob * RELIABILITY_BINS).astype(int), RELIABILITY_BINS - 1)
+    count = np.bincount(bins, minlength=RELIABILITY_BINS)
+    pred = np.bincount(bins, weights=prob, minlength=RELIABILITY_BINS)
+    obs = np.bincount(bins, weights=y, minlength=RELIABILITY_BINS)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        reliability = [
+            {"bin": f"{k / RELIABILITY_BINS:.1f}-{(k + 1) / RELIABILITY_BINS:.1f}", "count": int(count[k]),
+             "mean_pred": round(float(pred[k] / count[k]), 4) if count[k] else None,
+             "observed_rate": round(float(obs[k] / count[k]), 4) if count[k] else None}
+            for k in range(RELIABILITY_BINS)
+        ]
+
+    sweep = {}
+    positives = int(y.sum())
+    for t in SWEEP_THRESHOLDS:
+        flagged = prob >= t
+        tp = int((flagged & y).sum())
+        precision = tp / flagged.sum() if flagged.any() else 0.0
+        recall = tp / positives if positives else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        sweep[str(t)] = {"precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4)}
+
+    return {
+        "events": positives,
+        "brier": round(float(np.mean((prob - y) ** 2)), 6),
+        "reliability": reliability,
+        "threshold_sweep": sweep,
+    }
+
+
+# ---------------------------------------------------------------------------
+# DRIVER
+# ---------------------------------------------------------------------------
+
+def run(store_path: str, start, end, out_dir: str, workers: int = 0, chunk_days: int = 30,
+        labels_path: str = None, model_path: str = MODEL_PATH,
+        calibration_path: str = risk_levels.CALIBRATION_PATH) -> dict:
+    t0 = time.time()
+    store = RainfallStore(store_path)
+    start, end = _parse_date(start), _parse_date(end)
+    start = max(start, store.start)
+    end = min(end, store.end)
+    if start > end:
+        raise ValueError(f"no overlap between the requested range and the store ({store.start}..{store.end})")
+
+    names, lats, lons = load_districts()
+    terrain = district_terrain(lats, lons)
+    classifier = risk_levels.load(calibration_path, model_path)
+    regions = classifier.region_rows(names)
+    rows, cols, inside = store.cell(lats, lons)
+    if not inside.all():
+        print(f"[WARN] {int((~inside).sum())} districts fall outside the store grid and are clamped to its edge")
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    manifest = {
+        "store": os.path.abspath(store_path),
+        "model_sha256": hashlib.sha256(open(model_path, "rb").read()).hexdigest(),
+        "risk_levels_version": classifier.version,
+        "chunk_days": chunk_days,
+        "start": start.isoformat(),
+        "districts": [f"{s}/{d}" for s, d in names],
+    }
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+        if {k: previous.get(k) for k in manifest} != manifest:
+            raise RuntimeError(f"{out_dir} holds a different run (store/model/calibration/chunking changed); use a new --out")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+
+    chunks = []
+    d = start
+    while d <= end:
+        e = min(end, d + timedelta(days=chunk_days - 1))
+        chunks.append((d, e))
+        d = e + timedelta(days=1)
+
+    todo = [(s, e) for s, e in chunks if not os.path.exists(os.path.join(out_dir, _part_name(s, e)))]
+    print(f"{len(chunks)} chunks, {len(chunks) - len(todo)} already done, {len(names)} districts")
+
+    workers = workers or os.cpu_count() or 1
+    threads = 1 if workers > 1 else None
+    init = (model_path, store_path, terrain, rows, cols, threads, classifier, regions)
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init) as pool:
+            futures = {
+                pool.submit(score_chunk, store.day_index(s), store.day_index(e)): (s, e) for s, e in todo
+            }
+            for done, fut in enumerate(as_completed(futures), 1):
+                s, e = futures[fut]
+                write_part(os.path.join(out_dir, _part_name(s, e)), fut.result())
+                print(f"  [{done}/{len(todo)}] {s} .. {e}")
+
+    parts = [read_part(os.path.join(out_dir, _part_name(s, e))) for s, e in chunks]
+    combined = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+    labels = load_labels(labels_path, names, store) if labels_path else None
+    summary = summarize(combined, names, classifier, labels)
+    summary.update(
+        start=start.isoformat(),
+        end=end.isoformat(),
+        store_start=store.start.isoformat(),
+        elapsed_s=round(time.time() - t0, 2),
+    )
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", required=True, help="rainfall store directory")
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", required=True)
+    parser.add_argument("--out", required=True, help="output directory (part files, manifest, summary.json)")
+    parser.add_argument("--workers", type=int, default=0, help="process pool size (default: all cores)")
+    parser.add_argument("--chunk-days", type=int, default=30)
+    parser.add_argument("--labels", default=None, help="CSV of observed floods: state,district,date")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--calibration", default=risk_levels.CALIBRATION_PATH, help="risk_levels.py artifact")
+    args = parser.parse_args(argv)
+
+    summary = run(args.store, args.start, args.end, args.out, args.workers, args.chunk_days, args.labels,
+                  args.model, args.calibration)
+    print(json.dumps({k: summary[k] for k in ("rows", "level_share", "elapsed_s")}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,533 @@
+"""
+Offline benchmark and load-test suite for the flood prediction API.
+
+Every upstream call (OpenWeather current/forecast, Open-Meteo archive, FCM)
+is answered from the recorded responses in ``benchmarks/fixtures`` so runs
+are reproducible and need no network access or API keys.
+
+Usage (from the repository root):
+
+    python benchmarks/bench.py run                      # micro + load
+    python benchmarks/bench.py run --only micro -n 5000
+    python benchmarks/bench.py run --only load --concurrency 32 --requests 2000
+    python benchmarks/bench.py compare results/a.json results/b.json
+
+Results are written as JSON to ``benchmarks/results`` (one file per run,
+named after the current git commit) so they can be diffed between commits.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+FIXTURE_DIR = os.path.join(BENCH_DIR, "fixtures")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+# ---------------------------------------------------------------------------
+# FIXTURE REPLAY
+# ---------------------------------------------------------------------------
+
+# (host, path prefix) -> fixture file
+FIXTURE_ROUTES = [
+    ("api.openweathermap.org", "/data/2.5/weather", "openweather_current.json"),
+    ("api.openweathermap.org", "/data/2.5/forecast", "openweather_forecast.json"),
+    ("archive-api.open-meteo.com", "/v1/archive", "openmeteo_archive.json"),
+]
+
+
+class FixtureReplayer:
+    """
+    Patch ``requests`` so every HTTP call is served from local fixtures.
+
+    Unknown URLs raise ``requests.ConnectionError`` so a benchmark can never
+    silently reach the network. ``latency_ms`` adds an artificial delay per
+    call to emulate upstream round trips.
+    """
+
+    def __init__(self, fixture_dir: str = FIXTURE_DIR, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.bodies = {}
+        for _, _, name in FIXTURE_ROUTES:
+            with open(os.path.join(fixture_dir, name), "rb") as f:
+                self.bodies[name] = f.read()
+        self.calls = {}
+        self._original = None
+
+    def _resolve(self, method: str, url: str):
+        parsed = urlparse(url)
+        if method.upper() == "POST" and parsed.hostname == "fcm.googleapis.com":
+            return b'{"name": "projects/bench/messages/0"}'
+        for host, prefix, name in FIXTURE_ROUTES:
+            if parsed.hostname == host and parsed.path.startswith(prefix):
+                return self.bodies[name]
+        return None
+
+    def _request(self, session, method, url, **kwargs):
+        body = self._resolve(method, url)
+        if body is None:
+            raise requests.ConnectionError(f"bench: no fixture for {method} {url}")
+        if self.latency:
+            time.sleep(self.latency)
+        host = urlparse(url).hostname
+        self.calls[host] = self.calls.get(host, 0) + 1
+
+        # Open-Meteo multi-location queries answer with one object per location
+        lats = str((kwargs.get("params") or {}).get("latitude", ""))
+        if host == "archive-api.open-meteo.com" and "," in lats:
+            body = b"[" + b",".join([body] * len(lats.split(","))) + b"]"
+
+        resp = requests.Response()
+        resp.status_code = 200
+        resp._content = body
+        resp.headers["Content-Type"] = "application/json"
+        resp.url = url
+        resp.encoding = "utf-8"
+        return resp
+
+    def __enter__(self):
+        self._original = requests.sessions.Session.request
+        replayer = self
+
+        def request(session, method, url, **kwargs):
+            return replayer._request(session, method, url, **kwargs)
+
+        requests.sessions.Session.request = request
+        return self
+
+    def __exit__(self, *exc):
+        requests.sessions.Session.request = self._original
+        return False
+
+
+# ---------------------------------------------------------------------------
+# MEASUREMENT HELPERS
+# ---------------------------------------------------------------------------
+
+def rss_mb() -> dict:
+    """Current and peak resident set size of this process in MiB."""
+    current = None
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        current = pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    return {"current": round(current, 1) if current else None, "peak": round(peak, 1)}
+
+
+def summarize(samples_s, wall_s: float) -> dict:
+    """Latency percentiles (ms) and throughput for a list of per-call durations."""
+    arr = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    if not len(arr):
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {
+        "count": int(len(arr)),
+        "throughput_per_s": round(len(arr) / wall_s, 1) if wall_s else None,
+        "mean_ms": round(float(arr.mean()), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "max_ms": round(float(arr.max()), 4),
+    }
+
+
+def timeit(fn, iterations: int, warmup: int = 50) -> dict:
+    for _ in range(min(warmup, iterations)):
+        fn()
+    samples = []
+    clock = time.perf_counter
+    start = clock()
+    for _ in range(iterations):
+        t0 = clock()
+        fn()
+        samples.append(clock() - t0)
+    return summarize(samples, clock() - start)
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT, capture_output=True, text=True, timeout=10,
+        )
+        return out.stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+# ---------------------------------------------------------------------------
+# APP SETUP
+# ---------------------------------------------------------------------------
+
+def load_api(db_dir: str):
+    """Import ``api`` from the repo root with a throwaway SQLite database."""
+    os.chdir(REPO_ROOT)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+    # the load test is one client firing thousands of requests
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+    t0 = time.perf_counter()
+    import api
+    from auth import User
+    import_s = time.perf_counter() - t0
+
+    # Never write benchmark markers into the real database
+    api.users_resource.set(User(os.path.join(db_dir, "bench.db")))
+    api.startup.load_all()
+    return api, import_s
+
+
+def clear_caches(api):
+    """Drop every upstream/response cache so the next request goes to the fixtures."""
+    api.resilience.response_cache.clear()
+    api.district_predictions.clear()
+    api.point_predictions.clear()
+
+
+def load_districts():
+    with open(os.path.join(REPO_ROOT, "indian_district_coordinates.json"), encoding="utf-8") as f:
+        data = json.load(f)
+    return [(s, d, c["lat"], c["lon"]) for s, ds in data.items() for d, c in ds.items()]
+
+
+def load_fixture(name: str):
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------------------------------------------------------------------------
+# MICROBENCHMARKS
+# ---------------------------------------------------------------------------
+
+def run_micro(api, iterations: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    districts = load_districts()
+    weather = load_fixture("openweather_current.json")
+    forecast_list = load_fixture("openweather_forecast.json")["list"]
+    points = [(d[2], d[3]) for d in districts]
+
+    def pick():
+        return points[rng.randrange(len(points))]
+
+    def bench_build_features():
+        lat, lon = pick()
+        api.build_features(lat, lon, weather, 12.5, 96.0, 410.0, 355.0)
+
+    def bench_find_nearest_terrain():
+        lat, lon = pick()
+        api.find_nearest_terrain(lat, lon)
+
+    store = api.feature_store_resource.get()
+    dynamic = np.array([[12.5, 96.0, 410.0, 355.0, 1.2, 3.4]] * 6)
+
+    def bench_district_feature_rows():
+        # the request path: static row + today and 5 forecast days in one call
+        s, d, _, _ = districts[rng.randrange(len(districts))]
+        static = store.district_row(s, d)
+        api.features.feature_matrix(np.broadcast_to(static, (6, static.shape[0])), *dynamic.T)
+
+    def bench_process_forecast_daily():
+        api.process_forecast_daily(forecast_list)
+
+    # a refreshed forecast for the same tile: the window moved on by one
+    # point and the last day changed, so only the head and tail are regrouped
+    refreshed = [dict(item) for item in forecast_list[1:]]
+    refreshed[-1] = {**refreshed[-1], "rain": {"3h": 7.5}}
+    pipeline = api.forecast_pipeline.ForecastPipeline()
+
+    def bench_forecast_tile_refresh():
+        pipeline.daily(("bench",), {"list": forecast_list})
+        pipeline.daily(("bench",), {"list": refreshed})
+
+    tile_points = [api.forecast_pipeline.parse(forecast_list)] * 100
+
+    def bench_forecast_daily_100_tiles():
+        api.forecast_pipeline.aggregate_many(tile_points)
+
+    X = np.array(api.build_features(19.07, 72.87, weather, 12.5, 96.0, 410.0, 355.0)[0]).reshape(1, -1)
+
+    def bench_predict_proba():
+        api.model.predict_proba(X)
+
+    X_batch = np.repeat(X, 1000, axis=0)
+
+    def bench_predict_proba_batch1000():
+        api.model.predict_proba(X_batch)
+
+    geo = api.geo_resource.get()
+    jitter = [(lat + rng.uniform(-0.1, 0.1), lon + rng.uniform(-0.1, 0.1)) for lat, lon in points]
+
+    def bench_reverse_geocode():
+        geo.resolve(*pick())
+
+    def bench_reverse_geocode_batch1000():
+        geo.resolve_many(jitter[:1000])
+
+    # what-if scoring: every district under 100 rainfall multipliers, 3 days
+    sim_inputs = api.simulate.prepare(
+        store.static, [[3.0] * 60] * len(store), [api.process_forecast_daily(forecast_list)] * len(store), 3
+    )
+    sim_scenarios = api.simulate.grid([0.5 + 0.02 * i for i in range(100)], days=3)
+    sim_regions = api.classifier.region_rows(store.names)
+
+    def bench_simulate_all_districts_x100():
+        api.simulate.run(api.model, api.classifier, sim_inputs, sim_scenarios, sim_regions)
+
+    buckets = api.rate_limit.MemoryBuckets()
+    clients = [f"ip:10.0.{i // 256}.{i % 256}" for i in range(5000)]
+
+    def bench_rate_limit_take():
+        buckets.take(clients[rng.randrange(len(clients))], 1)
+
+    def bench_get_coordinates():
+        s, d, _, _ = districts[rng.randrange(len(districts))]
+        api.get_coordinates(s, d)
+
+    cases = {
+        "build_features": (bench_build_features, iterations),
+        "find_nearest_terrain": (bench_find_nearest_terrain, iterations),
+        "district_feature_rows": (bench_district_feature_rows, iterations),
+        "process_forecast_daily": (bench_process_forecast_daily, iterations),
+        "forecast_tile_refresh": (bench_forecast_tile_refresh, iterations),
+        "forecast_daily_100_tiles": (bench_forecast_daily_100_tiles, max(10, iterations // 10)),
+        "predict_proba": (bench_predict_proba, iterations),
+        "predict_proba_batch1000": (bench_predict_proba_batch1000, max(10, iterations // 100)),
+        "get_coordinates": (bench_get_coordinates, max(10, iterations // 10)),
+        "simulate_all_districts_x100": (bench_simulate_all_districts_x100, max(5, iterations // 500)),
+        "rate_limit_take": (bench_rate_limit_take, iterations),
+        "reverse_geocode": (bench_reverse_geocode, iterations),
+        "reverse_geocode_batch1000": (bench_reverse_geocode_batch1000, max(10, iterations // 100)),
+    }
+
+    results = {}
+    for name, (fn, n) in cases.items():
+        results[name] = timeit(fn, n)
+        print(f"  {name:<28} p50={results[name]['p50_ms']:.4f}ms  p99={results[name]['p99_ms']:.4f}ms")
+    return results
+
+
+# ---------------------------------------------------------------------------
+# LOAD TEST
+# ---------------------------------------------------------------------------
+
+async def _load(api, total: int, concurrency: int, mix: dict, cold: bool, seed: int) -> dict:
+    import httpx
+
+    rng = random.Random(seed)
+    districts = load_districts()
+
+    def next_request():
+        r = rng.random() * sum(mix.values())
+        for kind, weight in mix.items():
+            if r < weight:
+                break
+            r -= weight
+        s, d, lat, lon = districts[rng.randrange(len(districts))]
+        if kind == "predict":
+            return kind, "POST", f"/predict/{s}/{d}", {"timestamp": 0}
+        if kind == "predict_coords":
+            return kind, "POST", "/predict-by-coordinates", {"latitude": lat, "longitude": lon}
+        if kind == "coordinates":
+            return kind, "GET", f"/coordinates/{s}/{d}", None
+        if kind == "risk_markers":
+            return kind, "GET", "/risk-markers", None
+        return kind, "GET", "/", None
+
+    samples = {}
+    errors = {}
+    sem = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=api.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one():
+            kind, method, path, body = next_request()
+            async with sem:
+                if cold:
+                    clear_caches(api)
+                t0 = time.perf_counter()
+                resp = await client.request(method, path, json=body)
+                elapsed = time.perf_counter() - t0
+            samples.setdefault(kind, []).append(elapsed)
+            if resp.status_code >= 400:
+                key = f"{kind}:{resp.status_code}"
+                errors[key] = errors.get(key, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        wall = time.perf_counter() - start
+
+    all_samples = [s for v in samples.values() for s in v]
+    return {
+        "overall": summarize(all_samples, wall),
+        "by_endpoint": {k: summarize(v, wall) for k, v in samples.items()},
+        "errors": errors,
+        "wall_s": round(wall, 3),
+    }
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def run_load(api, args) -> dict:
+    mix = parse_mix(args.mix)
+    result = asyncio.run(_load(api, args.requests, args.concurrency, mix, args.cold, args.seed))
+    o = result["overall"]
+    print(
+        f"  {o['count']} requests @ c={args.concurrency}: {o['throughput_per_s']} req/s  "
+        f"p50={o['p50_ms']:.2f}ms p95={o['p95_ms']:.2f}ms p99={o['p99_ms']:.2f}ms"
+    )
+    if result["errors"]:
+        print("  errors:", result["errors"])
+    result["concurrency"] = args.concurrency
+    result["mix"] = mix
+    result["cold"] = args.cold
+    return result
+
+
+# ---------------------------------------------------------------------------
+# COMMANDS
+# ---------------------------------------------------------------------------
+
+def cmd_run(args):
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp, FixtureReplayer(latency_ms=args.upstream_latency_ms) as replayer:
+        api, import_s = load_api(tmp)
+
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.time(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "args": {k: v for k, v in vars(args).items() if k != "func"},
+            },
+            "import_s": round(import_s, 4),
+            "startup_timings_s": api.startup.timings(),
+            "rss_after_import_mb": rss_mb(),
+        }
+
+        if args.only in (None, "micro"):
+            print("microbenchmarks:")
+            report["micro"] = run_micro(api, args.iterations, args.seed)
+            report["rss_after_micro_mb"] = rss_mb()
+
+        if args.only in (None, "load"):
+            print("load test:")
+            report["load"] = run_load(api, args)
+            report["rss_after_load_mb"] = rss_mb()
+
+        report["upstream_calls"] = replayer.calls
+        api.user_handler.db.close()
+
+    out = args.output
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"{report['meta']['commit']}-{int(time.time())}.json")
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {out}")
+
+
+def _flatten(report: dict) -> dict:
+    flat = {}
+    for name, stats in report.get("micro", {}).items():
+        for k in ("p50_ms", "p95_ms", "p99_ms", "throughput_per_s"):
+            flat[f"micro.{name}.{k}"] = stats.get(k)
+    load = report.get("load", {})
+    for name, stats in [("overall", load.get("overall", {}))] + list(load.get("by_endpoint", {}).items()):
+        for k in ("p50_ms", "p95_ms", "p99_ms", "throughput_per_s"):
+            flat[f"load.{name}.{k}"] = stats.get(k)
+    for key in ("rss_after_import_mb", "rss_after_load_mb"):
+        if report.get(key):
+            flat[f"{key}.peak"] = report[key]["peak"]
+    flat["import_s"] = report.get("import_s")
+    return flat
+
+
+def cmd_compare(args):
+    with open(args.baseline) as f:
+        base = _flatten(json.load(f))
+    with open(args.candidate) as f:
+        cand = _flatten(json.load(f))
+
+    regressions = 0
+    print(f"{'metric':<52} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for key in sorted(set(base) | set(cand)):
+        a, b = base.get(key), cand.get(key)
+        if a is None or b is None:
+            continue
+        change = (b - a) / a * 100 if a else 0.0
+        # Throughput regresses downwards, everything else upwards
+        worse = -change if key.endswith("throughput_per_s") else change
+        flag = ""
+        if worse > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{key:<52} {a:>12.4f} {b:>12.4f} {change:>+8.1f}%{flag}")
+
+    if regressions:
+        print(f"{regressions} metric(s) regressed by more than {args.threshold}%")
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run microbenchmarks and/or the in-process load test")
+    run.add_argument("--only", choices=["micro", "load"], default=None)
+    run.add_argument("-n", "--iterations", type=int, default=2000, help="iterations per microbenchmark")
+    run.add_argument("-c", "--concurrency", type=int, default=16)
+    run.add_argument("-r", "--requests", type=int, default=500, help="total load-test requests")
+    run.add_argument(
+        "--mix", default="predict=4,predict_coords=2,coordinates=2,risk_markers=1,root=1",
+        help="weighted endpoint mix, e.g. predict=1,root=3",
+    )
+    run.add_argument("--cold", action="store_true", help="clear upstream caches before every request")
+    run.add_argument("--upstream-latency-ms", type=float, default=0.0, help="artificial delay per upstream call")
+    run.add_argument("--seed", type=int, default=1234)
+    run.add_argument("-o", "--output", default=None, help="result file (default: benchmarks/results/<commit>-<ts>.json)")
+    run.set_defaults(func=cmd_run)
+
+    cmp_ = sub.add_parser("compare", help="diff two result files")
+    cmp_.add_argument("baseline")
+    cmp_.add_argument("candidate")
+    cmp_.add_argument("--threshold", type=float, default=10.0, help="percent change counted as a regression")
+    cmp_.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Local stand-in for the Gemini REST API, for exercising /chat and
+/chat/stream without network access or an API key.
+
+    python benchmarks/fake_gemini.py --port 8765 --token-delay-ms 40 --first-token-ms 300
+    GEMINI_API_KEY=fake GEMINI_BASE_URL=http://127.0.0.1:8765 uvicorn api:app
+
+It answers ``:generateContent`` with one JSON body and
+``:streamGenerateContent?alt=sse`` word by word, echoing how many turns it
+received so history truncation is visible in the reply.
+"""
+
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = (
+    "Move to higher ground immediately and avoid walking or driving through flood water. "
+    "Keep your phone charged, carry drinking water and important documents, and call 112 "
+    "or the NDRF helpline if you are stranded."
+)
+
+
+def _candidate(text: str, final: bool) -> dict:
+    body = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}]}
+    if final:
+        body["candidates"][0]["finishReason"] = "STOP"
+        body["usageMetadata"] = {"promptTokenCount": 0, "candidatesTokenCount": len(REPLY.split())}
+    return body
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    token_delay = 0.03
+    first_token_delay = 0.2
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        turns = len(request.get("contents", []))
+        reply = f"[{turns} turn(s) received] {REPLY}"
+
+        if ":streamGenerateContent" in self.path:
+            self._stream(reply)
+        elif ":generateContent" in self.path:
+            time.sleep(self.first_token_delay + self.token_delay * len(reply.split()))
+            payload = json.dumps(_candidate(reply, final=True)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        else:
+            self.send_error(404)
+
+    def _stream(self, reply: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        words = reply.split(" ")
+        time.sleep(self.first_token_delay)
+        try:
+            for i, word in enumerate(words):
+                final = i == len(words) - 1
+                event = b"data: " + json.dumps(_candidate(word + ("" if final else " "), final)).encode() + b"\r\n\r\n"
+                self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+                self.wfile.flush()
+                time.sleep(self.token_delay)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # the API cancelled the stream after its client disconnected
+            pass
+
+
+def serve(port: int, token_delay_ms: float, first_token_ms: float):
+    FakeGeminiHandler.token_delay = token_delay_ms / 1000.0
+    FakeGeminiHandler.first_token_delay = first_token_ms / 1000.0
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeGeminiHandler)
+    print(f"fake Gemini listening on http://127.0.0.1:{port}")
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--token-delay-ms", type=float, default=30)
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    args = parser.parse_args()
+    serve(args.port, args.token_delay_ms, args.first_token_ms).serve_forever()
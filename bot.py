@@ -1,10 +1,27 @@
 import os
-from fastapi import APIRouter, HTTPException
+import json
+import asyncio
+import threading
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from google import genai
+
+import faq
+import startup
 
 router = APIRouter()
 
+# CONFIGURATION
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+# Point at a local fake server (see benchmarks/fake_gemini.py) for offline testing
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+
+CHAT_TIMEOUT_SEC = float(os.getenv("CHAT_TIMEOUT", "30"))           # whole completion
+FIRST_TOKEN_TIMEOUT_SEC = float(os.getenv("CHAT_FIRST_TOKEN_TIMEOUT", "10"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKENS", "2000"))
+
 _CHAT_SYSTEM = """
 You are MEGHDOOT an AI Assistant inside the SACHETNA flood awareness app.
 
@@ -40,31 +57,217 @@ class ChatRequest(BaseModel):
     message: str
     history: list[ChatMessage] = []
 
+
+# GEMINI CLIENT (one per process, connections are reused across requests)
+# google-genai is imported on first use so it does not slow down API startup.
+
+_client = None
+_config = None
+_types = None
+_client_lock = threading.Lock()
+
+def genai_types():
+
+    global _types
+
+    if _types is None:
+        with startup.phase("import google.genai"):
+            from google.genai import types
+        _types = types
+
+    return _types
+
+def get_client():
+
+    global _client, _config
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                types = genai_types()
+                from google import genai
+
+                api_key = os.getenv("GEMINI_API_KEY")
+
+                if not api_key:
+                    raise HTTPException(status_code=500, detail="GEMINI_API_KEY missing")
+
+                options = {"timeout": int(CHAT_TIMEOUT_SEC * 1000)}
+                if GEMINI_BASE_URL:
+                    options["base_url"] = GEMINI_BASE_URL
+
+                _config = types.GenerateContentConfig(system_instruction=_CHAT_SYSTEM)
+                _client = genai.Client(api_key=api_key, http_options=types.HttpOptions(**options))
+
+    return _client
+
+
+# CONVERSATION CONTEXT
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English / Hinglish text; good enough for budgeting
+    return len(text) // 4 + 1
+
+def build_contents(req: ChatRequest, budget: int = HISTORY_TOKEN_BUDGET):
+    """
+    The new message plus as much recent history as fits in ``budget`` tokens,
+    oldest first. Older turns are dropped whole, never cut mid-message.
+    """
+    types = genai_types()
+    contents = [types.Content(role="user", parts=[types.Part(text=req.message)])]
+    used = estimate_tokens(req.message)
+
+    for msg in reversed(req.history):
+        cost = estimate_tokens(msg.content)
+        if used + cost > budget:
+            break
+        role = "user" if msg.role.lower() == "user" else "model"
+        contents.append(types.Content(role=role, parts=[types.Part(text=msg.content)]))
+        used += cost
+
+    contents.reverse()
+
+    # Gemini expects the conversation to open with a user turn
+    while contents and contents[0].role != "user":
+        contents.pop(0)
+
+    return contents
+
+# CHAT
+
+def local_reply(req: ChatRequest):
+    """
+    (reply, source) from the FAQ index or the reply cache, or (None, None).
+
+    Only stand-alone questions are answered locally; a follow-up with history
+    may depend on context the cache key does not capture.
+    """
+    if req.history:
+        return None, None
+
+    hit = faq.answer(req.message)
+    if hit:
+        return hit["answer"], "faq"
+
+    cached = faq.reply_cache.get(req.message)
+    if cached:
+        return cached, "cache"
+
+    return None, None
+
+
 @router.post("/chat")
 def chat(req: ChatRequest):
 
-    api_key = os.getenv("GEMINI_API_KEY")
+    reply, source = local_reply(req)
+    if reply:
+        return {"reply": reply, "source": source}
 
-    if not api_key:
-        raise HTTPException(status_code=500, detail="GEMINI_API_KEY missing")
+    client = get_client()
 
     try:
 
-        client = genai.Client(api_key=api_key)
-
-        prompt = _CHAT_SYSTEM + "\n\nUser: " + req.message
-
         response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
+            model=GEMINI_MODEL,
+            contents=build_contents(req),
+            config=_config
         )
 
         reply = response.text.strip()
 
-        return {"reply": reply}
+        if not req.history:
+            faq.reply_cache.set(req.message, reply)
+
+        return {"reply": reply, "source": "model"}
 
     except Exception as e:
         raise HTTPException(
             status_code=502,
             detail=f"Gemini API error: {str(e)}"
         )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _stream_local(reply: str, source: str):
+    yield _sse("delta", {"text": reply})
+    yield _sse("done", {"source": source})
+
+async def _stream_reply(req: ChatRequest, request: Request):
+
+    client = get_client()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CHAT_TIMEOUT_SEC
+    stream = None
+    parts = []
+
+    try:
+        stream = await asyncio.wait_for(
+            client.aio.models.generate_content_stream(
+                model=GEMINI_MODEL,
+                contents=build_contents(req),
+                config=_config
+            ),
+            timeout=FIRST_TOKEN_TIMEOUT_SEC
+        )
+
+        chunks = stream.__aiter__()
+        first = True
+
+        while True:
+            timeout = min(FIRST_TOKEN_TIMEOUT_SEC, deadline - loop.time()) if first else deadline - loop.time()
+            if timeout <= 0:
+                raise asyncio.TimeoutError()
+
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+            except StopAsyncIteration:
+                break
+
+            # Stop paying for tokens nobody will read
+            if await request.is_disconnected():
+                return
+
+            if chunk.text:
+                first = False
+                parts.append(chunk.text)
+                yield _sse("delta", {"text": chunk.text})
+
+        if parts and not req.history:
+            faq.reply_cache.set(req.message, "".join(parts).strip())
+
+        yield _sse("done", {"source": "model"})
+
+    except asyncio.TimeoutError:
+        yield _sse("error", {"detail": "Gemini API timeout"})
+
+    except Exception as e:
+        yield _sse("error", {"detail": f"Gemini API error: {str(e)}"})
+
+    finally:
+        # Cancelled on client disconnect too: close the upstream HTTP stream
+        if stream is not None and hasattr(stream, "aclose"):
+            try:
+                await stream.aclose()
+            except Exception:
+                pass
+
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest, request: Request):
+    """Server-sent events: ``delta`` events with text, then ``done`` (with the reply source) or ``error``."""
+
+    reply, source = local_reply(req)
+
+    if reply:
+        body = _stream_local(reply, source)
+    else:
+        get_client()   # fail fast with 500 if the key is missing
+        body = _stream_reply(req, request)
+
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -28,6 +28,11 @@ else:
 
 _lock = threading.Lock()
 
+_MARKER_VERSION_SQL = (
+    "SELECT version, (SELECT value FROM app_data WHERE key = 'marker_instance') AS instance "
+    "FROM marker_version WHERE id = 1"
+)
+
 
 class Database:
     def __init__(self, path: str = DB_PATH_DEFAULT, pool_size: int = POOL_SIZE):
@@ -152,6 +157,32 @@ class Database:
                 );
                 """
             )
+            # Bumped whenever the marker set changes; /risk-markers ETags are built from it
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS marker_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL
+                );
+                """
+            )
+            cur.execute("INSERT OR IGNORE INTO marker_version (id, version) VALUES (1, 0)")
+            # Random per database file, so versions restarting after a reset never repeat an ETag
+            cur.execute(
+                "INSERT OR IGNORE INTO app_data (key, value, encrypted, updated_at) VALUES ('marker_instance', ?, 0, ?)",
+                (os.urandom(6).hex(), time.time())
+            )
+            # Login sessions (used when SESSION_STORE=database so all workers share them)
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    token TEXT PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    expiry REAL NOT NULL,
+                    FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+                );
+                """
+            )
             conn.commit()
 
     # -----------------------
@@ -257,6 +288,95 @@ class Database:
             )
 
 
+    # -----------------------
+    # Risk markers
+    # -----------------------
+    def set_risk_marker(self, state: str, district: str, risk: Optional[str], lat: float, lon: float) -> bool:
+        """
+        Record a district's current marker (``risk=None`` removes it).
+        Returns True and bumps the marker version only if the visible marker changed.
+        """
+        ts = time.time()
+        with self.get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT risk, lat, lon FROM risk_markers WHERE state=? AND district=?",
+                (state, district)
+            )
+            rows = cur.fetchall()
+            current = [(r["risk"], r["lat"], r["lon"]) for r in rows]
+            wanted = [(risk, lat, lon)] if risk is not None else []
+
+            if current == wanted:
+                if wanted:
+                    cur.execute(
+                        "UPDATE risk_markers SET timestamp=? WHERE state=? AND district=?",
+                        (ts, state, district)
+                    )
+                return False
+
+            cur.execute("DELETE FROM risk_markers WHERE state=? AND district=?", (state, district))
+            if risk is not None:
+                cur.execute(
+                    "INSERT INTO risk_markers (state, district, risk, lat, lon, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                    (state, district, risk, lat, lon, ts)
+                )
+            cur.execute("UPDATE marker_version SET version = version + 1 WHERE id = 1")
+            return True
+
+    def risk_markers_version(self) -> str:
+        """Marker version qualified by the database instance, e.g. ``"3f9a0c1b22de-17"``."""
+        with self.get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(_MARKER_VERSION_SQL)
+            row = cur.fetchone()
+            return f"{row['instance']}-{row['version']}" if row else "0"
+
+    def get_risk_markers(self) -> Tuple[str, list]:
+        """(version, markers) read in one transaction so the pair is consistent."""
+        with self.get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN")
+            cur.execute(_MARKER_VERSION_SQL)
+            row = cur.fetchone()
+            version = f"{row['instance']}-{row['version']}"
+            cur.execute("SELECT state, district, risk, lat, lon FROM risk_markers")
+            markers = [
+                {
+                    "state": r["state"],
+                    "district": r["district"],
+                    "risk": r["risk"],
+                    "lat": r["lat"],
+                    "lon": r["lon"]
+                }
+                for r in cur.fetchall()
+            ]
+            cur.execute("COMMIT")
+            return version, markers
+
+    # -----------------------
+    # Sessions
+    # -----------------------
+    def save_session(self, user_id: int, token: str, expiry: float):
+        """Store a session token, replacing any previous session of the user."""
+        with self.get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM sessions WHERE user_id = ? OR expiry < ?", (user_id, time.time()))
+            cur.execute("INSERT INTO sessions (token, user_id, expiry) VALUES (?, ?, ?)", (token, user_id, expiry))
+
+    def get_session_user(self, token: str) -> Optional[int]:
+        """Return user_id for an unexpired session token, else None."""
+        with self.get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT user_id FROM sessions WHERE token = ? AND expiry > ?", (token, time.time()))
+            row = cur.fetchone()
+            return row["user_id"] if row else None
+
+    def delete_sessions(self, user_id: int):
+        with self.get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
     # -----------------------
     # App data storage (optional encrypted)
     # -----------------------
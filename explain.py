@@ -0,0 +1,61 @@
+"""
+Per-feature explanations of model scores with XGBoost's TreeSHAP.
+
+``contributions`` runs ``pred_contribs`` over a whole matrix at once; the
+API stacks every prediction snapshot that still lacks an explanation into
+one call and caches the result on the snapshot, so repeated explain
+requests are a dictionary read.
+
+Contributions are in the model's log-odds space, before calibration: they
+add up, together with ``base_value``, to the raw margin whose sigmoid is
+the uncalibrated probability.
+"""
+
+import numpy as np
+
+from features import FEATURE_NAMES
+
+TOP_FORECAST = 3     # contributions listed per forecast day
+
+
+def contributions(model, X: np.ndarray) -> np.ndarray:
+    """(N, F + 1) SHAP values; the last column is the bias (base value)."""
+    import xgboost
+
+    booster = model.get_booster()
+    # score with the same trees predict_proba uses (early stopping keeps best_iteration)
+    best = getattr(model, "best_iteration", None)
+    iteration_range = (0, best + 1) if best is not None else (0, 0)
+    dmatrix = xgboost.DMatrix(np.asarray(X, dtype=np.float32), feature_names=list(FEATURE_NAMES))
+    return booster.predict(dmatrix, pred_contribs=True, iteration_range=iteration_range)
+
+
+def _ranked(contrib: np.ndarray, row: np.ndarray, limit: int = None) -> list:
+    order = np.argsort(-np.abs(contrib[:-1]))[:limit]
+    return [
+        {
+            "feature": FEATURE_NAMES[k],
+            "value": round(float(row[k]), 4),
+            "contribution": round(float(contrib[k]), 4),
+        }
+        for k in order
+    ]
+
+
+def describe(contribs: np.ndarray, rows: np.ndarray, dates: list) -> dict:
+    """
+    Explanation for one prediction snapshot: ``contribs``/``rows`` hold
+    today first, then one row per forecast day in ``dates``.
+    """
+    today = contribs[0]
+    margin = float(today.sum())
+    return {
+        "base_value": round(float(today[-1]), 4),
+        "margin": round(margin, 4),
+        "raw_probability": round(float(1 / (1 + np.exp(-margin))), 4),
+        "contributions": _ranked(today, rows[0]),
+        "forecast": [
+            {"date": date, "top": _ranked(c, r, TOP_FORECAST)}
+            for date, c, r in zip(dates, contribs[1:], rows[1:])
+        ],
+    }
@@ -0,0 +1,195 @@
+import os
+import re
+import json
+import math
+import time
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+# CONFIGURATION
+
+CONTACTS_PATH = "emergency_contacts.json"
+FAQ_PATH = "safety_faq.json"
+
+# Answer locally only when the best match clears both bars; otherwise ask Gemini
+FAQ_MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "4.0"))
+FAQ_MIN_COVERAGE = float(os.getenv("FAQ_MIN_COVERAGE", "0.5"))   # share of query terms found in the answer's document
+
+CACHE_TTL_SEC = int(os.getenv("CHAT_CACHE_TTL", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_SIZE", "2048"))
+
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "am", "was", "be", "to", "of", "in", "on", "for", "and", "or",
+    "i", "me", "my", "we", "our", "you", "your", "it", "its", "do", "does", "what", "which", "how",
+    "when", "where", "should", "can", "could", "please", "tell", "about", "with", "there", "this",
+    "that", "give", "any", "from", "at", "by", "if", "so", "hi", "hello", "who", "whom", "need",
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def normalize_query(text: str) -> str:
+    """Cache key for a question: lowercase words only, punctuation and spacing ignored."""
+    return " ".join(_TOKEN.findall(text.lower()))
+
+
+# BM25 INDEX
+
+class BM25Index:
+    """Small in-memory Okapi BM25 index over (text, answer) documents."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs: List[dict] = []
+        self.postings: Dict[str, List[tuple]] = {}
+        self.lengths: List[int] = []
+        self.avg_len = 0.0
+
+    def add(self, doc_id: str, text: str, answer: str, requires: frozenset = frozenset()):
+        """``requires``: the document only matches queries containing at least one of these terms."""
+        tokens = tokenize(text)
+        n = len(self.docs)
+        self.docs.append({"id": doc_id, "answer": answer, "terms": set(tokens), "requires": requires})
+        self.lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            self.postings.setdefault(term, []).append((n, tf))
+
+    def finalize(self):
+        self.avg_len = sum(self.lengths) / max(1, len(self.lengths))
+        n = len(self.docs)
+        self.idf = {
+            term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = 3) -> List[dict]:
+        terms = tokenize(query)
+        scores: Dict[int, float] = {}
+        for term in set(terms):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc, tf in self.postings[term]:
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[doc] / self.avg_len)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        unique = set(terms)
+        ranked = sorted(
+            ((doc, score) for doc, score in scores.items()
+             if not self.docs[doc]["requires"] or self.docs[doc]["requires"] & unique),
+            key=lambda x: x[1], reverse=True
+        )[:k]
+        return [
+            {
+                "id": self.docs[doc]["id"],
+                "answer": self.docs[doc]["answer"],
+                "score": round(score, 3),
+                "coverage": len(unique & self.docs[doc]["terms"]) / max(1, len(unique)),
+            }
+            for doc, score in ranked
+        ]
+
+
+# a state's contact card only answers questions that actually ask for contacts
+_CONTACT_INTENT = frozenset({"helpline", "helplines", "number", "numbers", "contact", "contacts", "phone", "call", "control"})
+
+
+def _contacts_answer(state: str, numbers: dict) -> str:
+    lines = "<br>".join(f"- {name}: <strong>{num}</strong>" for name, num in numbers.items())
+    title = "National emergency contacts" if state == "National" else f"Emergency contacts for {state}"
+    return f"{title}:<br>{lines}<br>In any life-threatening emergency call <strong>112</strong>."
+
+
+def build_index(contacts_path: str = CONTACTS_PATH, faq_path: str = FAQ_PATH) -> BM25Index:
+    index = BM25Index()
+
+    with open(faq_path, "r", encoding="utf-8") as f:
+        for entry in json.load(f):
+            text = " ".join(entry["questions"]) + " " + entry.get("keywords", "")
+            index.add(entry["id"], text, entry["answer"])
+
+    with open(contacts_path, "r", encoding="utf-8") as f:
+        contacts = json.load(f)
+
+    for state, numbers in contacts.items():
+        if state == "National":
+            continue
+        # state names repeated so they dominate the generic helpline words
+        text = f"{state} {state} {state} helpline number contact phone emergency flood control room " + " ".join(numbers)
+        index.add(f"contacts:{state}", text, _contacts_answer(state, numbers), requires=_CONTACT_INTENT)
+
+    index.finalize()
+    return index
+
+
+_index: Optional[BM25Index] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> BM25Index:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = build_index()
+    return _index
+
+
+def answer(question: str) -> Optional[dict]:
+    """A local answer for ``question`` if the FAQ/contacts index is confident, else None."""
+    hits = get_index().search(question, k=1)
+    if not hits:
+        return None
+    best = hits[0]
+    if best["score"] < FAQ_MIN_SCORE or best["coverage"] < FAQ_MIN_COVERAGE:
+        return None
+    return best
+
+
+# RESPONSE CACHE
+
+class ResponseCache:
+    """Normalized-question -> reply cache with TTL and LRU eviction."""
+
+    def __init__(self, ttl: int = CACHE_TTL_SEC, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, question: str) -> Optional[str]:
+        key = normalize_query(question)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or time.time() - item[1] > self.ttl:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, question: str, reply: str):
+        key = normalize_query(question)
+        if not key:
+            return
+        with self._lock:
+            self._data[key] = (reply, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+reply_cache = ResponseCache()
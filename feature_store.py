@@ -0,0 +1,94 @@
+"""
+Static feature snapshot: terrain rows precomputed per district and grid cell.
+
+The eight terrain features of a district never change, yet every request
+used to query the KDTree and rebuild them from the terrain records. The
+store resolves them once, at startup, into a contiguous float32 (D, 8)
+table indexed by district id (the order of indian_district_coordinates.json).
+Arbitrary coordinates are snapped to a cell (``FEATURE_CELL_DECIMALS``) and
+memoised the same way on first use, so popular points are a dict hit.
+
+A request then copies its static row and fills in the rainfall features
+with ``features.feature_matrix``, one vectorised call for today and every
+forecast day.
+"""
+
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from features import TerrainIndex
+
+# CONFIGURATION
+
+CELL_DECIMALS = int(os.getenv("FEATURE_CELL_DECIMALS", "3"))    # ~110 m, same rounding as /predict-by-coordinates
+MAX_CELLS = int(os.getenv("FEATURE_CELL_CACHE", "50000"))
+
+
+class FeatureStore:
+
+    def __init__(self, terrain: TerrainIndex, districts: Dict[str, Dict[str, dict]],
+                 cell_decimals: int = CELL_DECIMALS, max_cells: int = MAX_CELLS):
+        self.names = [(s, d) for s, ds in districts.items() for d in ds]
+        self.ids = {(s.lower(), d.lower()): i for i, (s, d) in enumerate(self.names)}
+        self.coords = np.array([[districts[s][d]["lat"], districts[s][d]["lon"]] for s, d in self.names], dtype=np.float64)
+
+        # one vectorised KDTree query for every district
+        self.static = np.ascontiguousarray(
+            terrain.matrix[terrain.nearest(self.coords[:, 0], self.coords[:, 1])], dtype=np.float32
+        )
+        self.static.setflags(write=False)
+
+        self.terrain = terrain
+        self.cell_decimals = cell_decimals
+        self.max_cells = max_cells
+        self._cells: "OrderedDict[Tuple[float, float], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def district_id(self, state: str, district: str) -> Optional[int]:
+        return self.ids.get((state.lower(), district.lower()))
+
+    def district_row(self, state: str, district: str) -> Optional[np.ndarray]:
+        """Read-only (8,) terrain row for a known district, else None."""
+        i = self.district_id(state, district)
+        return None if i is None else self.static[i]
+
+    def cell(self, lat: float, lon: float) -> Tuple[float, float]:
+        return round(lat, self.cell_decimals), round(lon, self.cell_decimals)
+
+    def cell_row(self, lat: float, lon: float) -> np.ndarray:
+        """Terrain row for the cell containing (lat, lon), resolved at the cell's snapped point."""
+        key = self.cell(lat, lon)
+        with self._lock:
+            row = self._cells.get(key)
+            if row is not None:
+                self._cells.move_to_end(key)
+                return row
+
+        row = self.terrain.matrix[self.terrain.nearest(*key)]
+        row.setflags(write=False)
+        with self._lock:
+            self._cells[key] = row
+            while len(self._cells) > self.max_cells:
+                self._cells.popitem(last=False)
+        return row
+
+    def snapshot(self) -> dict:
+        return {
+            "districts": len(self.names),
+            "static_bytes": int(self.static.nbytes),
+            "cached_cells": len(self._cells),
+        }
+
+
+def build(terrain: TerrainIndex, coordinate_path: str) -> FeatureStore:
+    with open(coordinate_path, "r", encoding="utf-8") as f:
+        districts = json.load(f)
+    return FeatureStore(terrain, districts)
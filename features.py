@@ -0,0 +1,154 @@
+import json
+import pickle
+from typing import List, Tuple
+
+import numpy as np
+
+# Feature order expected by flood_xgboost_model.pkl
+TERRAIN_FIELDS = [
+    "elevation",
+    "slope",
+    "river_distance",
+    "relative_elevation",
+    "terrain_ruggedness",
+    "drainage_potential",
+    "river_importance",
+    "twi",
+]
+
+RAINFALL_FIELDS = [
+    "rainfall",
+    "rain_intensity",
+    "rain_momentum",
+    "prev_month_rain",
+    "rain_2month_sum",
+    "monsoon_cumulative",
+    "monsoon_saturation",
+    "rain_anomaly",
+    "extreme_rain",
+]
+
+FEATURE_NAMES = TERRAIN_FIELDS + RAINFALL_FIELDS
+
+
+# LOADING
+
+def load_model(path: str):
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception as e:
+        raise RuntimeError(f"Failed to load model: {e}")
+
+
+class TerrainIndex:
+    """
+    Terrain points held as contiguous NumPy arrays plus a KDTree over them.
+
+    Compact arrays (instead of ~5000 small dicts) keep the data in a few
+    large buffers, so forked workers share the pages copy-on-write instead
+    of each touching every object's refcount.
+    """
+
+    def __init__(self, coords: np.ndarray, matrix: np.ndarray):
+        from scipy.spatial import cKDTree
+
+        self.coords = np.ascontiguousarray(coords, dtype=np.float64)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.tree = cKDTree(self.coords)
+
+    def __len__(self):
+        return len(self.coords)
+
+    def nearest(self, lat, lon):
+        """Index (or indices, for arrays) of the closest terrain point."""
+        _, index = self.tree.query(np.column_stack([np.atleast_1d(lat), np.atleast_1d(lon)]))
+        return index if np.ndim(lat) else int(index[0])
+
+    def record(self, index: int) -> dict:
+        row = self.matrix[index]
+        record = {f: float(row[k]) for k, f in enumerate(TERRAIN_FIELDS)}
+        record["lat"], record["lon"] = float(self.coords[index, 0]), float(self.coords[index, 1])
+        return record
+
+
+def load_terrain(path: str) -> TerrainIndex:
+    with open(path, "r") as f:
+        terrain = json.load(f)
+    coords = [(p["lat"], p["lon"]) for p in terrain]
+    return TerrainIndex(np.array(coords), terrain_matrix(terrain))
+
+
+def terrain_matrix(terrain: List[dict]) -> np.ndarray:
+    """Terrain records as an (N, 8) float32 array in TERRAIN_FIELDS order."""
+    return np.array([[p[f] for f in TERRAIN_FIELDS] for p in terrain], dtype=np.float32)
+
+
+# FEATURE GENERATION
+
+def feature_row(terrain: dict, weather: dict, rain_24h, rain_7d, current_30d, previous_30d) -> Tuple[list, float, float, float]:
+    """One model input row plus (rainfall, wind, current_rain) for the response."""
+
+    rainfall = current_30d
+
+    wind = weather.get("wind", {}).get("speed", 0)
+
+    current_rain = weather.get("rain", {}).get("1h", 0)
+
+    prev_month_rain = current_30d
+
+    rain_2month_sum = current_30d + previous_30d
+
+    rain_intensity = current_30d / 30
+
+    rain_momentum = current_rain * wind
+
+    monsoon_cumulative = (0.6 * current_30d) + (0.4 * previous_30d)
+
+    monsoon_saturation = min(1, monsoon_cumulative / 500)
+
+    rain_anomaly = rain_24h - 10
+
+    extreme_rain = 1 if rainfall > 50 else 0
+
+    features = [terrain[f] for f in TERRAIN_FIELDS] + [
+        rainfall,
+        rain_intensity,
+        rain_momentum,
+        prev_month_rain,
+        rain_2month_sum,
+        monsoon_cumulative,
+        monsoon_saturation,
+        rain_anomaly,
+        extreme_rain
+    ]
+
+    return features, rainfall, wind, current_rain
+
+
+def feature_matrix(terrain: np.ndarray, rain_24h, rain_7d, current_30d, previous_30d, current_rain=0.0, wind=0.0) -> np.ndarray:
+    """
+    Vectorised feature_row: ``terrain`` is (N, 8) and every other argument is
+    a scalar or length-N array. Returns an (N, 17) float32 matrix.
+    """
+    terrain = np.asarray(terrain, dtype=np.float32)
+    n = terrain.shape[0]
+    current_30d = np.broadcast_to(np.asarray(current_30d, dtype=np.float64), (n,))
+    previous_30d = np.broadcast_to(np.asarray(previous_30d, dtype=np.float64), (n,))
+    rain_24h = np.broadcast_to(np.asarray(rain_24h, dtype=np.float64), (n,))
+
+    monsoon_cumulative = 0.6 * current_30d + 0.4 * previous_30d
+
+    out = np.empty((n, len(FEATURE_NAMES)), dtype=np.float32)
+    out[:, :8] = terrain
+    out[:, 8] = current_30d
+    out[:, 9] = current_30d / 30
+    out[:, 10] = np.asarray(current_rain) * np.asarray(wind)
+    out[:, 11] = current_30d
+    out[:, 12] = current_30d + previous_30d
+    out[:, 13] = monsoon_cumulative
+    out[:, 14] = np.minimum(1, monsoon_cumulative / 500)
+    out[:, 15] = rain_24h - 10
+    out[:, 16] = current_30d > 50
+    return out
+
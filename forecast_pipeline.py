@@ -0,0 +1,280 @@
+"""
+Forecast aggregation: OpenWeather 3-hour points -> daily rows, in NumPy.
+
+Payloads are parsed straight into arrays (timestamps plus a
+rain / humidity / temp / wind matrix) and grouped by local calendar day
+with ``np.bincount``. Days are cut at IST midnight: ``dt_txt`` is UTC, so
+splitting it would put 00:00-05:30 IST in the previous day.
+
+``ForecastPipeline`` keeps each tile's last points and daily frame. When a
+tile's forecast is refreshed, the rows before the first changed point are
+reused and only the tail is regrouped. ``aggregate_many`` groups
+several locations in a single pass; ``daily_forecasts`` uses it for
+batches of points.
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import weather_grid
+
+# CONFIGURATION
+
+UTC_OFFSET_SEC = int(os.getenv("FORECAST_UTC_OFFSET", str(5 * 3600 + 1800)))   # IST
+DAY_SEC = 86400
+
+# columns of ForecastPoints.values
+RAIN, HUMIDITY, TEMP, WIND = range(4)
+
+_EPOCH = date(1970, 1, 1)
+
+
+@dataclass
+class ForecastPoints:
+    dt: np.ndarray          # (N,) int64 unix seconds, ascending
+    values: np.ndarray      # (N, 4) float64: rain (3h), humidity, temp, wind
+
+    def __len__(self):
+        return len(self.dt)
+
+
+@dataclass
+class DailyFrame:
+    day: np.ndarray         # (D,) int64 local day number (days since 1970-01-01)
+    count: np.ndarray       # (D,) points per day
+    sums: np.ndarray        # (D, 4) column sums
+    rain_max: np.ndarray    # (D,)
+
+    def __len__(self):
+        return len(self.day)
+
+    def records(self) -> List[dict]:
+        """Rows in process_forecast_daily's format."""
+        means = self.sums / self.count[:, None]
+        return [
+            {
+                "date": (_EPOCH + timedelta(days=int(d))).isoformat(),
+                "rain": float(self.sums[k, RAIN]),
+                "rain_max": float(self.rain_max[k]),
+                "humidity": float(means[k, HUMIDITY]),
+                "temp": float(means[k, TEMP]),
+                "wind": float(means[k, WIND]),
+            }
+            for k, d in enumerate(self.day)
+        ]
+
+
+def _concat(a: DailyFrame, b: DailyFrame) -> DailyFrame:
+    return DailyFrame(
+        np.concatenate([a.day, b.day]),
+        np.concatenate([a.count, b.count]),
+        np.concatenate([a.sums, b.sums]),
+        np.concatenate([a.rain_max, b.rain_max]),
+    )
+
+
+def _slice(frame: DailyFrame, keep: np.ndarray) -> DailyFrame:
+    return DailyFrame(frame.day[keep], frame.count[keep], frame.sums[keep], frame.rain_max[keep])
+
+
+# PARSING
+
+def parse(items: Sequence[dict]) -> ForecastPoints:
+    """OpenWeather ``list`` entries -> arrays, sorted by timestamp."""
+    n = len(items)
+    dt = np.fromiter((item["dt"] for item in items), dtype=np.int64, count=n)
+    values = np.empty((n, 4), dtype=np.float64)
+    values[:, RAIN] = np.fromiter((item.get("rain", {}).get("3h", 0) for item in items), dtype=np.float64, count=n)
+    values[:, HUMIDITY] = np.fromiter((item["main"]["humidity"] for item in items), dtype=np.float64, count=n)
+    values[:, TEMP] = np.fromiter((item["main"]["temp"] for item in items), dtype=np.float64, count=n)
+    values[:, WIND] = np.fromiter((item["wind"]["speed"] for item in items), dtype=np.float64, count=n)
+    if n > 1 and (np.diff(dt) < 0).any():
+        order = np.argsort(dt, kind="stable")
+        dt, values = dt[order], values[order]
+    return ForecastPoints(dt, values)
+
+
+# GROUP-BY
+
+def local_day(dt: np.ndarray, offset: int = UTC_OFFSET_SEC) -> np.ndarray:
+    return (dt + offset) // DAY_SEC
+
+
+def aggregate(points: ForecastPoints, offset: int = UTC_OFFSET_SEC) -> DailyFrame:
+    """Group points by local day: counts and sums via bincount, rain max via reduceat."""
+    if not len(points):
+        return DailyFrame(np.empty(0, np.int64), np.empty(0, np.int64), np.empty((0, 4)), np.empty(0))
+
+    days, group = np.unique(local_day(points.dt, offset), return_inverse=True)
+    n = len(days)
+    count = np.bincount(group, minlength=n)
+    sums = np.stack([np.bincount(group, weights=points.values[:, c], minlength=n) for c in range(4)], axis=1)
+    # points are sorted, so each day is one contiguous run
+    starts = np.concatenate([[0], np.cumsum(count)[:-1]])
+    rain_max = np.maximum.reduceat(points.values[:, RAIN], starts)
+    return DailyFrame(days, count, sums, rain_max)
+
+
+def aggregate_many(batches: Sequence[ForecastPoints], offset: int = UTC_OFFSET_SEC) -> List[DailyFrame]:
+    """Daily frames for many locations from one group-by over all of their points."""
+    if not batches:
+        return []
+    loc = np.repeat(np.arange(len(batches)), [len(b) for b in batches])
+    dt = np.concatenate([b.dt for b in batches])
+    values = np.concatenate([b.values for b in batches]) if len(dt) else np.empty((0, 4))
+
+    day = local_day(dt, offset)
+    base = day.min() if len(day) else 0
+    span = int(day.max() - base + 1) if len(day) else 1
+    keys, group = np.unique(loc * span + (day - base), return_inverse=True)
+    n = len(keys)
+    count = np.bincount(group, minlength=n)
+    sums = np.stack([np.bincount(group, weights=values[:, c], minlength=n) for c in range(4)], axis=1)
+    rain_max = np.zeros(n)
+    np.maximum.at(rain_max, group, values[:, RAIN])
+
+    key_loc = keys // span
+    frames = []
+    for i in range(len(batches)):
+        sel = key_loc == i
+        frames.append(DailyFrame(keys[sel] % span + base, count[sel], sums[sel], rain_max[sel]))
+    return frames
+
+
+# PER-TILE INCREMENTAL CACHE
+
+class _TileState:
+    __slots__ = ("payload", "points", "frame", "records")
+
+    def __init__(self, payload, points: ForecastPoints, frame: DailyFrame):
+        self.payload = payload
+        self.points = points
+        self.frame = frame
+        self.records = frame.records()
+
+
+class ForecastPipeline:
+
+    def __init__(self, offset: int = UTC_OFFSET_SEC):
+        self.offset = offset
+        self._tiles: Dict[tuple, _TileState] = {}
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.incremental = 0
+        self.full = 0
+
+    def _update(self, old: Optional[_TileState], new: ForecastPoints) -> DailyFrame:
+        """Daily frame for ``new``, regrouping only the days from the first changed point on."""
+        if old is None or not len(new) or not len(old.points):
+            self.full += 1
+            return aggregate(new, self.offset)
+
+        prev = old.points
+        pos = int(np.searchsorted(prev.dt, new.dt[0]))
+        if pos >= len(prev) or prev.dt[pos] != new.dt[0]:
+            self.full += 1
+            return aggregate(new, self.offset)
+
+        overlap = min(len(prev) - pos, len(new))
+        same = (prev.dt[pos:pos + overlap] == new.dt[:overlap]) & \
+               (prev.values[pos:pos + overlap] == new.values[:overlap]).all(axis=1)
+        first_diff = overlap if same.all() else int(np.argmin(same))
+        if pos == 0 and first_diff == len(new) == len(prev):
+            return old.frame        # same points, e.g. the payload was re-decoded from the shared cache
+
+        new_days = local_day(new.dt, self.offset)
+        first_day = new_days[0]
+        if first_diff < len(new):
+            changed_day = new_days[first_diff]
+        elif len(prev) - pos > len(new):
+            changed_day = new_days[-1]      # the window ends earlier: its last day may have lost points
+        else:
+            changed_day = new_days[-1] + 1
+
+        # cached days are reusable if all their points are still present and unchanged:
+        # strictly before the changed day, and (when the window moved on) after the first day
+        keep = old.frame.day < changed_day
+        keep &= old.frame.day > first_day if pos > 0 else old.frame.day >= first_day
+        head = _slice(old.frame, keep)
+
+        redo = new_days >= changed_day
+        if pos > 0:
+            redo |= new_days == first_day
+        tail = aggregate(ForecastPoints(new.dt[redo], new.values[redo]), self.offset)
+
+        self.incremental += 1
+        frame = _concat(head, tail)
+        order = np.argsort(frame.day, kind="stable")
+        return _slice(frame, order)
+
+    def _store(self, key: tuple, state: Optional[_TileState], payload: dict,
+               points: ForecastPoints, frame: DailyFrame) -> List[dict]:
+        if state is not None and frame is state.frame:
+            self.reused += 1
+            state.payload = payload
+            return state.records
+        state = _TileState(payload, points, frame)
+        with self._lock:
+            self._tiles[key] = state
+        return state.records
+
+    def daily(self, key: tuple, payload: dict) -> List[dict]:
+        """Daily rows for a tile's forecast payload, reusing whatever is unchanged."""
+        with self._lock:
+            state = self._tiles.get(key)
+        if state is not None and state.payload is payload:
+            self.reused += 1
+            return state.records
+
+        points = parse(payload["list"])
+        return self._store(key, state, payload, points, self._update(state, points))
+
+    def daily_many(self, tiles: Dict[tuple, dict]) -> Dict[tuple, List[dict]]:
+        """``daily`` for many tiles; tiles seen for the first time are grouped in one pass."""
+        out, fresh = {}, []
+        for key, payload in tiles.items():
+            with self._lock:
+                state = self._tiles.get(key)
+            if state is None:
+                fresh.append((key, payload, parse(payload["list"])))
+            else:
+                out[key] = self.daily(key, payload)
+
+        frames = aggregate_many([points for _, _, points in fresh], self.offset)
+        self.full += len(frames)
+        for (key, payload, points), frame in zip(fresh, frames):
+            out[key] = self._store(key, None, payload, points, frame)
+        return out
+
+    def snapshot(self) -> dict:
+        return {"tiles": len(self._tiles), "reused": self.reused, "incremental": self.incremental, "full": self.full}
+
+
+pipeline = ForecastPipeline()
+
+
+def daily_forecast(lat: float, lon: float) -> List[dict]:
+    """Daily forecast rows (IST days) for the weather tile containing the point."""
+    node = weather_grid.snap(lat, lon)
+    return pipeline.daily(node, weather_grid.forecast(lat, lon))
+
+
+def daily_forecasts(points: Sequence[Tuple[float, float]]) -> List[List[dict]]:
+    """``daily_forecast`` for many points: one fetch and one aggregation per distinct tile."""
+    nodes = [weather_grid.snap(lat, lon) for lat, lon in points]
+    tiles = {}
+    for node, (lat, lon) in zip(nodes, points):
+        if node not in tiles:
+            tiles[node] = weather_grid.forecast(lat, lon)
+    rows = pipeline.daily_many(tiles)
+    return [rows[node] for node in nodes]
+
+
+def process_list(forecast_list: Sequence[dict]) -> List[dict]:
+    """Stateless form: one forecast ``list`` to daily rows."""
+    return aggregate(parse(forecast_list)).records()
@@ -0,0 +1,217 @@
+"""
+Reverse geocoding: coordinates -> (state, district).
+
+Districts are matched two ways:
+
+- boundary polygons, if a GeoJSON file is present (``GEO_BOUNDARIES``,
+  default ``district_boundaries.geojson``). Polygons are bucketed into a
+  ``GEO_BUCKET_DEG`` grid by bounding box, so a lookup only ray-casts the
+  few polygons registered in the point's bucket;
+- otherwise, or for points that fall outside every polygon (coastline,
+  simplified borders), the nearest district centroid from
+  indian_district_coordinates.json via a KDTree, up to
+  ``GEO_MAX_CENTROID_KM`` away.
+
+District ids are the feature store's (the order of the coordinate file),
+so a resolved point can reuse everything keyed on the district: its
+prediction snapshot, terrain row and risk marker. ``resolve_ids`` handles
+thousands of points per call with vectorised queries.
+"""
+
+import os
+import json
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# CONFIGURATION
+
+BOUNDARY_PATH = os.getenv("GEO_BOUNDARIES", "district_boundaries.geojson")
+BUCKET_DEG = float(os.getenv("GEO_BUCKET_DEG", "0.25"))
+MAX_CENTROID_KM = float(os.getenv("GEO_MAX_CENTROID_KM", "150"))
+
+EARTH_RADIUS_KM = 6371.0
+
+# property names used by the common Indian district boundary datasets
+_STATE_KEYS = ("state", "st_nm", "STATE", "ST_NM", "state_name", "NAME_1")
+_DISTRICT_KEYS = ("district", "DISTRICT", "dist_name", "DISTRICT_NAME", "NAME_2")
+
+
+def _unit_vectors(lat, lon) -> np.ndarray:
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def _chord(km: float) -> float:
+    return 2.0 * np.sin(km / (2.0 * EARTH_RADIUS_KM))
+
+
+# POLYGONS
+
+class _Polygon:
+    """All rings of a (multi)polygon as one edge list; even-odd ray casting handles holes."""
+
+    __slots__ = ("district_id", "bbox", "x0", "y0", "x1", "y1")
+
+    def __init__(self, district_id: int, rings: List[np.ndarray]):
+        self.district_id = district_id
+        starts = np.concatenate([r[:-1] for r in rings])
+        ends = np.concatenate([r[1:] for r in rings])
+        self.x0, self.y0 = starts[:, 0], starts[:, 1]
+        self.x1, self.y1 = ends[:, 0], ends[:, 1]
+        allpts = np.concatenate(rings)
+        self.bbox = (allpts[:, 0].min(), allpts[:, 1].min(), allpts[:, 0].max(), allpts[:, 1].max())
+
+    def contains(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        """Boolean mask over points (lon, lat arrays)."""
+        x, y = lon[:, None], lat[:, None]
+        straddles = (self.y0 > y) != (self.y1 > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cross_x = self.x0 + (y - self.y0) * (self.x1 - self.x0) / (self.y1 - self.y0)
+        return ((straddles & (x < cross_x)).sum(axis=1) % 2) == 1
+
+
+def _rings(geometry: dict) -> List[np.ndarray]:
+    if geometry["type"] == "Polygon":
+        polygons = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        polygons = geometry["coordinates"]
+    else:
+        return []
+    rings = []
+    for polygon in polygons:
+        for ring in polygon:
+            r = np.asarray(ring, dtype=np.float64)[:, :2]
+            if len(r) >= 3:
+                if (r[0] != r[-1]).any():
+                    r = np.vstack([r, r[:1]])
+                rings.append(r)
+    return rings
+
+
+def _prop(props: dict, keys: Sequence[str]) -> Optional[str]:
+    for k in keys:
+        if props.get(k):
+            return str(props[k])
+    return None
+
+
+def load_boundaries(path: str, ids: Dict[Tuple[str, str], int]) -> List[_Polygon]:
+    """Polygons from a GeoJSON FeatureCollection whose names match a known district."""
+    with open(path, "r", encoding="utf-8") as f:
+        collection = json.load(f)
+
+    polygons, unmatched = [], 0
+    for feature in collection.get("features", []):
+        props = feature.get("properties") or {}
+        state, district = _prop(props, _STATE_KEYS), _prop(props, _DISTRICT_KEYS)
+        did = ids.get((state.lower(), district.lower())) if state and district else None
+        rings = _rings(feature.get("geometry") or {"type": None})
+        if did is None or not rings:
+            unmatched += 1
+            continue
+        polygons.append(_Polygon(did, rings))
+
+    if unmatched:
+        print(f"[WARN] {path}: {unmatched} features skipped (unknown district or no polygon)")
+    return polygons
+
+
+# INDEX
+
+class DistrictIndex:
+
+    def __init__(self, names: List[Tuple[str, str]], coords: np.ndarray,
+                 polygons: Optional[List[_Polygon]] = None,
+                 bucket_deg: float = BUCKET_DEG, max_centroid_km: float = MAX_CENTROID_KM):
+        self.names = names
+        self.tree = cKDTree(_unit_vectors(coords[:, 0], coords[:, 1]))
+        self.max_centroid_km = max_centroid_km
+        self.max_chord = _chord(max_centroid_km)
+        self.bucket_deg = bucket_deg
+        self.polygons = polygons or []
+
+        buckets = defaultdict(list)
+        for k, poly in enumerate(self.polygons):
+            x0, y0, x1, y1 = poly.bbox
+            for i in range(int(np.floor(y0 / bucket_deg)), int(np.floor(y1 / bucket_deg)) + 1):
+                for j in range(int(np.floor(x0 / bucket_deg)), int(np.floor(x1 / bucket_deg)) + 1):
+                    buckets[(i, j)].append(k)
+        self._buckets = dict(buckets)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _nearest(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        dist, idx = self.tree.query(_unit_vectors(lat, lon), distance_upper_bound=self.max_chord)
+        return np.where(np.isfinite(dist), idx, -1)
+
+    def resolve_ids(self, lat, lon) -> np.ndarray:
+        """District id per point, -1 where nothing matches."""
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        out = np.full(len(lat), -1, dtype=np.int64)
+
+        if self._buckets:
+            rows = np.floor(lat / self.bucket_deg).astype(np.int64)
+            cols = np.floor(lon / self.bucket_deg).astype(np.int64)
+            cells, inverse = np.unique(np.stack([rows, cols], axis=1), axis=0, return_inverse=True)
+            order = np.argsort(inverse.ravel(), kind="stable")
+            bounds = np.searchsorted(inverse.ravel()[order], np.arange(len(cells) + 1))
+            for c, (i, j) in enumerate(cells):
+                candidates = self._buckets.get((int(i), int(j)))
+                if not candidates:
+                    continue
+                members = order[bounds[c]:bounds[c + 1]]
+                for k in candidates:
+                    todo = members[out[members] < 0]
+                    if not len(todo):
+                        break
+                    hit = self.polygons[k].contains(lon[todo], lat[todo])
+                    out[todo[hit]] = self.polygons[k].district_id
+
+        missing = out < 0
+        if missing.any():
+            out[missing] = self._nearest(lat[missing], lon[missing])
+        return out
+
+    def resolve_id(self, lat: float, lon: float) -> Optional[int]:
+        """``resolve_ids`` for one point, without the batch bookkeeping."""
+        candidates = self._buckets.get((math.floor(lat / self.bucket_deg), math.floor(lon / self.bucket_deg)))
+        if candidates:
+            x, y = np.array([lon]), np.array([lat])
+            for k in candidates:
+                x0, y0, x1, y1 = self.polygons[k].bbox
+                if x0 <= lon <= x1 and y0 <= lat <= y1 and self.polygons[k].contains(x, y)[0]:
+                    return self.polygons[k].district_id
+        phi, lam = math.radians(lat), math.radians(lon)
+        v = (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+        dist, i = self.tree.query(v, distance_upper_bound=self.max_chord)
+        return int(i) if math.isfinite(dist) else None
+
+    def resolve(self, lat: float, lon: float) -> Optional[Tuple[str, str]]:
+        i = self.resolve_id(lat, lon)
+        return None if i is None else self.names[i]
+
+    def resolve_many(self, points: Sequence[Tuple[float, float]]) -> List[Optional[Tuple[str, str]]]:
+        if not len(points):
+            return []
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return [None if i < 0 else self.names[i] for i in self.resolve_ids(pts[:, 0], pts[:, 1])]
+
+    def snapshot(self) -> dict:
+        return {
+            "districts": len(self.names),
+            "polygons": len(self.polygons),
+            "buckets": len(self._buckets),
+            "max_centroid_km": self.max_centroid_km,
+        }
+
+
+def build(store, boundary_path: str = BOUNDARY_PATH) -> DistrictIndex:
+    """Index over a ``feature_store.FeatureStore``'s districts, with boundaries if the file exists."""
+    polygons = load_boundaries(boundary_path, store.ids) if os.path.exists(boundary_path) else None
+    return DistrictIndex(store.names, store.coords, polygons)
@@ -0,0 +1,111 @@
+"""
+Cache-friendly responses for static and semi-static JSON.
+
+A ``Representation`` is a JSON body serialized once, with a strong ETag and
+gzip (and brotli, when the optional ``brotli`` package is installed) copies
+compressed up front. ``respond()`` answers ``If-None-Match`` with 304 and
+otherwise picks the best encoding the client accepts, so a poll costs a
+header comparison instead of a query, a serialization and a compression.
+
+``dumps`` uses ``orjson`` when it is installed and the standard library
+otherwise; ``FastJSONResponse`` uses it for ordinary dynamic bodies.
+"""
+
+import json
+import gzip
+import hashlib
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+# Optional faster encoder / better compressor
+try:
+    import orjson
+    _HAS_ORJSON = True
+except Exception:
+    _HAS_ORJSON = False
+
+try:
+    import brotli
+    _HAS_BROTLI = True
+except Exception:
+    _HAS_BROTLI = False
+
+STATIC_CACHE_CONTROL = "public, max-age=3600"
+REVALIDATE_CACHE_CONTROL = "no-cache"          # may be stored, but revalidated (cheap 304) on every use
+MIN_COMPRESS_BYTES = 512                       # smaller bodies are sent as-is
+
+
+def dumps(obj) -> bytes:
+    if _HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with ``dumps``."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class Representation:
+    """One JSON body with its ETag and precompressed variants."""
+
+    def __init__(self, content=None, body: Optional[bytes] = None, etag: Optional[str] = None,
+                 cache_control: str = STATIC_CACHE_CONTROL):
+        self.body = body if body is not None else dumps(content)
+        self.etag = etag or '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        self.cache_control = cache_control
+        self.encoded: Dict[str, bytes] = {}
+        if len(self.body) >= MIN_COMPRESS_BYTES:
+            if _HAS_BROTLI:
+                self.encoded["br"] = brotli.compress(self.body, quality=11)
+            self.encoded["gzip"] = gzip.compress(self.body, compresslevel=9, mtime=0)
+
+    def headers(self) -> dict:
+        return {"ETag": self.etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # weak comparison, as RFC 9110 requires for If-None-Match
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def _accepted(request: Request) -> set:
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+def respond(request: Request, rep: Representation) -> Response:
+    headers = rep.headers()
+    if etag_matches(request, rep.etag):
+        return not_modified(headers)
+
+    accepted = _accepted(request)
+    for coding in ("br", "gzip"):
+        if coding in rep.encoded and (coding in accepted or "*" in accepted):
+            headers["Content-Encoding"] = coding
+            return Response(rep.encoded[coding], media_type="application/json", headers=headers)
+    return Response(rep.body, media_type="application/json", headers=headers)
@@ -0,0 +1,158 @@
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+import weather_grid
+from rainfall_store import RainfallStore
+
+# CONFIGURATION
+
+# Point this at a directory created by rainfall_store.py to score from local
+# gridded data instead of the Open-Meteo archive API.
+RAINFALL_STORE_PATH = os.getenv("RAINFALL_STORE")
+
+# Fall back to Open-Meteo for points or dates the local store does not cover
+RAINFALL_STORE_FALLBACK = os.getenv("RAINFALL_STORE_FALLBACK", "1") == "1"
+
+# A store window with fewer valid days than this (e.g. a cell never ingested)
+# counts as not covered; 30 is what the Open-Meteo fallback returns
+RAINFALL_STORE_MIN_DAYS = int(os.getenv("RAINFALL_STORE_MIN_DAYS", "30"))
+
+HISTORY_DAYS = 60
+
+
+# AGGREGATES
+
+def rainfall_aggregates(values) -> Tuple[float, float, float, float, list]:
+    """
+    The rainfall inputs to build_features from a daily series (oldest first).
+
+    Returns (rain_24h, rain_7d, current_30d, previous_30d, values_60d). Missing
+    and negative days are dropped; with under 60 days of history previous_30d
+    is estimated as 0.8 x current_30d.
+    """
+    values = [v for v in values if v is not None and v == v and v >= 0]
+
+    values_60d = values[-60:] if len(values) >= 60 else values
+
+    if len(values_60d) >= 60:
+        previous_30d = sum(values_60d[:30])
+        current_30d = sum(values_60d[30:])
+    else:
+        current_30d = sum(values_60d)
+        previous_30d = current_30d * 0.8
+
+    rain_7d = sum(values_60d[-7:]) if len(values_60d) >= 7 else current_30d
+    rain_24h = values_60d[-2] if len(values_60d) > 1 else 0
+
+    return rain_24h, rain_7d, current_30d, previous_30d, values_60d
+
+
+def rainfall_aggregates_batch(windows: np.ndarray):
+    """
+    Vectorised rainfall_aggregates over an (N, 60) block of daily windows.
+
+    Same rules as the scalar form: missing and negative days are dropped,
+    the sums are over the last valid days of each row, and rows with under
+    60 valid days get previous_30d = 0.8 x current_30d. Returns four float64
+    arrays: rain_24h, rain_7d, current_30d, previous_30d.
+    """
+    w = np.asarray(windows, dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        valid = w >= 0                                  # False for NaN too
+    if valid.all() and w.shape[1] == HISTORY_DAYS:
+        # complete windows: plain column slices
+        current_30d = w[:, 30:].sum(axis=1)
+        return w[:, -2].copy(), w[:, -7:].sum(axis=1), current_30d, w[:, :30].sum(axis=1)
+
+    v = np.where(valid, w, 0.0)
+    n = valid.sum(axis=1)
+    # 1 for each row's last valid day, 2 for the one before, ...
+    rank = np.cumsum(valid[:, ::-1], axis=1)[:, ::-1]
+
+    def last(k):
+        return (v * (rank <= k)).sum(axis=1)
+
+    full = n >= HISTORY_DAYS
+    current_30d = np.where(full, last(30), v.sum(axis=1))
+    previous_30d = np.where(full, v.sum(axis=1) - current_30d, 0.8 * current_30d)
+    rain_7d = np.where(n >= 7, last(7), current_30d)
+    rain_24h = np.where(n > 1, (v * (valid & (rank == 2))).sum(axis=1), 0.0)
+    return rain_24h, rain_7d, current_30d, previous_30d
+
+
+# PROVIDERS
+
+class RainfallProvider:
+    """Source of the rainfall aggregates fed to build_features."""
+
+    name = "base"
+
+    def aggregates(self, lat: float, lon: float, end=None):
+        raise NotImplementedError
+
+
+class OpenMeteoProvider(RainfallProvider):
+    """Per-point Open-Meteo archive queries, shared across weather tiles."""
+
+    name = "open-meteo"
+
+    def aggregates(self, lat, lon, end=None):
+        if end is not None:
+            raise ValueError("Open-Meteo provider only serves the latest window")
+        data = weather_grid.archive_rainfall(lat, lon)
+        return rainfall_aggregates(data.get("daily", {}).get("precipitation_sum", []))
+
+
+def _valid_days(windows: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore"):
+        return (windows >= 0).sum(axis=-1)
+
+
+class LocalStoreProvider(RainfallProvider):
+    """
+    Aggregates read from a memory-mapped gridded store; no network involved.
+
+    ``end=None`` means today (UTC). A point is covered when it is inside the
+    grid, the store reaches ``end`` and the window has at least
+    ``min_days`` valid days; anything else goes to the fallback, or raises
+    KeyError without one.
+    """
+
+    name = "local-store"
+
+    def __init__(self, store: RainfallStore, fallback: Optional[RainfallProvider] = None,
+                 min_days: int = RAINFALL_STORE_MIN_DAYS):
+        self.store = store
+        self.fallback = fallback
+        self.min_days = min_days
+
+    def aggregates(self, lat, lon, end=None):
+        series = self.store.series(lat, lon, end, HISTORY_DAYS) if self.store.contains(lat, lon, end) else None
+        if series is None or _valid_days(series) < self.min_days:
+            if self.fallback is None:
+                raise KeyError(f"({lat}, {lon}) at {end or 'today'} is not covered by {self.store.path}")
+            return self.fallback.aggregates(lat, lon, end)
+
+        return rainfall_aggregates(series.tolist())
+
+    def aggregates_batch(self, lats, lons, end=None):
+        """Aggregates for many points at one date, as arrays; KeyError unless every point is covered."""
+        i, j, inside = self.store.cell(lats, lons)
+        if not inside.all():
+            raise KeyError(f"{int((~inside).sum())} points are outside the rainfall store grid")
+        windows = self.store.window(i, j, self.store.end_index(end), HISTORY_DAYS)
+        sparse = _valid_days(windows) < self.min_days
+        if sparse.any():
+            raise KeyError(f"{int(sparse.sum())} points have under {self.min_days} days of data in {self.store.path}")
+        return rainfall_aggregates_batch(windows)
+
+
+def get_provider() -> RainfallProvider:
+    remote = OpenMeteoProvider()
+    if not RAINFALL_STORE_PATH:
+        return remote
+    store = RainfallStore(RAINFALL_STORE_PATH)
+    print(f"Rainfall store loaded: {store.ndays} days x {store.nlat} x {store.nlon} from {RAINFALL_STORE_PATH}")
+    return LocalStoreProvider(store, fallback=remote if RAINFALL_STORE_FALLBACK else None)
@@ -0,0 +1,406 @@
+"""
+Local gridded daily-precipitation store.
+
+Gridded rainfall exports (IMD, ERA5, CHIRPS, ...) are ingested into one
+float32 array of shape (days, lat, lon) saved as ``precip.npy`` next to a
+``meta.json`` describing the grid. The array is memory-mapped, so reading a
+60-day window for every district touches only the pages it needs.
+
+    python rainfall_store.py create data/rain --start 2015-01-01 --end 2024-12-31
+    python rainfall_store.py ingest data/rain imd_2015.nc imd_2016.nc
+    python rainfall_store.py ingest data/rain daily_*.tif --start 2024-06-01
+    python rainfall_store.py ingest data/rain stations.csv
+    python rainfall_store.py info data/rain
+
+NetCDF needs the optional ``netCDF4`` package and GeoTIFF needs ``rasterio``;
+CSV ingestion uses only the standard library and NumPy.
+"""
+
+import os
+import re
+import csv
+import json
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+# Optional readers
+try:
+    import netCDF4
+    _HAS_NETCDF = True
+except Exception:
+    _HAS_NETCDF = False
+
+try:
+    import rasterio
+    _HAS_RASTERIO = True
+except Exception:
+    _HAS_RASTERIO = False
+
+# Default grid: mainland India at the ERA5 / IMD 0.25 degree resolution
+DEFAULT_BBOX = (6.0, 38.0, 68.0, 98.0)   # lat_min, lat_max, lon_min, lon_max
+DEFAULT_RES = 0.25
+CSV_CHUNK_ROWS = 200_000
+NETCDF_CHUNK_DAYS = 31
+
+META_FILE = "meta.json"
+DATA_FILE = "precip.npy"
+
+_LAT_NAMES = ("lat", "latitude", "LATITUDE", "y")
+_LON_NAMES = ("lon", "longitude", "LONGITUDE", "x")
+_TIME_NAMES = ("time", "TIME", "date", "valid_time")
+_VAR_NAMES = ("rf", "RAINFALL", "rainfall", "precip", "precipitation", "tp", "pr", "precipitation_sum")
+
+
+def _parse_date(value) -> date:
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    text = str(value).strip()[:10]
+    for fmt in ("%Y-%m-%d", "%Y%m%d", "%d-%m-%Y", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date: {value!r}")
+
+
+# ---------------------------------------------------------------------------
+# STORE
+# ---------------------------------------------------------------------------
+
+class RainfallStore:
+    """Memory-mapped (days, lat, lon) float32 precipitation grid; NaN marks missing data."""
+
+    def __init__(self, path: str, mode: str = "r"):
+        self.path = path
+        with open(os.path.join(path, META_FILE), "r") as f:
+            self.meta = json.load(f)
+        self.lat0 = self.meta["lat_min"]
+        self.lon0 = self.meta["lon_min"]
+        self.res = self.meta["res"]
+        self.start = _parse_date(self.meta["start_date"])
+        self.data = np.load(os.path.join(path, DATA_FILE), mmap_mode=mode)
+        self.ndays, self.nlat, self.nlon = self.data.shape
+
+    @classmethod
+    def create(cls, path: str, start, end, bbox=DEFAULT_BBOX, res: float = DEFAULT_RES) -> "RainfallStore":
+        start, end = _parse_date(start), _parse_date(end)
+        lat_min, lat_max, lon_min, lon_max = bbox
+        nlat = int(round((lat_max - lat_min) / res)) + 1
+        nlon = int(round((lon_max - lon_min) / res)) + 1
+        ndays = (end - start).days + 1
+        if ndays <= 0:
+            raise ValueError("end date must not be before start date")
+
+        os.makedirs(path, exist_ok=True)
+        arr = np.lib.format.open_memmap(
+            os.path.join(path, DATA_FILE), mode="w+", dtype=np.float32, shape=(ndays, nlat, nlon)
+        )
+        # fill in slabs so creating a multi-year store never needs the whole array in RAM
+        for i in range(0, ndays, 64):
+            arr[i:i + 64] = np.nan
+        arr.flush()
+        del arr
+
+        meta = {
+            "lat_min": lat_min, "lon_min": lon_min, "res": res,
+            "start_date": start.isoformat(), "end_date": end.isoformat(),
+            "units": "mm/day", "sources": [],
+        }
+        with open(os.path.join(path, META_FILE), "w") as f:
+            json.dump(meta, f, indent=2)
+        return cls(path, mode="r+")
+
+    # --- coordinates -------------------------------------------------------
+
+    @property
+    def end(self) -> date:
+        return self.start + timedelta(days=self.ndays - 1)
+
+    def day_index(self, d) -> int:
+        return (_parse_date(d) - self.start).days
+
+    def end_index(self, end=None) -> int:
+        """Day index of ``end``; today (UTC) when None, so a store that stops short is not "latest"."""
+        return self.day_index(end if end is not None else datetime.utcnow().date())
+
+    def cell(self, lat, lon) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Nearest grid cell for scalar or array coordinates, plus an in-bounds mask."""
+        i = np.rint((np.asarray(lat, dtype=np.float64) - self.lat0) / self.res).astype(np.int64)
+        j = np.rint((np.asarray(lon, dtype=np.float64) - self.lon0) / self.res).astype(np.int64)
+        inside = (i >= 0) & (i < self.nlat) & (j >= 0) & (j < self.nlon)
+        return np.clip(i, 0, self.nlat - 1), np.clip(j, 0, self.nlon - 1), inside
+
+    def contains(self, lat: float, lon: float, end=None) -> bool:
+        _, _, inside = self.cell(lat, lon)
+        return bool(inside) and 0 <= self.end_index(end) < self.ndays
+
+    # --- reads -------------------------------------------------------------
+
+    def window(self, rows: np.ndarray, cols: np.ndarray, end_index: int, days: int) -> np.ndarray:
+        """
+        Daily series ending at ``end_index`` (inclusive) for many cells at once.
+
+        Returns shape (len(rows), days); days before the start of the store are
+        NaN. An ``end_index`` outside the store raises KeyError.
+        """
+        if not 0 <= end_index < self.ndays:
+            raise KeyError(f"day {self.start + timedelta(days=int(end_index))} is outside the rainfall store "
+                           f"({self.start}..{self.end})")
+        rows = np.atleast_1d(rows)
+        cols = np.atleast_1d(cols)
+        lo = end_index - days + 1
+        out = np.full((len(rows), days), np.nan, dtype=np.float32)
+        src_lo = max(lo, 0)
+        slab = self.data[src_lo:end_index + 1]              # contiguous day range
+        out[:, src_lo - lo:] = slab[:, rows, cols].T
+        return out
+
+    def series(self, lat: float, lon: float, end=None, days: int = 60) -> np.ndarray:
+        i, j, inside = self.cell(lat, lon)
+        if not inside:
+            raise KeyError(f"({lat}, {lon}) is outside the rainfall store grid")
+        return self.window(i, j, self.end_index(end), days)[0]
+
+    # --- writes ------------------------------------------------------------
+
+    def write_points(self, days: np.ndarray, lats: np.ndarray, lons: np.ndarray, values: np.ndarray) -> int:
+        """Write scattered (day, lat, lon, value) observations to their nearest cells."""
+        i, j, inside = self.cell(lats, lons)
+        ok = inside & (days >= 0) & (days < self.ndays) & np.isfinite(values)
+        self.data[days[ok], i[ok], j[ok]] = values[ok]
+        return int(ok.sum())
+
+    def write_grid(self, first_day: int, src_lats: np.ndarray, src_lons: np.ndarray, block: np.ndarray) -> int:
+        """
+        Block-average a (days, src_lat, src_lon) chunk onto the store grid.
+
+        Source cells falling in the same store cell are averaged, so finer
+        inputs (0.1 degree ERA5-Land) and native 0.25 degree inputs both work.
+        """
+        i, j, inside = self.cell(src_lats[:, None], src_lons[None, :])
+        i, j = np.broadcast_arrays(i, j)
+        flat = (i * self.nlon + j)[inside]
+        if not len(flat):
+            return 0
+        target, inverse = np.unique(flat, return_inverse=True)
+        rows, cols = np.divmod(target, self.nlon)
+
+        written = 0
+        for k in range(block.shape[0]):
+            t = first_day + k
+            if not 0 <= t < self.ndays:
+                continue
+            vals = np.asarray(block[k], dtype=np.float64)[inside]
+            valid = np.isfinite(vals) & (vals >= 0)
+            sums = np.bincount(inverse, weights=np.where(valid, vals, 0.0), minlength=len(target))
+            counts = np.bincount(inverse, weights=valid, minlength=len(target))
+            has = counts > 0
+            self.data[t, rows[has], cols[has]] = (sums[has] / counts[has]).astype(np.float32)
+            written += int(has.sum())
+        return written
+
+    def record_source(self, source: str):
+        self.meta["sources"].append({"file": os.path.abspath(source), "ingested_at": datetime.utcnow().isoformat()})
+        with open(os.path.join(self.path, META_FILE), "w") as f:
+            json.dump(self.meta, f, indent=2)
+
+    def flush(self):
+        if hasattr(self.data, "flush"):
+            self.data.flush()
+
+
+# ---------------------------------------------------------------------------
+# INGESTION
+# ---------------------------------------------------------------------------
+
+def _find(names, candidates) -> Optional[str]:
+    lowered = {n.lower(): n for n in names}
+    for c in candidates:
+        if c.lower() in lowered:
+            return lowered[c.lower()]
+    return None
+
+
+def ingest_csv(store: RainfallStore, path: str, scale: float = 1.0) -> int:
+    """Long-format CSV with a header naming date, lat, lon and precipitation columns."""
+    written = 0
+    date_cache = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        cols = [
+            _find(header, _TIME_NAMES),
+            _find(header, _LAT_NAMES),
+            _find(header, _LON_NAMES),
+            _find(header, _VAR_NAMES),
+        ]
+        if None in cols:
+            raise ValueError(f"{path}: need date, lat, lon and precipitation columns, got {header}")
+        idx = [header.index(c) for c in cols]
+
+        def chunks() -> Iterator[list]:
+            chunk = []
+            for row in reader:
+                chunk.append(row)
+                if len(chunk) >= CSV_CHUNK_ROWS:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+        for chunk in chunks():
+            days = np.empty(len(chunk), dtype=np.int64)
+            lats = np.empty(len(chunk))
+            lons = np.empty(len(chunk))
+            vals = np.empty(len(chunk))
+            for n, row in enumerate(chunk):
+                d = row[idx[0]]
+                t = date_cache.get(d)
+                if t is None:
+                    t = date_cache[d] = store.day_index(d)
+                days[n] = t
+                lats[n] = float(row[idx[1]])
+                lons[n] = float(row[idx[2]])
+                v = row[idx[3]]
+                vals[n] = float(v) * scale if v not in ("", "NA", "nan") else np.nan
+            written += store.write_points(days, lats, lons, vals)
+    return written
+
+
+def _netcdf_dates(time_var) -> list:
+    stamps = netCDF4.num2date(time_var[:], time_var.units, getattr(time_var, "calendar", "standard"))
+    return [date(s.year, s.month, s.day) for s in stamps]
+
+
+def ingest_netcdf(store: RainfallStore, path: str, variable: Optional[str] = None, scale: float = 1.0) -> int:
+    if not _HAS_NETCDF:
+        raise RuntimeError("NetCDF ingestion needs the 'netCDF4' package: pip install netCDF4")
+
+    written = 0
+    with netCDF4.Dataset(path) as ds:
+        names = list(ds.variables)
+        lat_name, lon_name, time_name = _find(names, _LAT_NAMES), _find(names, _LON_NAMES), _find(names, _TIME_NAMES)
+        var_name = variable or _find(names, _VAR_NAMES)
+        if None in (lat_name, lon_name, time_name, var_name):
+            raise ValueError(f"{path}: could not identify lat/lon/time/precipitation variables in {names}")
+
+        var = ds.variables[var_name]
+        var.set_auto_mask(True)
+        order = [var.dimensions.index(d) for d in (time_name, lat_name, lon_name)]
+        lats = np.asarray(ds.variables[lat_name][:], dtype=np.float64)
+        lons = np.asarray(ds.variables[lon_name][:], dtype=np.float64)
+        dates = _netcdf_dates(ds.variables[time_name])
+        ntime = len(dates)
+
+        for t0 in range(0, ntime, NETCDF_CHUNK_DAYS):
+            t1 = min(ntime, t0 + NETCDF_CHUNK_DAYS)
+            index = [slice(None)] * var.ndim
+            index[order[0]] = slice(t0, t1)
+            raw = var[tuple(index)]
+            block = np.ma.filled(np.ma.asarray(raw, dtype=np.float64), np.nan).transpose(order) * scale
+            # daily files are contiguous in time, so one start index per chunk suffices
+            first = store.day_index(dates[t0])
+            if (dates[t1 - 1] - dates[t0]).days != t1 - 1 - t0:
+                for k in range(t1 - t0):
+                    written += store.write_grid(store.day_index(dates[t0 + k]), lats, lons, block[k:k + 1])
+            else:
+                written += store.write_grid(first, lats, lons, block)
+    return written
+
+
+_DATE_IN_NAME = re.compile(r"(\d{4})[-_]?(\d{2})[-_]?(\d{2})")
+
+
+def ingest_geotiff(store: RainfallStore, path: str, start=None, scale: float = 1.0) -> int:
+    """One band per day. The first band's date is ``start`` or a YYYY-MM-DD / YYYYMMDD in the filename."""
+    if not _HAS_RASTERIO:
+        raise RuntimeError("GeoTIFF ingestion needs the 'rasterio' package: pip install rasterio")
+
+    if start is None:
+        m = _DATE_IN_NAME.search(os.path.basename(path))
+        if not m:
+            raise ValueError(f"{path}: pass --start or put the date in the filename")
+        start = date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+    first = store.day_index(start)
+
+    written = 0
+    with rasterio.open(path) as src:
+        rows = np.arange(src.height) + 0.5
+        cols = np.arange(src.width) + 0.5
+        lons = src.transform.c + cols * src.transform.a
+        lats = src.transform.f + rows * src.transform.e
+        nodata = src.nodata
+        for band in range(1, src.count + 1):
+            data = src.read(band).astype(np.float64)
+            if nodata is not None:
+                data[data == nodata] = np.nan
+            written += store.write_grid(first + band - 1, lats, lons, data[None] * scale)
+    return written
+
+
+def ingest(store: RainfallStore, path: str, fmt: Optional[str] = None, **kwargs) -> int:
+    ext = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+    if ext in ("csv", "txt"):
+        n = ingest_csv(store, path, scale=kwargs.get("scale", 1.0))
+    elif ext in ("nc", "nc4", "netcdf"):
+        n = ingest_netcdf(store, path, variable=kwargs.get("variable"), scale=kwargs.get("scale", 1.0))
+    elif ext in ("tif", "tiff", "geotiff"):
+        n = ingest_geotiff(store, path, start=kwargs.get("start"), scale=kwargs.get("scale", 1.0))
+    else:
+        raise ValueError(f"Unsupported rainfall file format: {path}")
+    store.flush()
+    store.record_source(path)
+    return n
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    c = sub.add_parser("create", help="allocate an empty store")
+    c.add_argument("path")
+    c.add_argument("--start", required=True)
+    c.add_argument("--end", required=True)
+    c.add_argument("--bbox", type=float, nargs=4, default=DEFAULT_BBOX, metavar=("LAT_MIN", "LAT_MAX", "LON_MIN", "LON_MAX"))
+    c.add_argument("--res", type=float, default=DEFAULT_RES)
+
+    i = sub.add_parser("ingest", help="stream files into an existing store")
+    i.add_argument("path")
+    i.add_argument("files", nargs="+")
+    i.add_argument("--format", choices=["csv", "netcdf", "geotiff"], default=None)
+    i.add_argument("--variable", default=None, help="NetCDF variable name (auto-detected by default)")
+    i.add_argument("--start", default=None, help="date of the first GeoTIFF band")
+    i.add_argument("--scale", type=float, default=1.0, help="multiply values, e.g. 1000 for ERA5 tp in metres")
+
+    n = sub.add_parser("info", help="describe a store")
+    n.add_argument("path")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "create":
+        store = RainfallStore.create(args.path, args.start, args.end, tuple(args.bbox), args.res)
+        print(f"created {store.ndays} days x {store.nlat} x {store.nlon} grid at {args.path}")
+
+    elif args.command == "ingest":
+        store = RainfallStore(args.path, mode="r+")
+        for path in args.files:
+            written = ingest(store, path, args.format, variable=args.variable, start=args.start, scale=args.scale)
+            print(f"{path}: {written} cell-days written")
+
+    elif args.command == "info":
+        store = RainfallStore(args.path)
+        filled = sum(int(np.isfinite(store.data[t]).any()) for t in range(store.ndays))
+        print(json.dumps(dict(store.meta, shape=list(store.data.shape), days_with_data=filled), indent=2))
+
+
+if __name__ == "__main__":
+    main()
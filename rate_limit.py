@@ -0,0 +1,302 @@
+"""
+Per-client rate limiting with token buckets.
+
+Clients are identified by their session (``Authorization: Bearer <token>``
+or a ``token`` query parameter, validated against ``auth.User``), else by
+IP address. Behind a reverse proxy (``RATE_LIMIT_TRUST_PROXY=1``) the IP
+is the ``X-Forwarded-For`` entry added by the outermost of
+``RATE_LIMIT_PROXY_HOPS`` trusted proxies, counted from the right:
+everything to its left is whatever the client sent.
+
+Each client has a bucket of ``RATE_LIMIT_BURST`` tokens that refills at
+``RATE_LIMIT_PER_MINUTE`` per minute; a request spends its endpoint's
+cost (``COSTS``, override with ``RATE_LIMIT_COSTS``), so a district
+prediction or a chat reply drains the bucket faster than a static
+dataset. Requests that cannot pay get 429 with ``Retry-After``; every
+limited response carries ``RateLimit-Limit``, ``RateLimit-Remaining`` and
+``RateLimit-Reset``.
+
+Buckets live in a bounded in-memory map. A bucket left idle long enough to
+refill is indistinguishable from a new one, so it expires then. Under
+serve.py (``SHARED_STATE_PATH`` set) the buckets are kept in shared_store
+instead, so a client's budget holds across workers.
+"""
+
+import os
+import json
+import math
+import time
+import struct
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+import shared_store
+
+# CONFIGURATION
+
+ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))    # sustained tokens per client
+BURST = float(os.getenv("RATE_LIMIT_BURST", "60"))              # bucket capacity
+MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))      # in-memory buckets kept
+BACKEND = os.getenv("RATE_LIMIT_BACKEND", "auto")               # auto | memory | shared
+TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "0") == "1"   # key on X-Forwarded-For (behind a proxy)
+PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", "1"))       # trusted proxies appending to X-Forwarded-For
+SESSION_CACHE_SEC = 60.0
+
+# (method, path prefix) -> tokens per request; the longest matching prefix wins
+COSTS: Dict[Tuple[str, str], float] = {
+    ("POST", "/predict/explain"): 10,
+    ("POST", "/predict/"): 5,
+    ("POST", "/predict-by-coordinates"): 5,
+    ("POST", "/reverse-geocode"): 5,
+    ("POST", "/chat"): 10,
+    ("POST", "/simulate"): 20,
+    ("POST", "/auth/"): 3,
+    ("GET", "/healthz"): 0,
+    ("GET", "/readyz"): 0,
+}
+if os.getenv("RATE_LIMIT_COSTS"):
+    # e.g. {"POST /chat": 20, "GET /datasets": 0}
+    for rule, cost in json.loads(os.environ["RATE_LIMIT_COSTS"]).items():
+        method, _, prefix = rule.partition(" ")
+        COSTS[(method.upper(), prefix)] = float(cost)
+
+DEFAULT_COST = 1.0
+
+
+def cost_of(method: str, path: str, costs: Dict[Tuple[str, str], float] = COSTS) -> float:
+    best, cost = -1, DEFAULT_COST
+    for (m, prefix), c in costs.items():
+        if m == method and path.startswith(prefix) and len(prefix) > best:
+            best, cost = len(prefix), c
+    return cost
+
+
+# BUCKETS
+
+def _take(tokens: float, stamp: float, now: float, cost: float, burst: float, rate: float):
+    """One token-bucket step: (allowed, tokens after, wait until enough tokens)."""
+    tokens = min(burst, tokens + (now - stamp) * rate)
+    cost = min(cost, burst)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate
+
+
+class MemoryBuckets:
+    """Bounded LRU of key -> [tokens, stamp] for one process."""
+
+    blocking = False
+
+    def __init__(self, burst: float = BURST, per_minute: float = PER_MINUTE, max_keys: int = MAX_KEYS):
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.max_keys = max_keys
+        self.refill_sec = burst / self.rate
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float) -> Tuple[bool, float, float]:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+            else:
+                self._buckets.move_to_end(key)
+            allowed, bucket[0], wait = _take(bucket[0], bucket[1], now, cost, self.burst, self.rate)
+            bucket[1] = now
+            remaining = bucket[0]
+
+            # sliding expiry: the least recently used buckets are full again after refill_sec
+            while self._buckets:
+                oldest_key, oldest = next(iter(self._buckets.items()))
+                if len(self._buckets) > self.max_keys or now - oldest[1] >= self.refill_sec:
+                    del self._buckets[oldest_key]
+                else:
+                    break
+        return allowed, remaining, wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SharedBuckets:
+    """Buckets in shared_store: one atomic read-modify-write per request, shared by all workers."""
+
+    blocking = True
+    _FORMAT = struct.Struct("<dd")
+
+    def __init__(self, path: str, burst: float = BURST, per_minute: float = PER_MINUTE):
+        self.kv = shared_store.SharedKV(path, table="rate_limit")
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.refill_sec = burst / self.rate
+        self._writes = 0
+
+    def take(self, key: str, cost: float) -> Tuple[bool, float, float]:
+        now = time.time()
+
+        def step(current: Optional[bytes]):
+            tokens, stamp = self._FORMAT.unpack(current) if current else (self.burst, now)
+            allowed, tokens, wait = _take(tokens, stamp, now, cost, self.burst, self.rate)
+            return self._FORMAT.pack(tokens, now), (allowed, tokens, wait)
+
+        result = self.kv.update(key, step, ttl=self.refill_sec)
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self.kv.purge_expired()
+        return result
+
+    def __len__(self):
+        return len(self.kv)
+
+
+def default_backend():
+    if BACKEND == "shared" or (BACKEND == "auto" and shared_store.enabled()):
+        return SharedBuckets(shared_store.SHARED_STATE_PATH or shared_store.DEFAULT_PATH)
+    return MemoryBuckets()
+
+
+# MIDDLEWARE
+
+def forwarded_for(value: str, hops: int = PROXY_HOPS) -> Optional[str]:
+    """The client address recorded by the outermost of ``hops`` trusted proxies."""
+    entries = [e.strip() for e in value.split(",") if e.strip()]
+    if not entries:
+        return None
+    return entries[-min(max(hops, 1), len(entries))]
+
+
+def _bearer(headers: Headers, query_string: bytes) -> Optional[str]:
+    auth = headers.get("authorization", "")
+    if auth[:7].lower() == "bearer ":
+        return auth[7:].strip() or None
+    for part in query_string.split(b"&"):
+        if part.startswith(b"token="):
+            return part[6:].decode("latin-1") or None
+    return None
+
+
+class RateLimiter:
+    """
+    Identity, cost and bucket lookup for one request. ``session_user(token)``
+    maps a session token to a user id (None when invalid); it runs in a
+    worker thread and its answers are cached for ``SESSION_CACHE_SEC``, so a
+    forged token just falls back to the IP. So does any token while
+    ``session_user`` fails (e.g. the database is still loading); those
+    answers are not cached.
+    """
+
+    def __init__(self, session_user: Callable[[str], Optional[int]], backend=None,
+                 costs: Dict[Tuple[str, str], float] = COSTS, enabled: bool = ENABLED,
+                 trust_proxy: bool = TRUST_PROXY, proxy_hops: int = PROXY_HOPS):
+        self.session_user = session_user
+        self.trust_proxy = trust_proxy
+        self.proxy_hops = proxy_hops
+        self.backend = backend if backend is not None else default_backend()
+        self.costs = costs
+        self.enabled = enabled
+        self._sessions: "OrderedDict[str, Tuple[Optional[int], float]]" = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+
+    async def identity(self, scope) -> str:
+        headers = Headers(scope=scope)
+        token = _bearer(headers, scope.get("query_string", b""))
+        if token:
+            now = time.monotonic()
+            cached = self._sessions.get(token)
+            if cached is None or now - cached[1] > SESSION_CACHE_SEC:
+                try:
+                    uid = await anyio.to_thread.run_sync(self.session_user, token)
+                except Exception:
+                    cached = (None, now)
+                else:
+                    self._sessions[token] = cached = (uid, now)
+                    while len(self._sessions) > MAX_KEYS:
+                        self._sessions.popitem(last=False)
+            if cached[0] is not None:
+                return f"user:{cached[0]}"
+
+        if self.trust_proxy and "x-forwarded-for" in headers:
+            ip = forwarded_for(headers["x-forwarded-for"], self.proxy_hops)
+            if ip:
+                return "ip:" + ip
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def check(self, scope):
+        """None when the request is not limited, else (allowed, seconds to wait, RateLimit-* headers)."""
+        if not self.enabled or scope["method"] == "OPTIONS":
+            return None
+        cost = cost_of(scope["method"], scope["path"], self.costs)
+        if cost <= 0:
+            return None
+
+        key = await self.identity(scope)
+        if self.backend.blocking:
+            allowed, remaining, wait = await anyio.to_thread.run_sync(self.backend.take, key, cost)
+        else:
+            allowed, remaining, wait = self.backend.take(key, cost)
+
+        if allowed:
+            self.allowed += 1
+        else:
+            self.limited += 1
+        burst, rate = self.backend.burst, self.backend.rate
+        headers = [
+            (b"ratelimit-limit", str(int(burst)).encode()),
+            (b"ratelimit-remaining", str(int(remaining)).encode()),
+            (b"ratelimit-reset", str(math.ceil((burst - remaining) / rate)).encode()),
+        ]
+        return allowed, wait, headers
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "burst": self.backend.burst,
+            "per_minute": self.backend.rate * 60,
+            "clients": len(self.backend),
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
+
+
+class RateLimitMiddleware:
+    """ASGI middleware: 429 for requests the limiter rejects, RateLimit-* headers on the rest."""
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        verdict = await self.limiter.check(scope)
+        if verdict is None:
+            return await self.app(scope, receive, send)
+
+        allowed, wait, headers = verdict
+        if not allowed:
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded"},
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+            response.raw_headers.extend(headers)
+            return await response(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), *headers]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
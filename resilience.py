@@ -0,0 +1,457 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+import shared_store
+
+# ---------------------------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------------------------
+
+MIN_TIMEOUT_SEC = float(os.getenv("UPSTREAM_MIN_TIMEOUT", "1.5"))
+MAX_TIMEOUT_SEC = float(os.getenv("UPSTREAM_MAX_TIMEOUT", "10"))
+FAILURE_THRESHOLD = int(os.getenv("UPSTREAM_FAILURE_THRESHOLD", "5"))   # consecutive failures before opening
+RESET_TIMEOUT_SEC = float(os.getenv("UPSTREAM_RESET_TIMEOUT", "30"))    # open -> half-open after this long
+MAX_INFLIGHT_PER_HOST = int(os.getenv("UPSTREAM_MAX_INFLIGHT", "8"))    # bulkhead per provider
+HEDGING_ENABLED = os.getenv("UPSTREAM_HEDGING", "0") == "1"
+LATENCY_WINDOW = 200    # samples kept per host
+MIN_SAMPLES = 20        # below this, fall back to MAX_TIMEOUT_SEC and no hedging
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when an upstream provider cannot serve a request and nothing is cached."""
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """Raised without calling the provider while its circuit breaker is open."""
+
+
+# ---------------------------------------------------------------------------
+# PER-HOST STATE
+# ---------------------------------------------------------------------------
+
+class CircuitBreaker:
+    """Classic closed / open / half-open breaker counting consecutive failures."""
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT_SEC):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.state = "closed"
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probe_in_flight:
+                # let exactly one probe through
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = "closed"
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.time()
+
+    def retry_after(self) -> int:
+        if self.state != "open":
+            return 1
+        return max(1, int(self.reset_timeout - (time.time() - self.opened_at)) + 1)
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies used to derive timeouts and hedge delays."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self.samples) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def timeout(self) -> float:
+        """Adaptive timeout: 3x observed p99, clamped to [MIN_TIMEOUT_SEC, MAX_TIMEOUT_SEC]."""
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return MAX_TIMEOUT_SEC
+        return min(MAX_TIMEOUT_SEC, max(MIN_TIMEOUT_SEC, 3 * p99))
+
+    def hedge_delay(self) -> Optional[float]:
+        """Send a hedged request once the primary is slower than the observed p95."""
+        return self.percentile(0.95)
+
+
+class HostState:
+    def __init__(self, host: str):
+        self.host = host
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.bulkhead = threading.BoundedSemaphore(MAX_INFLIGHT_PER_HOST)
+        self.calls = 0
+        self.failures = 0
+        self.hedges = 0
+        self.rejected = 0
+
+
+_hosts: Dict[str, HostState] = {}
+_hosts_lock = threading.Lock()
+
+
+def host_state(host: str) -> HostState:
+    with _hosts_lock:
+        state = _hosts.get(host)
+        if state is None:
+            state = _hosts[host] = HostState(host)
+        return state
+
+
+# ---------------------------------------------------------------------------
+# STALE-WHILE-REVALIDATE CACHE
+# ---------------------------------------------------------------------------
+
+class ResponseCache:
+    """Thread-safe key -> (payload, fetched_at) store for upstream JSON responses."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Any, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, key: str, payload: Any, fetched_at: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (payload, fetched_at if fetched_at is not None else time.time())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedResponseCache:
+    """
+    ResponseCache stored in shared_store so every worker process on the host
+    shares one upstream cache. Decoded payloads are memoised per process and
+    reused while the shared entry's timestamp is unchanged.
+    """
+
+    def __init__(self, path: str):
+        self.kv = shared_store.SharedKV(path, table="upstream_cache")
+        self._decoded: Dict[str, Tuple[Any, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        fetched_at = self.kv.stored_at(key)
+        if fetched_at is None:
+            return None
+        with self._lock:
+            local = self._decoded.get(key)
+        if local and local[1] == fetched_at:
+            return local
+        row = self.kv.get(key)
+        if row is None:
+            return None
+        entry = (json.loads(row[0]), row[1])
+        with self._lock:
+            self._decoded[key] = entry
+        return entry
+
+    def set(self, key: str, payload: Any, fetched_at: Optional[float] = None):
+        fetched_at = fetched_at if fetched_at is not None else time.time()
+        self.kv.set(key, json.dumps(payload, separators=(",", ":")).encode("utf-8"), fetched_at)
+        with self._lock:
+            self._decoded[key] = (payload, fetched_at)
+
+    def clear(self):
+        self.kv.clear()
+        with self._lock:
+            self._decoded.clear()
+
+    def __len__(self):
+        return len(self.kv)
+
+
+if shared_store.enabled():
+    response_cache = SharedResponseCache(shared_store.SHARED_STATE_PATH)
+else:
+    response_cache = ResponseCache()
+
+# Background refreshes run here; bounded so a provider incident cannot turn
+# into an unbounded pile of blocked threads.
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="upstream")
+# Hedged calls get their own pool: a refresh thread waiting on a hedge must
+# never queue behind other refreshes. Every call here holds a bulkhead slot,
+# so a few hosts' worth of slots is always enough workers.
+_HEDGE_WORKERS = 4 * MAX_INFLIGHT_PER_HOST
+_hedge_executor = ThreadPoolExecutor(max_workers=_HEDGE_WORKERS, thread_name_prefix="upstream-hedge")
+_session = requests.Session()
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # worker threads and pooled sockets do not survive fork()
+    global _executor, _hedge_executor, _session, _refreshing_lock
+    _executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="upstream")
+    _hedge_executor = ThreadPoolExecutor(max_workers=_HEDGE_WORKERS, thread_name_prefix="upstream-hedge")
+    _session = requests.Session()
+    _refreshing.clear()
+    _refreshing_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# ---------------------------------------------------------------------------
+# STALENESS TRACKING
+# ---------------------------------------------------------------------------
+
+class StaleTracker:
+    def __init__(self):
+        self.sources = []
+
+    @property
+    def stale(self) -> bool:
+        return bool(self.sources)
+
+    def mark(self, key: str):
+        self.sources.append(key)
+
+
+_tracker: contextvars.ContextVar = contextvars.ContextVar("upstream_stale_tracker", default=None)
+
+
+@contextmanager
+def track_staleness():
+    """Collect whether any fetch inside the block was answered from stale cache."""
+    tracker = StaleTracker()
+    token = _tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _tracker.reset(token)
+
+
+# ---------------------------------------------------------------------------
+# FETCHING
+# ---------------------------------------------------------------------------
+
+def _call(url: str, params: dict, timeout: float) -> Any:
+    resp = _session.get(url, params=params, timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def _fetch(url: str, params: dict) -> Any:
+    """One guarded upstream call: breaker check, bulkhead, adaptive timeout and optional hedging."""
+    state = host_state(urlparse(url).hostname)
+
+    # bulkhead first: a half-open breaker hands out its one probe only to a call that will run
+    if not state.bulkhead.acquire(blocking=False):
+        state.rejected += 1
+        raise UpstreamUnavailable(f"{state.host} has too many requests in flight")
+
+    if not state.breaker.allow():
+        state.bulkhead.release()
+        state.rejected += 1
+        raise CircuitOpen(f"{state.host} circuit open, retry in {state.breaker.retry_after()}s")
+
+    timeout = state.latency.timeout()
+    hedge_delay = state.latency.hedge_delay() if HEDGING_ENABLED else None
+    start = time.perf_counter()
+    state.calls += 1
+    try:
+        if hedge_delay is None:
+            try:
+                data = _call(url, params, timeout)
+            finally:
+                state.bulkhead.release()
+        else:
+            data = _hedged_call(state, url, params, timeout, hedge_delay)
+    except Exception as e:
+        state.failures += 1
+        state.breaker.record_failure()
+        raise UpstreamUnavailable(f"{state.host} request failed: {e}") from e
+
+    state.latency.record(time.perf_counter() - start)
+    state.breaker.record_success()
+    return data
+
+
+def _submit_holding_slot(state: HostState, url: str, params: dict, timeout: float):
+    """Run ``_call`` on the hedge pool; the caller's bulkhead slot is released when it finishes."""
+    try:
+        future = _hedge_executor.submit(_call, url, params, timeout)
+    except BaseException:
+        state.bulkhead.release()
+        raise
+    future.add_done_callback(lambda _: state.bulkhead.release())
+    return future
+
+
+def _hedged_call(state: HostState, url: str, params: dict, timeout: float, hedge_delay: float) -> Any:
+    """
+    Primary call plus, once it is slower than ``hedge_delay``, a second one.
+    Takes over the bulkhead slot ``_fetch`` acquired; the hedge needs a slot
+    of its own and is skipped when none is free. A losing call keeps its
+    slot until it finishes, so slow stragglers still count as in flight.
+    """
+    primary = _submit_holding_slot(state, url, params, timeout)
+    done, _ = wait([primary], timeout=hedge_delay)
+    if done:
+        return primary.result()
+
+    if not state.bulkhead.acquire(blocking=False):
+        return primary.result(timeout=max(0.0, timeout - hedge_delay))
+
+    state.hedges += 1
+    secondary = _submit_holding_slot(state, url, params, timeout)
+    pending = {primary, secondary}
+    deadline = time.perf_counter() + timeout
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, deadline - time.perf_counter()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for fut in done:
+            if fut.exception() is None:
+                return fut.result()
+            error = fut.exception()
+    raise error or TimeoutError(f"hedged request exceeded {timeout:.1f}s")
+
+
+def _refresh(key: str, refresh):
+    try:
+        refresh()
+    except UpstreamUnavailable as e:
+        print("Background refresh failed:", e)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+
+def refresh_in_background(key: str, refresh):
+    """Run ``refresh()`` on the upstream executor unless a refresh for ``key`` is already pending."""
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    _executor.submit(_refresh, key, refresh)
+
+
+def fetch_json(url: str, params: dict) -> Any:
+    """Guarded upstream call without caching, for callers that manage their own cache entries."""
+    return _fetch(url, params)
+
+
+def lookup(key: str, ttl: float, max_stale: float) -> Tuple[Optional[Any], str]:
+    """Return ``(payload, status)`` where status is "fresh", "stale", "expired" or "missing"."""
+    cached = response_cache.get(key)
+    if not cached:
+        return None, "missing"
+    payload, fetched_at = cached
+    age = time.time() - fetched_at
+    if age < ttl:
+        return payload, "fresh"
+    if age < max_stale:
+        return payload, "stale"
+    return payload, "expired"
+
+
+def get_json(url: str, params: dict, key: str, ttl: float, max_stale: float) -> Any:
+    """
+    Fetch a JSON document through the resilience layer.
+
+    Fresh cache hits (younger than ``ttl``) are returned directly. Entries up
+    to ``max_stale`` old are returned immediately, flagged on the active
+    ``track_staleness()`` tracker, and refreshed in the background. Otherwise
+    the provider is called synchronously; if that fails, any cached copy is
+    served as stale before giving up with ``UpstreamUnavailable``.
+    """
+    payload, status = lookup(key, ttl, max_stale)
+
+    if status == "fresh":
+        return payload
+
+    if status == "stale":
+        refresh_in_background(key, lambda: response_cache.set(key, _fetch(url, params)))
+        mark_stale(key)
+        return payload
+
+    try:
+        fresh = _fetch(url, params)
+    except UpstreamUnavailable:
+        if payload is not None:
+            mark_stale(key)
+            return payload
+        raise
+
+    response_cache.set(key, fresh)
+    return fresh
+
+
+def mark_stale(key: str):
+    """Flag the active request as having been answered (partly) from stale data."""
+    tracker = _tracker.get()
+    if tracker is not None:
+        tracker.mark(key)
+
+
+def retry_after(url: str) -> int:
+    """Seconds a client should wait before retrying a request that failed on ``url``'s host."""
+    return host_state(urlparse(url).hostname).breaker.retry_after()
+
+
+def snapshot() -> dict:
+    """Per-host breaker and latency state, for the status endpoint."""
+    out = {}
+    for host, state in list(_hosts.items()):
+        p50 = state.latency.percentile(0.5)
+        p95 = state.latency.percentile(0.95)
+        out[host] = {
+            "circuit": state.breaker.state,
+            "consecutive_failures": state.breaker.failures,
+            "timeout_s": round(state.latency.timeout(), 3),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "calls": state.calls,
+            "failures": state.failures,
+            "hedges": state.hedges,
+            "rejected": state.rejected,
+        }
+    return {"hedging": HEDGING_ENABLED, "cached_entries": len(response_cache), "hosts": out}
@@ -0,0 +1,289 @@
+"""
+Risk classification: model probability -> calibrated probability -> level.
+
+The stage has two parts, both read from a calibration artifact
+(``risk_calibration.json`` by default, ``RISK_CALIBRATION`` to override):
+
+- a calibration map fitted offline on backtest scores against observed
+  floods: isotonic (piecewise-linear breakpoints) or Platt (a sigmoid over
+  the model's log-odds);
+- a threshold table: default Low/Moderate/High cut-offs plus optional
+  per-state or per-district overrides.
+
+Everything works on whole arrays. Levels come from one ``np.searchsorted``
+call even when every row has its own region, so batch, forecast and grid
+scoring get levels at no extra cost.
+
+The artifact records the sha256 of the model it was fitted for. If the
+model file changes, the artifact is ignored, with a warning, until it is
+refitted:
+
+    python risk_levels.py fit runs/decade --labels floods.csv --method isotonic
+    python risk_levels.py fit runs/decade --labels floods.csv --regions region_thresholds.json
+    python risk_levels.py info
+
+Without an artifact the stage is the identity map with the 0.7 / 0.9
+cut-offs the API has always used.
+"""
+
+import os
+import json
+import hashlib
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+# CONFIGURATION
+
+MODEL_PATH = "flood_xgboost_model.pkl"
+CALIBRATION_PATH = os.getenv("RISK_CALIBRATION", "risk_calibration.json")
+
+# Probability cut-offs between Low / Moderate / High
+RISK_LEVELS = ("Low", "Moderate", "High")
+DEFAULT_THRESHOLDS = (0.7, 0.9)
+
+_EPS = 1e-6
+
+
+def model_sha256(path: str = MODEL_PATH) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def region_key(state: str, district: Optional[str] = None) -> str:
+    return f"{state}/{district}".lower() if district else state.lower()
+
+
+# CLASSIFIER
+
+class RiskClassifier:
+    """Calibration map plus a per-region threshold table."""
+
+    def __init__(self, method: str = "identity", params: Optional[dict] = None,
+                 thresholds: Sequence[float] = DEFAULT_THRESHOLDS, regions: Optional[Dict[str, Sequence[float]]] = None,
+                 model_sha256: Optional[str] = None):
+        if method not in ("identity", "isotonic", "platt"):
+            raise ValueError(f"unknown calibration method {method!r}")
+        self.method = method
+        self.params = params or {}
+        self.model_sha256 = model_sha256
+        self.regions = {region_key(*k.split("/", 1)): list(v) for k, v in (regions or {}).items()}
+
+        # row 0 = default; one row per region override
+        self._region_index = {key: i + 1 for i, key in enumerate(self.regions)}
+        table = np.array([list(thresholds)] + list(self.regions.values()), dtype=np.float64)
+        if table.shape[1] != len(RISK_LEVELS) - 1:
+            raise ValueError(f"every threshold row needs {len(RISK_LEVELS) - 1} cut-offs")
+        if (np.diff(table, axis=1) < 0).any() or (table < 0).any() or (table > 1).any():
+            raise ValueError("thresholds must be increasing and within [0, 1]")
+        self.table = table
+        # row r shifted by 2r: all rows in one sorted array, searched in one call
+        self._shifted = (table + 2.0 * np.arange(len(table))[:, None]).ravel()
+
+        if method == "isotonic":
+            self._x = np.asarray(self.params["x"], dtype=np.float64)
+            self._y = np.asarray(self.params["y"], dtype=np.float64)
+
+        canonical = json.dumps(
+            {"method": method, "params": self.params, "table": table.tolist(),
+             "regions": sorted(self.regions), "model": model_sha256},
+            sort_keys=True,
+        )
+        self.version = hashlib.sha256(canonical.encode()).hexdigest()[:12]
+
+    @property
+    def thresholds(self) -> list:
+        return self.table[0].tolist()
+
+    def region(self, state: str, district: Optional[str] = None) -> int:
+        """Threshold row for a place: district override, else state override, else default (0)."""
+        if district is not None:
+            row = self._region_index.get(region_key(state, district))
+            if row is not None:
+                return row
+        return self._region_index.get(region_key(state), 0)
+
+    def region_rows(self, names) -> np.ndarray:
+        """Threshold rows for a sequence of (state, district) pairs."""
+        return np.fromiter((self.region(s, d) for s, d in names), dtype=np.int64, count=len(names))
+
+    def calibrate(self, probs) -> np.ndarray:
+        p = np.asarray(probs, dtype=np.float64)
+        if self.method == "isotonic":
+            return np.interp(p, self._x, self._y)
+        if self.method == "platt":
+            q = np.clip(p, _EPS, 1 - _EPS)
+            return 1.0 / (1.0 + np.exp(-(self.params["a"] * np.log(q / (1 - q)) + self.params["b"])))
+        return p
+
+    def levels(self, calibrated, rows=0) -> np.ndarray:
+        """Level indices into RISK_LEVELS for calibrated probabilities; ``rows`` scalar or per-element."""
+        p = np.clip(np.asarray(calibrated, dtype=np.float64), 0.0, 1.0)
+        rows = np.asarray(rows)
+        if rows.ndim == 0:
+            return np.searchsorted(self.table[int(rows)], p, side="right")
+        k = self.table.shape[1]
+        return np.searchsorted(self._shifted, p + 2.0 * rows, side="right") - k * rows
+
+    def classify(self, probs, rows=0):
+        """(calibrated probabilities, level indices) for raw model probabilities."""
+        calibrated = self.calibrate(probs)
+        return calibrated, self.levels(calibrated, rows)
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "method": self.method,
+            "thresholds": self.thresholds,
+            "regions": len(self.regions),
+            "model_sha256": self.model_sha256,
+        }
+
+    def to_artifact(self, **extra) -> dict:
+        return {
+            "format": 1,
+            "model_sha256": self.model_sha256,
+            "method": self.method,
+            self.method: self.params,
+            "thresholds": self.thresholds,
+            "regions": self.regions,
+            **extra,
+        }
+
+
+def level_names(indices) -> list:
+    return [RISK_LEVELS[int(i)] for i in np.atleast_1d(indices)]
+
+
+def load(path: str = CALIBRATION_PATH, model_path: str = MODEL_PATH) -> RiskClassifier:
+    """The artifact at ``path`` if it matches the model, else the identity classifier."""
+    if not os.path.exists(path):
+        return RiskClassifier()
+
+    with open(path, "r", encoding="utf-8") as f:
+        artifact = json.load(f)
+
+    current = model_sha256(model_path)
+    if artifact.get("model_sha256") != current:
+        print(f"[WARN] {path} was fitted for a different model (sha256 {str(artifact.get('model_sha256'))[:12]}, "
+              f"current {current[:12]}); using uncalibrated default thresholds until it is refitted")
+        return RiskClassifier(model_sha256=current)
+
+    method = artifact.get("method", "identity")
+    return RiskClassifier(
+        method=method,
+        params=artifact.get(method),
+        thresholds=artifact.get("thresholds", DEFAULT_THRESHOLDS),
+        regions=artifact.get("regions"),
+        model_sha256=current,
+    )
+
+
+# FITTING (offline)
+
+def fit(prob: np.ndarray, y: np.ndarray, method: str = "isotonic", max_knots: int = 200) -> dict:
+    """Calibration params for ``RiskClassifier`` from raw probabilities and 0/1 outcomes."""
+    prob = np.asarray(prob, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    if method == "isotonic":
+        from sklearn.isotonic import IsotonicRegression
+
+        iso = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds="clip").fit(prob, y)
+        x, fx = iso.X_thresholds_, iso.y_thresholds_
+        if len(x) > max_knots:
+            keep = np.unique(np.linspace(0, len(x) - 1, max_knots).round().astype(int))
+            x, fx = x[keep], fx[keep]
+        return {"x": np.round(x, 6).tolist(), "y": np.round(fx, 6).tolist()}
+
+    if method == "platt":
+        from sklearn.linear_model import LogisticRegression
+
+        q = np.clip(prob, _EPS, 1 - _EPS)
+        lr = LogisticRegression(C=1e6).fit(np.log(q / (1 - q)).reshape(-1, 1), y)
+        return {"a": float(lr.coef_[0, 0]), "b": float(lr.intercept_[0])}
+
+    raise ValueError(f"unknown calibration method {method!r}")
+
+
+def _backtest_scores(run_dir: str, labels_path: str):
+    """Raw probabilities and outcomes from a backtest.py output directory."""
+    import backtest
+    from rainfall_store import RainfallStore
+
+    with open(os.path.join(run_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    names = [tuple(n.split("/", 1)) for n in manifest["districts"]]
+    parts = sorted(p for p in os.listdir(run_dir) if p.startswith("part-") and not p.endswith(".tmp"))
+    cols = [backtest.read_part(os.path.join(run_dir, p)) for p in parts]
+    prob = np.concatenate([c["prob"] for c in cols]).astype(np.float64)
+    day = np.concatenate([c["day"] for c in cols])
+    district = np.concatenate([c["district"] for c in cols])
+
+    events = backtest.load_labels(labels_path, names, RainfallStore(manifest["store"]))
+    y = np.fromiter(((int(t), int(d)) in events for t, d in zip(day, district)), dtype=bool, count=len(prob))
+    return prob, y, manifest["model_sha256"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("fit", help="fit a calibration map on backtest scores")
+    p.add_argument("run_dir", help="backtest.py --out directory")
+    p.add_argument("--labels", required=True, help="CSV of observed floods: state,district,date")
+    p.add_argument("--method", choices=["isotonic", "platt"], default="isotonic")
+    p.add_argument("--thresholds", type=float, nargs=2, default=list(DEFAULT_THRESHOLDS))
+    p.add_argument("--regions", default=None, help='JSON {"State" or "State/District": [low, high]}')
+    p.add_argument("--model", default=MODEL_PATH)
+    p.add_argument("--out", default=CALIBRATION_PATH)
+
+    p = sub.add_parser("info", help="show the active calibration")
+    p.add_argument("path", nargs="?", default=CALIBRATION_PATH)
+    p.add_argument("--model", default=MODEL_PATH)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        print(json.dumps(load(args.path, args.model).describe(), indent=2))
+        return
+
+    prob, y, scored_with = _backtest_scores(args.run_dir, args.labels)
+    sha = model_sha256(args.model)
+    if scored_with != sha:
+        raise SystemExit(f"{args.run_dir} was scored with a different model; rerun the backtest first")
+    if not y.any():
+        raise SystemExit("no labelled flood days fall inside the backtest range")
+
+    regions = None
+    if args.regions:
+        with open(args.regions, "r", encoding="utf-8") as f:
+            regions = json.load(f)
+
+    params = fit(prob, y, args.method)
+    clf = RiskClassifier(args.method, params, args.thresholds, regions, model_sha256=sha)
+    calibrated = clf.calibrate(prob)
+    artifact = clf.to_artifact(
+        fitted={
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "backtest": os.path.abspath(args.run_dir),
+            "samples": int(len(prob)),
+            "events": int(y.sum()),
+            "brier_raw": round(float(np.mean((prob - y) ** 2)), 6),
+            "brier_calibrated": round(float(np.mean((calibrated - y) ** 2)), 6),
+        },
+    )
+    tmp = args.out + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, indent=2)
+    os.replace(tmp, args.out)
+    print(json.dumps({"version": clf.version, **artifact["fitted"]}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
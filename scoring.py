@@ -0,0 +1,173 @@
+"""
+Execution model for prediction requests.
+
+A prediction is split into blocking I/O (upstream weather/rainfall fetches,
+SQLite writes, alerts) and CPU-bound scoring (feature rows + XGBoost). Each
+kind runs on its own bounded pool so a burst of predictions cannot take the
+threads that serve cheap endpoints (``/``, ``/auth/*``, ``/risk-markers``):
+
+- ``io``:  an anyio capacity limiter, separate from Starlette's default one
+- ``cpu``: a small dedicated thread pool for scoring
+
+Both pools admit a limited number of waiting jobs. Beyond that, requests
+fail fast with ``Overloaded`` (served as 503 with ``Retry-After``) instead
+of queueing until the client times out.
+"""
+
+import os
+import math
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import anyio
+import anyio.to_thread
+
+# CONFIGURATION
+
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "2"))
+SCORING_QUEUE = int(os.getenv("SCORING_QUEUE", "32"))          # jobs allowed to wait for a scoring thread
+IO_CONCURRENCY = int(os.getenv("PREDICT_IO_CONCURRENCY", "32"))
+IO_QUEUE = int(os.getenv("PREDICT_IO_QUEUE", "128"))           # requests allowed to wait for an I/O slot
+MAX_RETRY_AFTER_SEC = 30
+
+
+class Overloaded(Exception):
+    """A pool's queue is full; surfaced to clients as 503 with Retry-After."""
+
+    def __init__(self, pool: str, retry_after: int):
+        super().__init__(f"{pool} queue is full, retry in {retry_after}s")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+class _Stats:
+    """Recent job durations, used to estimate how long the queue takes to drain."""
+
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.durations = deque(maxlen=100)
+        self.completed = 0
+        self.rejected = 0
+
+    def observe(self, seconds: float):
+        self.durations.append(seconds)
+        self.completed += 1
+
+    def retry_after(self, backlog: int) -> int:
+        avg = sum(self.durations) / len(self.durations) if self.durations else 1.0
+        return max(1, min(MAX_RETRY_AFTER_SEC, math.ceil(avg * backlog / self.workers)))
+
+    def reject(self, backlog: int) -> Overloaded:
+        self.rejected += 1
+        return Overloaded(self.name, self.retry_after(backlog))
+
+    def snapshot(self, busy: int, waiting: int) -> dict:
+        avg = sum(self.durations) / len(self.durations) if self.durations else None
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "busy": busy,
+            "waiting": waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_ms": round(avg * 1000, 2) if avg is not None else None,
+        }
+
+
+# CPU POOL
+
+class BoundedExecutor:
+    """Thread pool that refuses work once ``workers + max_queue`` jobs are pending."""
+
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.stats = _Stats(name, workers, max_queue)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _job(self, fn: Callable, args: tuple):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.stats.observe(time.perf_counter() - start)
+
+    def _done(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn: Callable, *args):
+        with self._lock:
+            if self._pending >= self.stats.workers + self.stats.max_queue:
+                raise self.stats.reject(self._pending)
+            self._pending += 1
+        # released when the job finishes, even if the awaiting request was cancelled
+        future = self._pool.submit(self._job, fn, args)
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    def snapshot(self) -> dict:
+        pending = self._pending
+        busy = min(pending, self.stats.workers)
+        return self.stats.snapshot(busy, pending - busy)
+
+
+# I/O POOL
+
+class IOLimiter:
+    """
+    Runs blocking I/O in anyio worker threads under its own capacity limiter,
+    so it never competes with the default limiter used by sync endpoints.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int):
+        self.stats = _Stats(name, concurrency, max_queue)
+        self._limiter: Optional[anyio.CapacityLimiter] = None
+        # counted here rather than from limiter statistics: a burst of tasks
+        # all pass the check before any of them registers as a waiter
+        self._pending = 0
+
+    def limiter(self) -> anyio.CapacityLimiter:
+        # created on first use, inside the running event loop
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.stats.workers)
+        return self._limiter
+
+    async def run(self, fn: Callable, *args, admitted: bool = False):
+        """``admitted``: follow-up work of a request that already got in; never shed."""
+        if not admitted and self._pending >= self.stats.workers + self.stats.max_queue:
+            raise self.stats.reject(self._pending)
+        self._pending += 1
+        start = time.perf_counter()
+        try:
+            return await anyio.to_thread.run_sync(fn, *args, limiter=self.limiter())
+        finally:
+            self._pending -= 1
+            self.stats.observe(time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        busy = min(self._pending, self.stats.workers)
+        return self.stats.snapshot(busy, self._pending - busy)
+
+
+cpu = BoundedExecutor("scoring", SCORING_WORKERS, SCORING_QUEUE)
+io = IOLimiter("predict-io", IO_CONCURRENCY, IO_QUEUE)
+
+
+def _reset_after_fork():
+    # pool threads and the event-loop-bound limiter do not survive fork
+    global cpu, io
+    cpu = BoundedExecutor("scoring", SCORING_WORKERS, SCORING_QUEUE)
+    io = IOLimiter("predict-io", IO_CONCURRENCY, IO_QUEUE)
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def snapshot() -> dict:
+    return {"cpu": cpu.snapshot(), "io": io.snapshot()}
@@ -0,0 +1,152 @@
+"""
+Multi-worker launcher that shares read-only state between workers.
+
+``uvicorn api:app --workers N`` imports the app separately in every worker,
+so each one unpickles its own model and builds its own terrain index, and
+each keeps private response caches and login sessions. This launcher loads
+the model, terrain, feature tables and district index once in a parent
+process, freezes them out of the garbage collector and forks the workers,
+which then share those pages copy-on-write. Mutable state (upstream
+response cache, sessions, rate-limit buckets) goes to a SQLite file on
+tmpfs that every worker opens.
+
+    python serve.py --workers 4 --port 8000
+
+Send SIGUSR1 to the parent to print per-worker RSS/PSS; SIGTERM or SIGINT
+stops all workers.
+"""
+
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+
+import shared_store
+
+
+def _memory(pid: int) -> dict:
+    """RSS and PSS (shared pages divided among sharers) in MB, from /proc."""
+    out = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    out[key.lower() + "_mb"] = round(int(rest.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return out
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, args):
+    import uvicorn
+    import api
+
+    # workers share the parent's command line; a broad `pkill -USR1` must not kill them
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+    api.warm_up_model(api.model_resource.get())
+
+    config = uvicorn.Config(api.app, log_level=args.log_level, timeout_keep_alive=args.keep_alive)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(sock, args)
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--log-level", default="warning")
+    parser.add_argument("--keep-alive", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    # must be set before api (and through it resilience/auth) is imported
+    os.environ.setdefault("SHARED_STATE_PATH", shared_store.DEFAULT_PATH)
+    os.environ.setdefault("SESSION_STORE", "database")
+    os.environ["FLOOD_PREFORK"] = "1"
+    shared_store.SHARED_STATE_PATH = os.environ["SHARED_STATE_PATH"]
+
+    import api
+    import startup
+
+    # Large read-only state, loaded once. The database is opened per worker:
+    # SQLite connections must not cross a fork.
+    startup.load_all(names=["model", "terrain", "feature_store", "risk_levels", "geo_index"])
+    gc.collect()
+    gc.freeze()     # keep the collector from writing to (and un-sharing) these pages
+    print(f"[SERVE] parent ready in {time.time() - startup._PROCESS_START:.1f}s, "
+          f"{_memory(os.getpid()).get('rss_mb', '?')} MB; forking {args.workers} workers")
+
+    sock = _bind(args.host, args.port)
+    workers = {_spawn(sock, args): i for i in range(args.workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report(signum, frame):
+        total = {"rss_mb": 0.0, "pss_mb": 0.0}
+        for pid in [os.getpid(), *workers]:
+            mem = _memory(pid)
+            for k in total:
+                total[k] += mem.get(k, 0.0)
+            print(f"[SERVE] pid {pid}: {mem}")
+        print(f"[SERVE] total: rss {total['rss_mb']:.1f} MB, pss {total['pss_mb']:.1f} MB")
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, report)
+
+    # Supervise: restart workers that die unexpectedly
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = workers.pop(pid, None)
+        if slot is None or stopping:
+            continue
+        print(f"[SERVE] worker {pid} exited with status {status}; restarting")
+        time.sleep(1)
+        workers[_spawn(sock, args)] = slot
+
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+from typing import Any, Callable, Optional, Tuple
+
+# Default location: tmpfs when available so the "shared store" is RAM-backed
+_DEFAULT_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+DEFAULT_PATH = os.path.join(_DEFAULT_DIR, "flood_shared_state.db")
+
+# Set by serve.py for multi-worker deployments; unset means per-process state
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH")
+
+
+class SharedKV:
+    """
+    Small key -> (bytes, stored_at) store in a local SQLite file.
+
+    Every worker process on the host opens the same file, so caches written
+    by one worker are hits for all of them. One connection per thread; WAL
+    mode lets readers proceed while another worker writes.
+    """
+
+    def __init__(self, path: str, table: str = "kv"):
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value BLOB, stored_at REAL NOT NULL, expires_at REAL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_expiry ON {table}(expires_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # connections must not cross a fork: reopen when the pid changes
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL;")
+            conn.execute("PRAGMA synchronous = OFF;")    # cache data: losing it on power cut is fine
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        row = self._conn().execute(
+            f"SELECT value, stored_at, expires_at FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[2] is not None and row[2] < time.time():
+            return None
+        return row[0], row[1]
+
+    def stored_at(self, key: str) -> Optional[float]:
+        row = self._conn().execute(f"SELECT stored_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, stored_at: Optional[float] = None, ttl: Optional[float] = None):
+        now = time.time()
+        self._conn().execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at, expires_at) VALUES (?, ?, ?, ?)",
+            (key, value, stored_at if stored_at is not None else now, now + ttl if ttl else None),
+        )
+
+    def update(self, key: str, fn: Callable[[Optional[bytes]], Tuple[bytes, Any]], ttl: Optional[float] = None) -> Any:
+        """
+        Atomic read-modify-write across workers: ``fn(current value or None)``
+        returns ``(new value, result)``; the value is stored and ``result``
+        returned, all inside one write transaction.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            current = row[0] if row is not None and (row[1] is None or row[1] >= now) else None
+            value, result = fn(current)
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now + ttl if ttl else None),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def delete(self, key: str):
+        self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def purge_expired(self) -> int:
+        cur = self._conn().execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),))
+        return cur.rowcount
+
+    def clear(self):
+        self._conn().execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        return self._conn().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+def enabled() -> bool:
+    return bool(SHARED_STATE_PATH)
@@ -0,0 +1,174 @@
+"""
+What-if scoring: district forecasts under rainfall scenarios, in one batch.
+
+A scenario perturbs the forecast rainfall of the next ``days`` days, either
+by a ``multiplier`` (1.5 = +50%) or with absolute daily totals
+(``rain_mm``); the peak 3-hour intensity is scaled along with the daily
+total. Everything downstream follows ``predict_flood``'s forecast loop:
+each day's 30-day sums include the (perturbed) days before it.
+
+The rolling sums are never built per scenario. Every window in the horizon
+(at most ``MAX_HORIZON`` days, shorter than a week) starts inside the
+observed history, so
+
+    current_30d[s, d, f] = last (30 - f) history days of d + perturbed rain of days < f
+    previous_30d[d, f]   = history only, the same for every scenario
+
+and all (scenario, district, day) rows are generated by broadcasting and
+scored with one ``predict_proba`` call. The result is an (S, D) matrix of
+each district's peak calibrated risk over the horizon, with its level and
+the day it peaks.
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+import features
+
+# CONFIGURATION
+
+MAX_HORIZON = 5                                                     # OpenWeather's 5-day forecast
+MAX_ROWS = int(os.getenv("SIMULATION_MAX_ROWS", "2000000"))         # feature rows per call (~136 MB)
+POINTS_PER_DAY = 8                                                  # 3-hour forecast steps
+
+
+@dataclass
+class Scenario:
+    name: str = ""
+    multiplier: Optional[float] = None          # scales forecast rainfall for ``days`` days
+    rain_mm: Optional[Sequence[float]] = None   # or absolute daily totals, one per day
+    days: int = 3
+
+    def __post_init__(self):
+        if (self.multiplier is None) == (self.rain_mm is None):
+            raise ValueError("a scenario needs exactly one of multiplier or rain_mm")
+        if self.rain_mm is not None:
+            self.days = len(self.rain_mm)
+        if not 1 <= self.days <= MAX_HORIZON:
+            raise ValueError(f"scenario days must be between 1 and {MAX_HORIZON}")
+        if self.multiplier is not None and self.multiplier < 0 or any(r < 0 for r in self.rain_mm or ()):
+            raise ValueError("rainfall cannot be negative")
+        if not self.name:
+            self.name = f"x{self.multiplier:g}/{self.days}d" if self.rain_mm is None else \
+                "mm " + ",".join(f"{r:g}" for r in self.rain_mm)
+
+    def describe(self) -> dict:
+        out = {"name": self.name, "days": self.days}
+        if self.rain_mm is None:
+            out["multiplier"] = self.multiplier
+        else:
+            out["rain_mm"] = list(self.rain_mm)
+        return out
+
+
+def grid(multipliers: Sequence[float], days: int = 3) -> List[Scenario]:
+    return [Scenario(multiplier=m, days=days) for m in multipliers]
+
+
+@dataclass
+class Inputs:
+    """Per-district base arrays for a horizon of ``h`` days."""
+    static: np.ndarray          # (D, 8) terrain rows
+    tail30: np.ndarray          # (D, h) sum of the last 30 - f history days
+    prev30: np.ndarray          # (D, h) previous_30d for forecast day f
+    rain: np.ndarray            # (D, h) forecast daily rain
+    rain_max: np.ndarray        # (D, h) forecast peak 3-hour rain
+    wind: np.ndarray            # (D, h)
+    dates: List[str] = field(default_factory=list)
+
+
+def prepare(static: np.ndarray, histories: Sequence[Sequence[float]], forecasts: Sequence[List[dict]],
+            horizon: int) -> Inputs:
+    """Base arrays from each district's 60-day history and daily forecast rows."""
+    d = len(histories)
+    length = max((len(h) for h in histories), default=0)
+    # zero padding in front changes no window sum
+    hist = np.zeros((d, length))
+    for i, h in enumerate(histories):
+        if len(h):
+            hist[i, length - len(h):] = h
+    csum = np.concatenate([np.zeros((d, 1)), np.cumsum(hist, axis=1)], axis=1)
+
+    def window(start, stop):
+        # sum of hist[:, start:stop] with Python's clipping of negative starts
+        start, stop = np.clip(length + start, 0, length), np.clip(length + stop, 0, length)
+        return csum[:, stop] - csum[:, start]
+
+    f = np.arange(horizon)
+    tail30 = np.stack([window(-(30 - k), 0) for k in f], axis=1)
+    prev30 = np.stack([window(k - 60, k - 30) for k in f], axis=1)
+
+    rain = np.zeros((d, horizon))
+    rain_max = np.zeros((d, horizon))
+    wind = np.zeros((d, horizon))
+    for i, rows in enumerate(forecasts):
+        for k, day in enumerate(rows[:horizon]):
+            rain[i, k], rain_max[i, k], wind[i, k] = day["rain"], day["rain_max"], day["wind"]
+
+    dates = [day["date"] for day in forecasts[0][:horizon]] if forecasts else []
+    return Inputs(np.asarray(static, dtype=np.float32), tail30, prev30, rain, rain_max, wind, dates)
+
+
+def perturb(inputs: Inputs, scenarios: Sequence[Scenario]):
+    """(S, D, h) daily rain and peak 3-hour rain under every scenario."""
+    h = inputs.rain.shape[1]
+    factor = np.ones((len(scenarios), h))
+    absolute = np.full((len(scenarios), h), np.nan)
+    for s, sc in enumerate(scenarios):
+        if sc.rain_mm is None:
+            factor[s, :sc.days] = sc.multiplier
+        else:
+            absolute[s, :sc.days] = sc.rain_mm
+
+    # absolute totals keep the day's intensity profile (uniform when it was dry)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        peak_share = np.where(inputs.rain > 0, inputs.rain_max / inputs.rain, 1.0 / POINTS_PER_DAY)
+
+    fixed = ~np.isnan(absolute)[:, None, :]
+    rain = np.where(fixed, absolute[:, None, :], inputs.rain[None] * factor[:, None, :])
+    rain_max = np.where(fixed, absolute[:, None, :] * peak_share[None], inputs.rain_max[None] * factor[:, None, :])
+    return rain, rain_max
+
+
+def feature_rows(inputs: Inputs, rain: np.ndarray, rain_max: np.ndarray) -> np.ndarray:
+    """(S * D * h, 17) feature matrix, rows ordered scenario, district, day."""
+    s, d, h = rain.shape
+    before = np.concatenate([np.zeros((s, d, 1)), np.cumsum(rain, axis=2)[:, :, :-1]], axis=2)
+    current_30d = inputs.tail30[None] + before
+    previous_30d = np.broadcast_to(inputs.prev30[None], (s, d, h))
+    wind = np.broadcast_to(inputs.wind[None], (s, d, h))
+    terrain = np.broadcast_to(inputs.static[None, :, None, :], (s, d, h, inputs.static.shape[1]))
+    return features.feature_matrix(
+        terrain.reshape(-1, inputs.static.shape[1]),
+        rain.ravel(),
+        0.0,                    # rain_7d: not a model input
+        current_30d.ravel(),
+        previous_30d.ravel(),
+        (rain_max / 3).ravel(),
+        wind.ravel(),
+    )
+
+
+def run(model, classifier, inputs: Inputs, scenarios: Sequence[Scenario], regions=0) -> dict:
+    """
+    Score every scenario for every district. ``regions`` are threshold rows
+    (``RiskClassifier.region_rows``). Returns (S, D) arrays: peak calibrated
+    ``risk``, its ``level`` index and ``peak_day`` (0 = first forecast day).
+    """
+    d, h = inputs.rain.shape
+    if len(scenarios) * d * h > MAX_ROWS:
+        raise ValueError(f"{len(scenarios)} scenarios x {d} districts x {h} days exceeds {MAX_ROWS} rows")
+
+    rain, rain_max = perturb(inputs, scenarios)
+    X = feature_rows(inputs, rain, rain_max)
+    probs = model.predict_proba(X)[:, 1].reshape(len(scenarios), d, h)
+
+    calibrated = classifier.calibrate(probs)
+    peak_day = calibrated.argmax(axis=2)
+    risk = np.take_along_axis(calibrated, peak_day[:, :, None], axis=2)[:, :, 0]
+    rows = np.broadcast_to(np.asarray(regions), (d,))
+    level = classifier.levels(risk, np.broadcast_to(rows[None], risk.shape))
+    return {"risk": risk, "level": level, "peak_day": peak_day}
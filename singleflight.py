@@ -0,0 +1,94 @@
+"""
+Single-flight request coalescing.
+
+When many clients ask for the same prediction at once, only the first one
+computes it; the others await the same in-flight task. The result is then
+reused for a short freshness window, so upstream fetches, the
+``risk_markers`` write and any FCM alert happen once per computation rather
+than once per caller.
+"""
+
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+# CONFIGURATION
+
+PREDICT_FRESH_SEC = float(os.getenv("PREDICT_FRESH_SEC", "60"))
+MAX_RESULTS = int(os.getenv("PREDICT_FRESH_ENTRIES", "4096"))
+
+
+class SingleFlight:
+    """
+    ``await run(key, fn)`` returns ``fn()``'s result, sharing one computation
+    between concurrent callers with the same key and reusing it for
+    ``fresh_for`` seconds afterwards. Failures are shared with the callers
+    that were waiting but never cached.
+
+    Results are shared objects: callers must copy before modifying them.
+    """
+
+    def __init__(self, name: str, fresh_for: float = PREDICT_FRESH_SEC, max_entries: int = MAX_RESULTS):
+        self.name = name
+        self.fresh_for = fresh_for
+        self.max_entries = max_entries
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._results: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.computations = 0
+        self.coalesced = 0
+        self.fresh_hits = 0
+
+    def _fresh(self, key: Hashable):
+        item = self._results.get(key)
+        if item is None:
+            return None
+        if time.monotonic() - item[1] > self.fresh_for:
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return item
+
+    async def _compute(self, key: Hashable, fn: Callable[[], Awaitable[Any]]):
+        try:
+            result = await fn()
+            self._results[key] = (result, time.monotonic())
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]):
+        item = self._fresh(key)
+        if item is not None:
+            self.fresh_hits += 1
+            return item[0]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(key, fn))
+            # retrieve the exception even if every caller went away
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+            self.computations += 1
+        else:
+            self.coalesced += 1
+
+        # a caller disconnecting must not cancel the computation others wait on
+        return await asyncio.shield(task)
+
+    def clear(self):
+        self._results.clear()
+
+    def snapshot(self) -> dict:
+        return {
+            "fresh_for_s": self.fresh_for,
+            "inflight": len(self._inflight),
+            "cached": len(self._results),
+            "computations": self.computations,
+            "coalesced": self.coalesced,
+            "fresh_hits": self.fresh_hits,
+        }
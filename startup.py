@@ -0,0 +1,182 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+# How long a request waits for a resource that is still loading before
+# giving up with 503 (the client is told to retry).
+READY_WAIT_SEC = float(os.getenv("READY_WAIT", "30"))
+
+_PROCESS_START = time.time()
+
+_timings: Dict[str, float] = {}
+_timings_lock = threading.Lock()
+
+
+class NotReady(Exception):
+    """A resource is still loading (or failed to load); surfaced to clients as 503."""
+
+    def __init__(self, name: str, detail: str = "still loading"):
+        super().__init__(f"{name} {detail}")
+        self.name = name
+
+
+# ---------------------------------------------------------------------------
+# TIMINGS
+# ---------------------------------------------------------------------------
+
+def record(name: str, seconds: float):
+    with _timings_lock:
+        _timings[name] = round(seconds, 4)
+
+
+@contextmanager
+def phase(name: str):
+    """Time a block (an import, a load step) and report it on /readyz."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def timings() -> Dict[str, float]:
+    with _timings_lock:
+        return dict(_timings)
+
+
+# ---------------------------------------------------------------------------
+# RESOURCES WITH READINESS GATES
+# ---------------------------------------------------------------------------
+
+class Resource:
+    """
+    A value loaded once, either in the background at startup or on first use.
+
+    ``get()`` blocks until the value is ready, loading it in the calling
+    thread if nobody has started yet, and raises ``NotReady`` if loading
+    takes longer than ``READY_WAIT_SEC`` or failed.
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self.loader = loader
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.value: Any = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def _claim(self) -> bool:
+        with self._lock:
+            if self.state != "pending":
+                return False
+            self.state = "loading"
+            return True
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            self.value = self.loader()
+            self.state = "ready"
+        except Exception as e:
+            self.error = str(e)
+            self.state = "failed"
+            print(f"[STARTUP] {self.name} failed to load: {e}")
+        finally:
+            record(f"load {self.name}", time.perf_counter() - start)
+            self._ready.set()
+
+    def start(self, executor: ThreadPoolExecutor):
+        if self._claim():
+            executor.submit(self._load)
+
+    def get(self, timeout: float = READY_WAIT_SEC) -> Any:
+        if self.state == "ready":
+            return self.value
+        if self._claim():
+            self._load()
+        elif not self._ready.wait(timeout):
+            raise NotReady(self.name)
+        if self.state != "ready":
+            raise NotReady(self.name, f"failed to load: {self.error}")
+        return self.value
+
+    def set(self, value: Any):
+        """Install a value directly (tests, benchmarks, pre-fork parents)."""
+        self.value = value
+        self.state = "ready"
+        self._ready.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+
+class LazyProxy:
+    """Attribute access is forwarded to the resource's value, waiting for it if needed."""
+
+    def __init__(self, resource: Resource):
+        object.__setattr__(self, "_resource", resource)
+
+    def __getattr__(self, name):
+        return getattr(self._resource.get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._resource.get(), name, value)
+
+    def __repr__(self):
+        return f"<LazyProxy {self._resource.name} ({self._resource.state})>"
+
+
+_resources: Dict[str, Resource] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def resource(name: str, loader: Callable[[], Any]) -> Resource:
+    res = _resources[name] = Resource(name, loader)
+    return res
+
+
+def _reset_after_fork():
+    # the parent's loader threads do not exist in a forked child
+    global _executor
+    _executor = None
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _loader_pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(1, len(_resources)), thread_name_prefix="startup")
+    return _executor
+
+
+def start_background_loading():
+    """Kick off every registered resource in parallel; returns immediately."""
+    for res in _resources.values():
+        res.start(_loader_pool())
+
+
+def load_all(names=None, timeout: float = READY_WAIT_SEC):
+    """Load the named resources (default: all) in parallel and block until they are ready."""
+    selected = [r for n, r in _resources.items() if names is None or n in names]
+    for res in selected:
+        res.start(_loader_pool())
+    for res in selected:
+        res.get(timeout)
+
+
+def readiness() -> dict:
+    return {
+        "ready": all(r.ready for r in _resources.values()),
+        "uptime_s": round(time.time() - _PROCESS_START, 3),
+        "resources": {
+            name: {"state": r.state, **({"error": r.error} if r.error else {})}
+            for name, r in _resources.items()
+        },
+        "timings_s": timings(),
+    }
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+import forecast_pipeline as fp
+
+STEP = 3 * 3600
+START = 1_700_000_000 - 1_700_000_000 % STEP
+
+
+def _points(first: int, n: int, seed: int = 0) -> fp.ForecastPoints:
+    rng = np.random.default_rng(seed)
+    dt = START + STEP * np.arange(first, first + n, dtype=np.int64)
+    values = rng.uniform(0, 10, size=(n, 4))
+    values[rng.random(n) < 0.4, fp.RAIN] = 0.0
+    return fp.ForecastPoints(dt, values)
+
+
+def _window(base: fp.ForecastPoints, first: int, n: int) -> fp.ForecastPoints:
+    return fp.ForecastPoints(base.dt[first:first + n].copy(), base.values[first:first + n].copy())
+
+
+def _assert_same(frame: fp.DailyFrame, points: fp.ForecastPoints):
+    expected = fp.aggregate(points)
+    np.testing.assert_array_equal(frame.day, expected.day)
+    np.testing.assert_array_equal(frame.count, expected.count)
+    np.testing.assert_allclose(frame.sums, expected.sums)
+    np.testing.assert_allclose(frame.rain_max, expected.rain_max)
+
+
+@pytest.mark.parametrize("old_window, new_window", [
+    ((0, 40), (0, 40)),     # unchanged
+    ((0, 30), (0, 40)),     # grows
+    ((0, 40), (3, 40)),     # shifts by one refresh
+    ((0, 40), (9, 40)),     # shifts past a day boundary
+    ((0, 40), (0, 33)),     # shrinks at the end
+    ((0, 40), (0, 26)),     # shrinks mid-day
+    ((0, 40), (5, 20)),     # shifts and shrinks
+    ((0, 40), (7, 50)),     # shifts and grows
+])
+def test_update_matches_full_aggregate(old_window, new_window):
+    base = _points(0, 60)
+    old_points = _window(base, *old_window)
+    new_points = _window(base, *new_window)
+
+    pipe = fp.ForecastPipeline()
+    state = fp._TileState(None, old_points, fp.aggregate(old_points))
+    _assert_same(pipe._update(state, new_points), new_points)
+
+
+def test_update_regroups_changed_values():
+    base = _points(0, 40)
+    changed = _window(base, 4, 36)
+    changed.values[20:, fp.RAIN] += 1.0
+
+    pipe = fp.ForecastPipeline()
+    state = fp._TileState(None, base, fp.aggregate(base))
+    _assert_same(pipe._update(state, changed), changed)
+    assert pipe.incremental == 1
+
+
+def test_random_refreshes_match_aggregate():
+    rng = np.random.default_rng(7)
+    base = _points(0, 200, seed=1)
+    pipe = fp.ForecastPipeline()
+    first, n = 0, 40
+    points = _window(base, first, n)
+    state = fp._TileState(None, points, fp.aggregate(points))
+    for _ in range(300):
+        first = min(first + int(rng.integers(0, 4)), 150)
+        n = int(rng.integers(1, 45))
+        points = _window(base, first, n)
+        frame = pipe._update(state, points)
+        _assert_same(frame, points)
+        state = fp._TileState(None, points, frame)
+
+
+def test_aggregate_many_matches_aggregate():
+    batches = [_points(0, 40, seed=1), _points(5, 17, seed=2), _points(0, 0), _points(30, 8, seed=3)]
+    for frame, points in zip(fp.aggregate_many(batches), batches):
+        _assert_same(frame, points)
@@ -0,0 +1,81 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import risk_levels
+
+
+@pytest.fixture(scope="module")
+def api():
+    import api
+    api.feature_store_resource.get()
+    api.model_resource.get()
+    return api
+
+
+def test_single_and_batch_lookups_agree(api):
+    index = api.geo_resource.get()
+    store = api.feature_store_resource.get()
+    rng = np.random.default_rng(0)
+    points = np.column_stack([rng.uniform(6, 36, 300), rng.uniform(68, 98, 300)])
+    points = np.vstack([points, store.coords[:50], [[0.0, 0.0]]])
+
+    batch = index.resolve_many(points)
+    assert batch == [index.resolve(lat, lon) for lat, lon in points]
+    assert batch[-1] is None                            # beyond GEO_MAX_CENTROID_KM
+    assert batch[300:350] == list(store.names[:50])     # a centroid resolves to its own district
+
+
+def test_point_prediction_uses_the_district_thresholds(api, monkeypatch):
+    state, district = api.feature_store_resource.get().names[0]
+    lat, lon = api.feature_store_resource.get().coords[0]
+    weather = {"wind": {"speed": 2.0}, "rain": {"1h": 0.5}}
+    rainfall_inputs = (5.0, 20.0, 80.0, 60.0)
+
+    # the district always flags High, the default never does
+    classifier = risk_levels.RiskClassifier(thresholds=(1.0, 1.0), regions={f"{state}/{district}": [0.0, 0.0]})
+    monkeypatch.setattr(api, "classifier", classifier)
+
+    assert api._score_point(lat, lon, (state, district), weather, rainfall_inputs)[1] == "High"
+    assert api._score_point(lat, lon, None, weather, rainfall_inputs)[1] == "Low"
+
+
+@pytest.fixture
+def point_inputs(api, monkeypatch):
+    weather = {"main": {"temp": 30.0, "humidity": 80}}
+    monkeypatch.setattr(api, "_fetch_point_inputs", lambda lat, lon: (("Assam", "Dhubri"), weather, None))
+    monkeypatch.setattr(api, "_score_point", lambda *args: (0.42, "Low", 80.0, 2.0))
+
+
+def test_point_prediction_survives_a_failed_district_prediction(api, monkeypatch, point_inputs):
+    async def unavailable(state, district):
+        raise api.HTTPException(status_code=503, detail="forecast provider down")
+
+    monkeypatch.setattr(api, "_district_snapshot", unavailable)
+    out = asyncio.run(api._compute_point(26.0, 90.0))
+    assert out["risk_score"] == 0.42 and out["risk_level"] == "Low"
+    assert out["district"] == {"state": "Assam", "district": "Dhubri"}
+
+
+def test_point_prediction_reports_district_staleness(api, monkeypatch, point_inputs):
+    snapshot = api.PredictionSnapshot(
+        {"current_prediction": {"risk_level": "High", "score": 0.9}, "stale": True}, None, []
+    )
+
+    async def cached(state, district):
+        return snapshot
+
+    monkeypatch.setattr(api, "_district_snapshot", cached)
+    out = asyncio.run(api._compute_point(26.0, 90.0))
+    assert out["district"] == {"state": "Assam", "district": "Dhubri", "risk_level": "High", "score": 0.9}
+    assert out["stale"] is True
+
+
+def test_point_prediction_propagates_unexpected_errors(api, monkeypatch, point_inputs):
+    async def broken(state, district):
+        raise ZeroDivisionError
+
+    monkeypatch.setattr(api, "_district_snapshot", broken)
+    with pytest.raises(ZeroDivisionError):
+        asyncio.run(api._compute_point(26.0, 90.0))
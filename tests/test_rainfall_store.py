@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import rainfall
+from rainfall_store import RainfallStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    st = RainfallStore.create(str(tmp_path / "rain"), "2024-01-01", "2024-04-30", bbox=(20, 80, 21, 81), res=0.5)
+    days = np.arange(st.ndays)
+    for lat, lon, scale in ((20.0, 80.0, 1.0), (20.5, 80.5, 2.0)):
+        st.write_points(days, np.full(st.ndays, lat), np.full(st.ndays, lon), scale * (days % 7))
+    st.flush()
+    return st
+
+
+def test_window_pads_days_before_the_store(store):
+    i, j, _ = store.cell([20.0, 20.5], [80.0, 80.5])
+    w = store.window(i, j, 9, 15)
+    assert w.shape == (2, 15)
+    assert np.isnan(w[:, :5]).all()
+    np.testing.assert_array_equal(w[0, 5:], np.arange(10) % 7)
+    np.testing.assert_array_equal(w[1, 5:], 2 * (np.arange(10) % 7))
+
+
+@pytest.mark.parametrize("end", ["2024-05-01", "2024-06-30", "2023-12-31"])
+def test_dates_outside_the_store_raise_key_error(store, end):
+    provider = rainfall.LocalStoreProvider(store)
+    with pytest.raises(KeyError):
+        store.series(20.0, 80.0, end)
+    with pytest.raises(KeyError):
+        provider.aggregates(20.0, 80.0, end)
+    with pytest.raises(KeyError):
+        provider.aggregates_batch([20.0, 20.5], [80.0, 80.5], end)
+
+
+def test_batch_matches_scalar_aggregates(store):
+    provider = rainfall.LocalStoreProvider(store)
+    lats, lons = [20.0, 20.5, 20.0], [80.0, 80.5, 80.0]
+    for end in ("2024-02-10", "2024-03-15", store.end):
+        batch = provider.aggregates_batch(lats, lons, end)
+        for k, (lat, lon) in enumerate(zip(lats, lons)):
+            scalar = provider.aggregates(lat, lon, end)
+            np.testing.assert_allclose([b[k] for b in batch], scalar[:4])
+
+
+class _Fallback(rainfall.RainfallProvider):
+    def __init__(self):
+        self.calls = []
+
+    def aggregates(self, lat, lon, end=None):
+        self.calls.append((lat, lon, end))
+        return (-1.0, -1.0, -1.0, -1.0, [])
+
+
+def test_latest_means_today_not_the_end_of_the_store(store):
+    fallback = _Fallback()
+    assert not store.contains(20.0, 80.0)
+    assert rainfall.LocalStoreProvider(store, fallback).aggregates(20.0, 80.0)[0] == -1.0
+    assert fallback.calls == [(20.0, 80.0, None)]
+    with pytest.raises(KeyError):
+        rainfall.LocalStoreProvider(store).aggregates(20.0, 80.0)
+    with pytest.raises(KeyError):
+        rainfall.LocalStoreProvider(store).aggregates_batch([20.0], [80.0])
+
+
+def test_store_reaching_today_serves_latest(tmp_path):
+    today = datetime.utcnow().date()
+    st = RainfallStore.create(str(tmp_path / "now"), today - timedelta(days=89), today,
+                              bbox=(20, 80, 21, 81), res=0.5)
+    st.write_points(np.arange(st.ndays), np.full(st.ndays, 20.0), np.full(st.ndays, 80.0), np.ones(st.ndays))
+    provider = rainfall.LocalStoreProvider(st, _Fallback())
+    assert provider.aggregates(20.0, 80.0)[:4] == (1.0, 7.0, 30.0, 30.0)
+    np.testing.assert_array_equal([b[0] for b in provider.aggregates_batch([20.0], [80.0])], [1.0, 7.0, 30.0, 30.0])
+
+
+def test_cells_without_enough_data_are_not_covered(store):
+    fallback = _Fallback()
+    provider = rainfall.LocalStoreProvider(store, fallback)
+    assert provider.aggregates(20.5, 80.0, store.end)[0] == -1.0          # never ingested
+    assert provider.aggregates(20.0, 80.0, "2024-01-20")[0] == -1.0       # 20 days of history
+    assert provider.aggregates(20.0, 80.0, "2024-01-30")[0] != -1.0       # 30 days
+    assert len(fallback.calls) == 2
+    with pytest.raises(KeyError):
+        provider.aggregates_batch([20.0, 20.5], [80.0, 80.0], store.end)
+
+
+def test_batch_aggregates_follow_the_live_rules():
+    rng = np.random.default_rng(0)
+    windows = rng.gamma(0.5, 10, size=(400, rainfall.HISTORY_DAYS))
+    windows[rng.random(windows.shape) < 0.05] = np.nan
+    windows[rng.random(windows.shape) < 0.02] = -1.0
+    windows[:50, :30] = np.nan          # early days of a store
+    windows[50:60] = np.nan
+    windows[60:70, :55] = np.nan
+    batch = rainfall.rainfall_aggregates_batch(windows)
+    for k, w in enumerate(windows):
+        np.testing.assert_allclose([b[k] for b in batch], rainfall.rainfall_aggregates(w.tolist())[:4])
+
+
+def test_backtest_chunk_matches_live_aggregates(store):
+    import backtest
+    import risk_levels
+
+    lats, lons = np.array([20.0, 20.5]), np.array([80.0, 80.5])
+    rows, cols, _ = store.cell(lats, lons)
+    # gaps: write_points skips non-finite values, so set them in the grid directly
+    store.data[40:46, rows[0], cols[0]] = np.nan
+    store.data[70, rows[1], cols[1]] = -1.0
+    store.data[95:100, rows[1], cols[1]] = np.nan
+    store.flush()
+    backtest._init_worker(backtest.MODEL_PATH, store.path, np.zeros((2, 8)), rows, cols, 1,
+                          risk_levels.RiskClassifier(), np.zeros(2, dtype=np.int64))
+
+    last = store.ndays - 1
+    windows = backtest._worker["store"].window(rows, cols, last, rainfall.HISTORY_DAYS + 40)
+    assert np.isnan(windows[0]).sum() == 6
+    assert np.isnan(windows[1]).sum() == 5 and (windows[1] < 0).sum() == 1
+
+    out = backtest.score_chunk(0, last)
+    provider = rainfall.LocalStoreProvider(store, min_days=0)
+    for day, district, *got in zip(out["day"], out["district"], out["rain_24h"], out["rain_7d"],
+                                   out["current_30d"], out["previous_30d"]):
+        end = store.start + timedelta(days=int(day))
+        expected = provider.aggregates(lats[district], lons[district], end)[:4]
+        np.testing.assert_allclose(got, expected, rtol=1e-5)
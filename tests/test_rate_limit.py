@@ -0,0 +1,122 @@
+import anyio
+import pytest
+
+import rate_limit
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _scope(headers=(), client=("10.0.0.9", 5000), method="POST", path="/predict/x/y", query=b""):
+    return {
+        "type": "http", "method": method, "path": path, "query_string": query, "client": client,
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+    }
+
+
+# BUCKETS
+
+def test_take_spends_and_refills():
+    assert rate_limit._take(10, 0, 0, 4, burst=10, rate=1) == (True, 6, 0.0)
+    allowed, tokens, wait = rate_limit._take(2, 0, 0, 5, burst=10, rate=0.5)
+    assert not allowed and tokens == 2 and wait == pytest.approx(6.0)
+    # refill is capped at the burst, and a cost above the burst is payable by a full bucket
+    assert rate_limit._take(0, 0, 1000, 50, burst=10, rate=1) == (True, 0, 0.0)
+
+
+def test_memory_buckets_limit_and_refill(clock):
+    buckets = rate_limit.MemoryBuckets(burst=3, per_minute=60)
+    assert [buckets.take("a", 1)[0] for _ in range(4)] == [True, True, True, False]
+    assert buckets.take("b", 1)[0]
+    allowed, _, wait = buckets.take("a", 1)
+    assert not allowed and wait == pytest.approx(1.0)
+    clock[0] += 1
+    assert buckets.take("a", 1)[0]
+
+
+def test_memory_buckets_expire_idle_and_overflow(clock):
+    buckets = rate_limit.MemoryBuckets(burst=3, per_minute=60, max_keys=2)
+    buckets.take("a", 1)
+    buckets.take("b", 1)
+    buckets.take("c", 1)        # over max_keys: the least recently used bucket goes
+    assert len(buckets) == 2 and "a" not in buckets._buckets
+
+    clock[0] += buckets.refill_sec
+    buckets.take("d", 1)        # b and c are full again, so they expire
+    assert list(buckets._buckets) == ["d"]
+
+
+def test_shared_buckets_hold_across_instances(tmp_path):
+    path = str(tmp_path / "state.db")
+    one = rate_limit.SharedBuckets(path, burst=2, per_minute=1)
+    two = rate_limit.SharedBuckets(path, burst=2, per_minute=1)
+    assert one.take("k", 1)[0] and two.take("k", 1)[0]
+    assert not one.take("k", 1)[0]
+
+
+def test_cost_of_longest_prefix():
+    assert rate_limit.cost_of("POST", "/predict/explain/x") == 10
+    assert rate_limit.cost_of("POST", "/predict/x/y") == 5
+    assert rate_limit.cost_of("GET", "/healthz") == 0
+    assert rate_limit.cost_of("GET", "/datasets") == rate_limit.DEFAULT_COST
+
+
+# IDENTITY
+
+def _identity(limiter, scope):
+    return anyio.run(limiter.identity, scope)
+
+
+@pytest.mark.parametrize("value, hops, expected", [
+    ("1.1.1.1", 1, "1.1.1.1"),
+    ("6.6.6.6, 1.1.1.1", 1, "1.1.1.1"),       # the left entry is client-supplied
+    ("6.6.6.6, 1.1.1.1, 172.16.0.2", 2, "1.1.1.1"),
+    ("1.1.1.1", 3, "1.1.1.1"),
+    (" , ", 1, None),
+])
+def test_forwarded_for_counts_trusted_hops_from_the_right(value, hops, expected):
+    assert rate_limit.forwarded_for(value, hops) == expected
+
+
+def test_identity_uses_forwarded_for_only_when_trusted():
+    scope = _scope([("X-Forwarded-For", "6.6.6.6, 1.1.1.1")])
+    trusted = rate_limit.RateLimiter(lambda t: None, rate_limit.MemoryBuckets(), trust_proxy=True, proxy_hops=1)
+    direct = rate_limit.RateLimiter(lambda t: None, rate_limit.MemoryBuckets(), trust_proxy=False)
+    assert _identity(trusted, scope) == "ip:1.1.1.1"
+    assert _identity(direct, scope) == "ip:10.0.0.9"
+
+
+def test_identity_prefers_valid_sessions():
+    limiter = rate_limit.RateLimiter({"good": 7}.get, rate_limit.MemoryBuckets())
+    assert _identity(limiter, _scope([("Authorization", "Bearer good")])) == "user:7"
+    assert _identity(limiter, _scope(query=b"a=1&token=good")) == "user:7"
+    assert _identity(limiter, _scope([("Authorization", "Bearer forged")])) == "ip:10.0.0.9"
+
+
+def test_identity_falls_back_to_ip_while_sessions_fail():
+    ready = [False]
+
+    def session_user(token):
+        if not ready[0]:
+            raise RuntimeError("database not ready")
+        return 7
+
+    limiter = rate_limit.RateLimiter(session_user, rate_limit.MemoryBuckets())
+    scope = _scope([("Authorization", "Bearer good")])
+    assert _identity(limiter, scope) == "ip:10.0.0.9"
+    ready[0] = True
+    assert _identity(limiter, scope) == "user:7"       # the failure was not cached
+
+
+def test_check_limits_and_reports_headers():
+    limiter = rate_limit.RateLimiter(lambda t: None, rate_limit.MemoryBuckets(burst=10, per_minute=60), enabled=True)
+    scope = _scope()
+    verdicts = [anyio.run(limiter.check, scope) for _ in range(3)]
+    assert [v[0] for v in verdicts] == [True, True, False]
+    assert dict(verdicts[1][2])[b"ratelimit-remaining"] == b"0"
+    assert anyio.run(limiter.check, _scope(method="GET", path="/healthz")) is None
+    assert limiter.snapshot()["limited"] == 1
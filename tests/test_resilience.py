@@ -0,0 +1,192 @@
+import time
+
+import pytest
+
+import resilience
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def host(monkeypatch):
+    """A fresh HostState for the test URL's host, with _call stubbed."""
+    monkeypatch.setattr(resilience, "_hosts", {})
+    calls = []
+
+    def call(url, params, timeout):
+        calls.append(params)
+        outcome = params.get("outcome", "ok")
+        if outcome != "ok":
+            raise RuntimeError(outcome)
+        return {"ok": True}
+
+    monkeypatch.setattr(resilience, "_call", call)
+    state = resilience.host_state("upstream.test")
+    state.breaker = resilience.CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    state.calls_seen = calls
+    return state
+
+
+URL = "https://upstream.test/data"
+
+
+# BREAKER STATE MACHINE
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = resilience.CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()        # resets the count
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.retry_after() == 31
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = resilience.CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 29
+    assert not breaker.allow()
+    clock[0] += 1
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()      # probe still in flight
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = resilience.CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    clock[0] += 30
+    assert breaker.allow()
+
+
+# GUARDED FETCH
+
+def test_fetch_opens_circuit_and_rejects_without_calling(clock, host):
+    for _ in range(2):
+        with pytest.raises(resilience.UpstreamUnavailable):
+            resilience._fetch(URL, {"outcome": "boom"})
+    assert host.breaker.state == "open"
+    with pytest.raises(resilience.CircuitOpen):
+        resilience._fetch(URL, {})
+    assert len(host.calls_seen) == 2
+    assert host.rejected == 1
+
+
+def test_full_bulkhead_does_not_consume_the_probe(clock, host, monkeypatch):
+    host.breaker.record_failure()
+    host.breaker.record_failure()
+    clock[0] += 30
+
+    monkeypatch.setattr(host, "bulkhead", resilience.threading.BoundedSemaphore(1))
+    host.bulkhead.acquire()
+    with pytest.raises(resilience.UpstreamUnavailable) as rejected:
+        resilience._fetch(URL, {})
+    assert not isinstance(rejected.value, resilience.CircuitOpen)
+    host.bulkhead.release()
+
+    # the probe is still available once there is room, and closes the circuit
+    assert resilience._fetch(URL, {}) == {"ok": True}
+    assert host.breaker.state == "closed"
+
+
+def test_open_circuit_releases_the_bulkhead(clock, host, monkeypatch):
+    monkeypatch.setattr(host, "bulkhead", resilience.threading.BoundedSemaphore(1))
+    host.breaker.record_failure()
+    host.breaker.record_failure()
+    for _ in range(3):
+        with pytest.raises(resilience.CircuitOpen):
+            resilience._fetch(URL, {})
+    assert host.bulkhead.acquire(blocking=False)
+
+
+# HEDGING
+
+class _Latency:
+    """Enough samples to hedge after ``delay`` seconds."""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def timeout(self):
+        return 2.0
+
+    def hedge_delay(self):
+        return self.delay
+
+    def record(self, seconds):
+        pass
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    """A fresh host whose first call takes ``slow`` seconds and later ones answer at once."""
+    monkeypatch.setattr(resilience, "_hosts", {})
+    monkeypatch.setattr(resilience, "HEDGING_ENABLED", True)
+    state = resilience.host_state("upstream.test")
+    state.latency = _Latency(0.02)
+    state.bulkhead = resilience.threading.BoundedSemaphore(2)
+    calls = []
+
+    def call(url, params, timeout):
+        calls.append(resilience.threading.current_thread().name)
+        if len(calls) == 1:
+            time.sleep(params.get("slow", 0.3))
+            return {"from": "primary"}
+        return {"from": "hedge"}
+
+    monkeypatch.setattr(resilience, "_call", call)
+    state.calls_seen = calls
+    return state
+
+
+def _free_slots(state):
+    free = 0
+    while state.bulkhead.acquire(blocking=False):
+        free += 1
+    for _ in range(free):
+        state.bulkhead.release()
+    return free
+
+
+def test_hedge_wins_and_the_loser_keeps_its_slot_until_done(hedging):
+    assert resilience._fetch(URL, {}) == {"from": "hedge"}
+    assert hedging.hedges == 1
+    assert _free_slots(hedging) == 1        # the slow primary is still in flight
+    time.sleep(0.4)
+    assert _free_slots(hedging) == 2
+
+
+def test_no_hedge_without_a_free_slot(hedging):
+    hedging.bulkhead.acquire()
+    assert resilience._fetch(URL, {"slow": 0.1}) == {"from": "primary"}
+    assert hedging.hedges == 0 and len(hedging.calls_seen) == 1
+    time.sleep(0.05)
+    assert _free_slots(hedging) == 1
+    hedging.bulkhead.release()
+
+
+def test_hedged_calls_do_not_wait_behind_background_refreshes(hedging, monkeypatch):
+    monkeypatch.setattr(resilience, "_executor", resilience.ThreadPoolExecutor(max_workers=1))
+    results = []
+    resilience.refresh_in_background("k", lambda: results.append(resilience._fetch(URL, {"slow": 0.1})))
+    resilience._executor.shutdown(wait=True)
+    assert results == [{"from": "hedge"}]
+    assert all(name.startswith("upstream-hedge") for name in hedging.calls_seen)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import risk_levels
+
+LOW, MODERATE, HIGH = range(3)
+
+
+@pytest.fixture
+def classifier():
+    return risk_levels.RiskClassifier(
+        thresholds=(0.7, 0.9),
+        regions={"Assam": [0.4, 0.6], "Kerala/Wayanad": [0.2, 0.95], "Kerala": [0.5, 0.5]},
+    )
+
+
+def test_region_prefers_district_then_state(classifier):
+    assert classifier.region("Assam", "Dhubri") == classifier.region("assam") > 0
+    assert classifier.region("Kerala", "Wayanad") != classifier.region("Kerala", "Idukki")
+    assert classifier.region("Bihar", "Patna") == 0
+    np.testing.assert_array_equal(
+        classifier.region_rows([("Bihar", "Patna"), ("ASSAM", "Dhubri"), ("kerala", "wayanad")]),
+        [0, classifier.region("Assam"), classifier.region("Kerala", "Wayanad")],
+    )
+
+
+@pytest.mark.parametrize("place, expected", [
+    (("Bihar", "Patna"), [LOW, LOW, MODERATE, MODERATE, HIGH, HIGH]),
+    (("Assam", "Dhubri"), [LOW, MODERATE, HIGH, HIGH, HIGH, HIGH]),
+    (("Kerala", "Wayanad"), [MODERATE, MODERATE, MODERATE, MODERATE, MODERATE, HIGH]),
+    (("Kerala", "Idukki"), [LOW, HIGH, HIGH, HIGH, HIGH, HIGH]),
+])
+def test_levels_per_region(classifier, place, expected):
+    p = np.array([0.3, 0.5, 0.7, 0.8, 0.9, 1.0])
+    row = classifier.region(*place)
+    np.testing.assert_array_equal(classifier.levels(p, row), expected)
+    # the per-element path agrees with the scalar-row path
+    np.testing.assert_array_equal(classifier.levels(p, np.full(len(p), row)), expected)
+
+
+def test_levels_mixed_rows_match_rowwise(classifier):
+    rng = np.random.default_rng(0)
+    p = np.concatenate([rng.random(500), [0.0, 1.0, -0.5, 1.5], classifier.table.ravel()])
+    rows = rng.integers(0, len(classifier.table), size=len(p))
+    expected = [classifier.levels(x, r) for x, r in zip(p, rows)]
+    np.testing.assert_array_equal(classifier.levels(p, rows), expected)
+    assert classifier.levels(p.reshape(-1, 2), rows.reshape(-1, 2)).shape == (len(p) // 2, 2)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"thresholds": (0.9, 0.7)},
+    {"thresholds": (0.5,)},
+    {"regions": {"Assam": [0.2, 1.2]}},
+    {"method": "magic"},
+])
+def test_invalid_tables_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        risk_levels.RiskClassifier(**kwargs)
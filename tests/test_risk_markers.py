@@ -0,0 +1,53 @@
+import types
+
+import pytest
+from starlette.requests import Request
+
+import database
+
+
+def _request(headers=()):
+    return Request({
+        "type": "http", "method": "GET", "path": "/risk-markers", "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+    })
+
+
+@pytest.fixture
+def db(tmp_path):
+    return database.Database(str(tmp_path / "app.db"), pool_size=2)
+
+
+def test_marker_version_changes_only_with_the_marker_set(db):
+    v0 = db.risk_markers_version()
+    assert not db.set_risk_marker("Assam", "Dhubri", None, 26.0, 90.0)
+    assert db.risk_markers_version() == v0
+    assert db.set_risk_marker("Assam", "Dhubri", "High", 26.0, 90.0)
+    v1, markers = db.get_risk_markers()
+    assert v1 != v0 and v1 == db.risk_markers_version()
+    assert [m["risk"] for m in markers] == ["High"]
+    assert not db.set_risk_marker("Assam", "Dhubri", "High", 26.0, 90.0)
+    assert db.risk_markers_version() == v1
+
+
+def test_marker_versions_differ_across_databases(tmp_path, db):
+    other = database.Database(str(tmp_path / "reset.db"), pool_size=2)
+    assert db.risk_markers_version() != other.risk_markers_version()
+    # the instance id survives reopening the same file
+    assert database.Database(db.path, pool_size=1).risk_markers_version() == db.risk_markers_version()
+
+
+def test_risk_markers_not_modified_keeps_vary(db, monkeypatch):
+    import api
+    monkeypatch.setattr(api, "user_handler", types.SimpleNamespace(db=db))
+    monkeypatch.setattr(api, "_markers_rep", None)
+    db.set_risk_marker("Assam", "Dhubri", "High", 26.0, 90.0)
+
+    first = api.get_risk_markers(_request())
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    again = api.get_risk_markers(_request([("If-None-Match", etag)]))
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert again.headers["vary"] == first.headers["vary"] == "Accept-Encoding"
@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+import risk_levels
+import simulate
+
+
+def _forecast(rng, days=5):
+    rows = []
+    for k in range(days):
+        rain = float(rng.uniform(0, 80)) if rng.random() < 0.7 else 0.0
+        rows.append({"date": f"2026-07-{k + 1:02d}", "rain": rain, "rain_max": rain * float(rng.uniform(0.2, 0.6)),
+                     "humidity": 80.0, "temp": 28.0, "wind": float(rng.uniform(0, 12))})
+    return rows
+
+
+class _SumModel:
+    """predict_proba from the 30-day sum, so risk rises with rain."""
+
+    def predict_proba(self, X):
+        p = 1.0 - np.exp(-X[:, 8] / 400.0)
+        return np.stack([1.0 - p, p], axis=1)
+
+
+# SCENARIOS
+
+def test_scenario_needs_exactly_one_perturbation():
+    with pytest.raises(ValueError):
+        simulate.Scenario()
+    with pytest.raises(ValueError):
+        simulate.Scenario(multiplier=1.5, rain_mm=[10.0])
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"multiplier": 1.0, "days": 0},
+    {"multiplier": 1.0, "days": simulate.MAX_HORIZON + 1},
+    {"rain_mm": [5.0] * (simulate.MAX_HORIZON + 1)},
+    {"multiplier": -0.5},
+    {"rain_mm": [10.0, -1.0]},
+])
+def test_scenario_rejects_invalid(kwargs):
+    with pytest.raises(ValueError):
+        simulate.Scenario(**kwargs)
+
+
+def test_scenario_defaults():
+    sc = simulate.Scenario(rain_mm=[10, 20])
+    assert sc.days == 2
+    assert sc.describe() == {"name": "mm 10,20", "days": 2, "rain_mm": [10, 20]}
+    assert [s.name for s in simulate.grid([0.5, 2], days=4)] == ["x0.5/4d", "x2/4d"]
+
+
+# RUN
+
+def test_run_shapes_and_monotonic_risk():
+    rng = np.random.default_rng(0)
+    d, horizon = 6, 4
+    static = rng.uniform(0, 1, size=(d, 8))
+    histories = [list(rng.uniform(0, 20, size=60)) for _ in range(d)]
+    forecasts = [_forecast(rng) for _ in range(d)]
+    inputs = simulate.prepare(static, histories, forecasts, horizon)
+    assert inputs.tail30.shape == inputs.prev30.shape == inputs.rain.shape == (d, horizon)
+    assert inputs.dates == [row["date"] for row in forecasts[0][:horizon]]
+
+    scenarios = simulate.grid([0.0, 1.0, 2.0], days=horizon) + [simulate.Scenario(rain_mm=[100.0, 100.0])]
+    classifier = risk_levels.RiskClassifier(regions={"s/d0": [0.1, 0.2]})
+    regions = classifier.region_rows([("s", f"d{i}") for i in range(d)])
+    result = simulate.run(_SumModel(), classifier, inputs, scenarios, regions)
+
+    for key in ("risk", "level", "peak_day"):
+        assert result[key].shape == (len(scenarios), d)
+    assert (result["peak_day"] >= 0).all() and (result["peak_day"] < horizon).all()
+    assert (np.diff(result["risk"][:3], axis=0) >= 0).all()
+    np.testing.assert_array_equal(result["level"][:, 0], classifier.levels(result["risk"][:, 0], 1))
+    np.testing.assert_array_equal(result["level"][:, 1:], classifier.levels(result["risk"][:, 1:]))
+
+
+def test_run_rejects_too_many_rows(monkeypatch):
+    rng = np.random.default_rng(0)
+    inputs = simulate.prepare(np.zeros((2, 8)), [[1.0] * 60] * 2, [_forecast(rng)] * 2, 3)
+    monkeypatch.setattr(simulate, "MAX_ROWS", 11)
+    with pytest.raises(ValueError):
+        simulate.run(_SumModel(), risk_levels.RiskClassifier(), inputs, simulate.grid([1.0, 2.0]))
+
+
+# PARITY WITH /predict
+
+@pytest.fixture(scope="module")
+def api_module():
+    import api
+    api.feature_store_resource.get()
+    api.model_resource.get()
+    return api
+
+
+@pytest.mark.parametrize("history_days", [60, 45, 20])
+def test_unperturbed_scenario_matches_district_prediction(api_module, monkeypatch, history_days):
+    api = api_module
+    classifier = risk_levels.RiskClassifier()
+    monkeypatch.setattr(api, "classifier", classifier)
+    model = api.model_resource.get()
+    store = api.feature_store_resource.get()
+
+    rng = np.random.default_rng(history_days)
+    names = store.names[:8]
+    histories, forecasts, rows = [], [], []
+    for state, district in names:
+        past = [float(r) for r in rng.gamma(0.6, 12.0, size=history_days)]
+        daily = _forecast(rng)
+        history = (past[-1], sum(past[-7:]), sum(past[-30:]), sum(past[-60:-30]), past)
+        weather = {"wind": {"speed": 3.0}, "rain": {"1h": 1.0}}
+        *_, X = api._score_district(state, district, 0.0, 0.0, weather, history, daily)
+        histories.append(past)
+        forecasts.append(daily)
+        rows.append(X[1:])
+
+    static = store.static[[store.district_id(s, d) for s, d in names]]
+    inputs = simulate.prepare(static, histories, forecasts, simulate.MAX_HORIZON)
+    scenario = simulate.Scenario(multiplier=1.0, days=simulate.MAX_HORIZON)
+    rain, rain_max = simulate.perturb(inputs, [scenario])
+    sim_rows = simulate.feature_rows(inputs, rain, rain_max).reshape(len(names), simulate.MAX_HORIZON, -1)
+    np.testing.assert_allclose(sim_rows, np.stack(rows), rtol=1e-6, atol=1e-4)
+
+    result = simulate.run(model, classifier, inputs, [scenario])
+    expected = np.stack([model.predict_proba(X)[:, 1] for X in rows])
+    np.testing.assert_allclose(result["risk"][0], expected.max(axis=1), rtol=1e-6)
+    np.testing.assert_array_equal(result["peak_day"][0], expected.argmax(axis=1))
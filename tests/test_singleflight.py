@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+import singleflight
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_callers_share_one_computation():
+    flight = singleflight.SingleFlight("test")
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"risk": "High"}
+
+    async def main():
+        return await asyncio.gather(*(flight.run("k", compute) for _ in range(10)))
+
+    results = _run(main())
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert (flight.computations, flight.coalesced) == (1, 9)
+
+
+def test_different_keys_compute_separately():
+    flight = singleflight.SingleFlight("test")
+
+    async def main():
+        return await asyncio.gather(flight.run("a", _value("a")), flight.run("b", _value("b")))
+
+    assert _run(main()) == ["a", "b"]
+    assert flight.computations == 2
+
+
+def _value(v):
+    async def compute():
+        await asyncio.sleep(0)
+        return v
+    return compute
+
+
+def test_failures_reach_waiters_and_are_not_cached():
+    flight = singleflight.SingleFlight("test")
+    attempts = []
+
+    async def failing():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        results = await asyncio.gather(*(flight.run("k", failing) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert len(attempts) == 1
+        return await flight.run("k", _value("ok"))
+
+    assert _run(main()) == "ok"
+    assert flight.snapshot()["inflight"] == 0
+
+
+def test_results_stay_fresh_then_expire(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(singleflight.time, "monotonic", lambda: now[0])
+    flight = singleflight.SingleFlight("test", fresh_for=60)
+
+    assert _run(flight.run("k", _value(1))) == 1
+    now[0] = 59
+    assert _run(flight.run("k", _value(2))) == 1
+    assert flight.fresh_hits == 1
+    now[0] = 121
+    assert _run(flight.run("k", _value(3))) == 3
+    assert flight.computations == 2
+
+
+def test_cached_results_are_bounded():
+    flight = singleflight.SingleFlight("test", max_entries=2)
+
+    async def main():
+        for key in "abc":
+            await flight.run(key, _value(key))
+
+    _run(main())
+    assert list(flight._results) == ["b", "c"]
+
+
+def test_cancelled_caller_does_not_cancel_the_computation():
+    flight = singleflight.SingleFlight("test")
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flight.run("k", slow))
+        second = asyncio.ensure_future(flight.run("k", slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert _run(main()) == "done"
+
+
+def test_district_markers_use_dataset_spelling(monkeypatch):
+    import api
+
+    recorded = []
+    monkeypatch.setattr(api, "_wait_for_scoring_resources", lambda: None)
+    monkeypatch.setattr(api, "get_weather", lambda lat, lon: {"main": {"temp": 30, "humidity": 70}})
+    monkeypatch.setattr(api, "get_openmeteo_rainfall", lambda lat, lon: (0, 0, 0, 0, []))
+    monkeypatch.setattr(api, "get_daily_forecast", lambda lat, lon: [])
+    monkeypatch.setattr(api, "_score_district", lambda *args: (0.1, "Low", 0, 0, [], None))
+    monkeypatch.setattr(api, "_record_risk", lambda *args: recorded.append(args[:3]))
+    monkeypatch.setattr(api, "classifier", type("C", (), {"version": "test"})())
+
+    state, districts = next(iter(api._coordinates().values()))
+    district = next(iter(districts.values()))[0]
+
+    _run(api._predict_district(state.upper(), district.lower()))
+    assert recorded == [(state, district, "Low")]
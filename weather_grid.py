@@ -0,0 +1,245 @@
+import os
+import json
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+import resilience
+
+# ---------------------------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------------------------
+
+OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+
+# Grid spacing in degrees. 0.25 matches the ERA5 archive behind Open-Meteo;
+# 0.1 matches ERA5-Land. Everything inside one tile shares upstream fetches.
+TILE_DEG = float(os.getenv("WEATHER_TILE_DEG", "0.25"))
+
+WEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+
+WEATHER_TTL = 600           # 10 min fresh
+FORECAST_TTL = 1800         # provider updates every 3 h
+ARCHIVE_TTL = 3600          # daily totals barely move within an hour
+MAX_STALE = 6 * 3600        # serve cached data this long while the provider is down
+
+ARCHIVE_DAYS = 30
+ARCHIVE_BULK_SIZE = 50      # locations per Open-Meteo request (keeps the URL short)
+
+Node = Tuple[float, float]
+
+
+# ---------------------------------------------------------------------------
+# GRID GEOMETRY
+# ---------------------------------------------------------------------------
+
+def _node(i: int, j: int, res: float) -> Node:
+    # round so keys are stable regardless of float noise
+    return (round(i * res, 4), round(j * res, 4))
+
+
+def snap(lat: float, lon: float, res: float = TILE_DEG) -> Node:
+    """Nearest grid node to a point."""
+    return _node(round(lat / res), round(lon / res), res)
+
+
+def corners(lat: float, lon: float, res: float = TILE_DEG) -> List[Tuple[Node, float]]:
+    """The four grid nodes around a point with their bilinear weights."""
+    y, x = lat / res, lon / res
+    i0, j0 = math.floor(y), math.floor(x)
+    fy, fx = y - i0, x - j0
+    out = []
+    for di, wy in ((0, 1 - fy), (1, fy)):
+        for dj, wx in ((0, 1 - fx), (1, fx)):
+            w = wy * wx
+            if w > 1e-9:
+                out.append((_node(i0 + di, j0 + dj, res), w))
+    return out
+
+
+def node_key(kind: str, node: Node) -> str:
+    return f"{kind}:{node[0]:.4f}_{node[1]:.4f}@{TILE_DEG}"
+
+
+# ---------------------------------------------------------------------------
+# OPENWEATHER (point API, no bulk endpoint): one fetch per tile
+#
+# Current weather and forecasts come from the nearest grid node, not a
+# bilinear blend: blending would cost up to four OpenWeather calls per
+# point where tiles cost one, and the forecast pipeline caches its daily
+# rows per node. At TILE_DEG = 0.25 a point is at most ~20 km from its
+# node. Only the archive rainfall below, fetched in bulk, is interpolated.
+# ---------------------------------------------------------------------------
+
+def _openweather_params(node: Node) -> dict:
+    return {
+        "lat": node[0],
+        "lon": node[1],
+        "appid": OPENWEATHER_API_KEY,
+        "units": "metric"
+    }
+
+
+def current_weather(lat: float, lon: float) -> dict:
+    """Current conditions at the grid node nearest the point (shared by its tile)."""
+    node = snap(lat, lon)
+    return resilience.get_json(WEATHER_URL, _openweather_params(node), node_key("weather", node), WEATHER_TTL, MAX_STALE)
+
+
+def forecast(lat: float, lon: float) -> dict:
+    """5-day / 3-hour forecast at the grid node nearest the point (shared by its tile)."""
+    node = snap(lat, lon)
+    return resilience.get_json(FORECAST_URL, _openweather_params(node), node_key("forecast", node), FORECAST_TTL, MAX_STALE)
+
+
+# ---------------------------------------------------------------------------
+# OPEN-METEO ARCHIVE (multi-location bulk queries)
+# ---------------------------------------------------------------------------
+
+def _archive_params(nodes: List[Node]) -> dict:
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=ARCHIVE_DAYS)
+    return {
+        "latitude": ",".join(f"{n[0]:.4f}" for n in nodes),
+        "longitude": ",".join(f"{n[1]:.4f}" for n in nodes),
+        "start_date": start.strftime("%Y-%m-%d"),
+        "end_date": end.strftime("%Y-%m-%d"),
+        "daily": "precipitation_sum",
+        "timezone": "auto"
+    }
+
+
+def _fetch_archive_nodes(nodes: List[Node]):
+    """Fetch archive series for many nodes, ARCHIVE_BULK_SIZE per request, and cache each node."""
+    for i in range(0, len(nodes), ARCHIVE_BULK_SIZE):
+        batch = nodes[i:i + ARCHIVE_BULK_SIZE]
+        data = resilience.fetch_json(ARCHIVE_URL, _archive_params(batch))
+        # a single location comes back as an object, several as a list
+        items = data if isinstance(data, list) else [data]
+        if len(items) != len(batch):
+            raise resilience.UpstreamUnavailable(
+                f"Open-Meteo returned {len(items)} locations for {len(batch)} requested"
+            )
+        for node, item in zip(batch, items):
+            resilience.response_cache.set(node_key("archive", node), item)
+
+
+def archive_nodes(nodes: Iterable[Node]) -> Dict[Node, dict]:
+    """
+    Archive payloads for a set of nodes.
+
+    Fresh nodes come from cache, missing ones are fetched together in bulk,
+    stale ones are served immediately and refreshed in the background.
+    """
+    result, missing, stale = {}, [], []
+    for node in dict.fromkeys(nodes):
+        payload, status = resilience.lookup(node_key("archive", node), ARCHIVE_TTL, MAX_STALE)
+        if status == "fresh":
+            result[node] = payload
+        elif status == "stale":
+            result[node] = payload
+            stale.append(node)
+        else:
+            missing.append(node)
+            if payload is not None:
+                result[node] = payload    # expired copy, only used if the fetch fails
+
+    if missing:
+        try:
+            _fetch_archive_nodes(missing)
+        except resilience.UpstreamUnavailable:
+            if not all(n in result for n in missing):
+                raise
+            stale.extend(missing)
+        else:
+            for node in missing:
+                result[node] = resilience.response_cache.get(node_key("archive", node))[0]
+
+    if stale:
+        for node in stale:
+            resilience.mark_stale(node_key("archive", node))
+        resilience.refresh_in_background(
+            "archive-bulk:" + ",".join(node_key("archive", n) for n in stale),
+            lambda: _fetch_archive_nodes(stale)
+        )
+
+    return result
+
+
+def _series(payload: dict) -> Tuple[List[str], np.ndarray]:
+    daily = payload.get("daily", {})
+    values = [np.nan if v is None else v for v in daily.get("precipitation_sum", [])]
+    return daily.get("time", []), np.asarray(values, dtype=np.float64)
+
+
+def archive_rainfall(lat: float, lon: float) -> dict:
+    """
+    Daily precipitation at the point, bilinearly interpolated from the
+    surrounding grid nodes. Returned in Open-Meteo's own response shape so
+    the aggregation code does not care whether it came from one node or four.
+    """
+    weighted = corners(lat, lon)
+    payloads = archive_nodes(n for n, _ in weighted)
+
+    series = [(_series(payloads[n]), w) for n, w in weighted]
+    length = min(len(vals) for (_, vals), _ in series)
+    times = series[0][0][0][-length:] if length else []
+
+    stack = np.vstack([vals[-length:] for (_, vals), _ in series]) if length else np.empty((len(series), 0))
+    weights = np.array([w for _, w in series])[:, None] * ~np.isnan(stack)
+    total = weights.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        interpolated = np.where(total > 0, np.nansum(stack * weights, axis=0) / total, np.nan)
+
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "daily": {
+            "time": list(times),
+            "precipitation_sum": [None if np.isnan(v) else round(float(v), 2) for v in interpolated],
+        },
+    }
+
+
+# ---------------------------------------------------------------------------
+# NATIONWIDE REFRESH
+# ---------------------------------------------------------------------------
+
+def plan(points: Iterable[Tuple[float, float]]) -> dict:
+    """Upstream call counts needed to refresh all points, per-point versus tiled."""
+    points = list(points)
+    weather_nodes = {snap(lat, lon) for lat, lon in points}
+    archive = {n for lat, lon in points for n, _ in corners(lat, lon)}
+    return {
+        "points": len(points),
+        "tile_deg": TILE_DEG,
+        "per_point_calls": 3 * len(points),
+        "weather_tiles": len(weather_nodes),
+        "archive_nodes": len(archive),
+        "tiled_calls": 2 * len(weather_nodes) + math.ceil(len(archive) / ARCHIVE_BULK_SIZE),
+    }
+
+
+def prefetch(points: Iterable[Tuple[float, float]]) -> dict:
+    """Warm the tile caches for many points using as few upstream calls as possible."""
+    points = list(points)
+    archive_nodes(n for lat, lon in points for n, _ in corners(lat, lon))
+    failed = 0
+    for node in {snap(lat, lon) for lat, lon in points}:
+        try:
+            current_weather(*node)
+            forecast(*node)
+        except resilience.UpstreamUnavailable:
+            failed += 1
+    return dict(plan(points), failed_tiles=failed)
+
+
+if __name__ == "__main__":
+    with open("indian_district_coordinates.json", encoding="utf-8") as f:
+        districts = json.load(f)
+    pts = [(c["lat"], c["lon"]) for ds in districts.values() for c in ds.values()]
+    print(json.dumps(plan(pts), indent=2))